@@ -1,4 +1,5 @@
 from copy import deepcopy
+import datetime as dt
 import json
 
 from django.contrib.auth.models import User
@@ -167,6 +168,22 @@ class CaseAPICallTestCase(APITestCase):
         self.assertEqual(case.offences.all().count(), 2)
         self.assertEqual(case.urn, data["urn"])
 
+    def test_submission_sets_auth_fields(self):
+        data = deepcopy(self.test_data)
+        self._post_data(data)
+
+        data["offences"] = data["offences"][:1]
+        self._post_data(data)
+
+        case = Case.objects.get()
+
+        self.assertEqual(case.offence_count, 1)
+        self.assertEqual(case.offences.count(), 1)
+        self.assertEqual(case.dob, dt.date(1960, 1, 1))
+        self.assertEqual(case.forename, "Jimmy")
+        self.assertEqual(case.surname, "Dog")
+        self.assertIsNone(case.organisation_name)
+
     def test_submission_without_offence_data(self):
         data = deepcopy(self.test_data)
         data["offences"] = []
@@ -1,8 +1,12 @@
 # coding=utf-8
 from copy import deepcopy
 from datetime import date, timedelta
+from decimal import Decimal
 import json
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from mock import patch
 from rest_framework.reverse import reverse
 from rest_framework.test import (
     APITestCase,
@@ -10,9 +14,11 @@ from rest_framework.test import (
     force_authenticate)
 
 from api.reusable import create_api_user, create_court
+from api.v0.serializers import ResultListSerializer
 from api.v0.views import ResultViewSet
-from apps.plea.models import AuditEvent, Court
+from apps.plea.models import AuditEvent, Case, Court
 from apps.result.models import Result
+from apps.result.tasks import process_result
 
 
 class GeneralAPITestCase(APITestCase):
@@ -84,6 +90,9 @@ class CaseAPICallTestCase(APITestCase):
         response.render()
         return response
 
+    def _post_result(self, data):
+        return self._post_data(data)
+
     def test_urn_blank_urn_validation(self):
         data = deepcopy(self.test_data)
         data["urn"] = ""
@@ -131,6 +140,15 @@ class CaseAPICallTestCase(APITestCase):
         self.assertEqual(result.result_offences.all().count(), 2)
         self.assertEqual(result.urn, self.test_data["urn"])
 
+    def test_valid_submission_is_classified(self):
+        response = self._post_data(self.test_data)
+        result = Result.objects.get()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(result.resultable)
+        self.assertEqual(result.fines_total, Decimal("444.00"))
+        self.assertEqual(len(result.fines), 2)
+
     def test_submission_without_offence_data_succeeds(self):
         data = deepcopy(self.test_data)
         data["result_offences"] = []
@@ -147,3 +165,158 @@ class CaseAPICallTestCase(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(type(returned_data), dict)
         self.assertEqual(returned_data["urn"], self.test_data["urn"])
+
+    @override_settings(RESULT_EMAILS_ON_IMPORT=True)
+    def test_corrected_result_is_processed_again(self):
+        Case.objects.create(urn=self.test_data["urn"],
+                            case_number=self.test_data["case_number"],
+                            email="test@example.org",
+                            sent=True)
+
+        self._post_result(self.test_data)
+        sent, message = process_result(Result.objects.get().id)
+
+        self.assertFalse(sent)
+        self.assertIn("account number", message)
+
+        data = deepcopy(self.test_data)
+        data.update({"account_number": "12345678", "division": "100"})
+        response = self._post_result(data)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Result.objects.get().processed)
+
+        sent, message = process_result(Result.objects.get().id, dry_run=True)
+
+        self.assertTrue(sent)
+        self.assertIn("test@example.org", message)
+
+
+class BulkResultAPICallTestCase(CaseAPICallTestCase):
+
+    def _post_data(self, data):
+        request = self.request_factory.post(
+            reverse("api-v0:result-bulk", format="json"),
+            data=data,
+            format="json")
+        force_authenticate(request, self.user)
+        result_view = ResultViewSet.as_view({"post": "bulk"})
+        response = result_view(request)
+        response.render()
+        return response
+
+    def _post_result(self, data):
+        return self._post_data([data])
+
+    def test_urn_blank_urn_validation(self):
+        data = deepcopy(self.test_data)
+        data["urn"] = ""
+        response = self._post_data([data])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data,
+            [{"urn": ["This field may not be blank."]}])
+
+    def test_duplicate_submissions_succeeds(self):
+        response1 = self._post_data([self.test_data])
+        response2 = self._post_data([self.test_data, self.test_data])
+
+        self.assertEqual(response1.status_code, 201)
+        self.assertEqual(response2.status_code, 201)
+        self.assertEqual(Result.objects.count(), 1)
+        self.assertEqual(Result.objects.get().result_offences.count(), 2)
+
+    def test_missing_urn_validation(self):
+        data = deepcopy(self.test_data)
+        del data["urn"]
+        response = self._post_data([self.test_data, data])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data,
+            [{}, {"urn": ["This field is required."]}])
+        self.assertEqual(Result.objects.count(), 0)
+
+    def test_urn_invalid_format_validation(self):
+        data = deepcopy(self.test_data)
+        data["urn"] = "aa/00/43224234/aa/25"
+        response = self._post_data([data])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data,
+            [{'urn': [u'The URN is not valid']}])
+
+    def test_valid_submission(self):
+        second = deepcopy(self.test_data)
+        second["case_number"] = "16273483"
+        second["result_offences"] = second["result_offences"][:1]
+
+        response = self._post_data([self.test_data, second])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(Result.objects.get(case_number="16273482").result_offences.count(), 2)
+        self.assertEqual(Result.objects.get(case_number="16273483").result_offences.count(), 1)
+        self.assertEqual(
+            Result.objects.get(case_number="16273482").result_offences.first().offence_data.count(), 1)
+
+    def test_valid_submission_is_classified(self):
+        response = self._post_data([self.test_data])
+        result = Result.objects.get()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(result.resultable)
+        self.assertEqual(result.fines_total, Decimal("444.00"))
+
+    def test_submission_without_offence_data_succeeds(self):
+        data = deepcopy(self.test_data)
+        data["result_offences"] = []
+        response = self._post_data([data])
+        result = Result.objects.all()[0]
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(result.result_offences.all().count(), 0)
+
+    def test_valid_submissions_returns_dict_with_correct_urn(self):
+        response = self._post_data([self.test_data])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["results"], [Result.objects.get().id])
+
+    def test_oversized_batch_rejected_before_validating_results(self):
+        with patch.object(ResultListSerializer, "max_batch_size", 1):
+            with self.assertNumQueries(0):
+                response = self._post_data([self.test_data, self.test_data])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Result.objects.count(), 0)
+
+    def test_used_urns_are_checked_for_the_whole_batch(self):
+        second = deepcopy(self.test_data)
+        second["case_number"] = "16273483"
+
+        self._post_data([second])
+        Result.objects.update(sent=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post_data([self.test_data, second])
+
+        result_queries = [query for query in queries if 'FROM "result_result"' in query["sql"]]
+
+        self.assertEqual(len(result_queries), 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("16273483", str(response.data))
+        self.assertEqual(Result.objects.count(), 1)
+
+    def test_results_are_linked_to_their_case(self):
+        case = Case.objects.create(urn=self.test_data["urn"],
+                                   case_number=self.test_data["case_number"],
+                                   email="test@example.org",
+                                   sent=True)
+
+        response = self._post_data([self.test_data])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Result.objects.get().case, case)
@@ -1,5 +1,7 @@
 import datetime
 
+from django.test.utils import override_settings
+from mock import patch
 from rest_framework.test import APITestCase
 
 from apps.plea.models import Court, CourtEmailCount, UsageStats
@@ -254,3 +256,59 @@ class TestStatsAPI(APITestCase):
         self.assertIn("error", response.data)
         self.assertEqual("\'2015-30-32\' value has the correct format (YYYY-MM-DD) but it is an invalid date.", response.data["error"])
 
+
+    def test_stats_not_modified(self):
+
+        response = self.client.get(self.endpoint, {"start": "2015-01-01"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(self.endpoint, {"start": "2015-01-01"}, format="json",
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(STATS_CACHE={"TIMEOUT": 0})
+    def test_stats_last_modified_is_when_they_were_computed(self):
+
+        with patch("apps.plea.stats_cache.time.time", return_value=1000000000):
+            response = self.client.get("/v0/stats/by_hearing/", {}, format="json")
+            last_modified = response["Last-Modified"]
+
+        # e.g. the week has rolled over since, and the entry has expired
+        with patch("apps.plea.stats_cache.time.time", return_value=1000086400):
+            response = self.client.get("/v0/stats/by_hearing/", {}, format="json",
+                                       HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+
+    def test_stats_etag_changes_with_court_email_count(self):
+
+        response = self.client.get(self.endpoint, {}, format="json")
+        etag = response["ETag"]
+        submissions = response.data["submissions"]
+
+        CourtEmailCount.objects.create(
+            court=self.court,
+            total_pleas=2,
+            total_guilty=2,
+            total_not_guilty=0,
+            date_sent=self.last_monday,
+            hearing_date=self.next_monday,
+            sent=True)
+
+        response = self.client.get(self.endpoint, {}, format="json", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["submissions"], submissions + 1)
+
+    def test_stats_errors_are_not_cached(self):
+
+        response = self.client.get("/v0/stats/by_court/", {"end": "not_a_date"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("ETag", response)
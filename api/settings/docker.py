@@ -16,6 +16,20 @@ DATABASES = {
     }
 }
 
+# The public stats are invalidated by the worker processes, so their cache has
+# to be shared with the web processes, see apps.plea.stats_cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "stats": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "stats_cache",
+    },
+}
+
+STATS_CACHE["ALIAS"] = "stats"
+
 SMTP_ROUTES["GSI"]["USERNAME"] = os.environ.get("GSI_EMAIL_USERNAME", "")
 SMTP_ROUTES["GSI"]["PASSWORD"] = os.environ.get("GSI_EMAIL_PASSWORD", "")
 SMTP_ROUTES["PNN"]["USERNAME"] = os.environ.get("PNN_EMAIL_USERNAME", "")
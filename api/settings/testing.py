@@ -25,6 +25,7 @@ BROKER_BACKEND = 'memory'
 DEBUG = False
 
 SECRET_KEY = "Trdfgjgfghfdgjlfdtr_+@3gvuedrs873w"
+SUBMISSION_PAYLOAD_PASSPHRASE = "testing"
 
 # the test user data directory
 USER_DATA_DIRECTORY = os.path.join(PROJECT_ROOT, 'test_user_data')
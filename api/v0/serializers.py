@@ -1,4 +1,9 @@
+from collections import OrderedDict
+
+from django.db import transaction
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from apps.plea.models import (
     AuditEvent,
@@ -8,7 +13,8 @@ from apps.plea.models import (
     UsageStats,
 )
 from apps.result.models import Result, ResultOffence, ResultOffenceData
-from apps.plea.standardisers import standardise_urn
+from apps.result.tasks import queue_results
+from apps.plea.standardisers import standardise_urn, standardise_urns
 from apps.plea.validators import is_valid_urn_format
 
 
@@ -149,16 +155,16 @@ class CaseSerializer(serializers.ModelSerializer):
             if "language" in validated_data:
                 case.language = validated_data["language"]
             case.extra_data = validated_data["extra_data"]
+            case.offence_count = len(offences)
             case.save()
         else:
             validated_data["imported"] = True
+            validated_data["offence_count"] = len(offences)
             case = Case.objects.create(**validated_data)
 
-        # Create or update each page instance
-        for item in offences:
-            offence = Offence(**item)
-            offence.case = case
-            offence.save()
+        # bulk_create doesn't send post_save, so offence_count is set above
+        Offence.objects.bulk_create(
+            [Offence(case=case, **item) for item in offences])
 
         AuditEvent().populate(
             event_type="case_api",
@@ -186,6 +192,143 @@ class ResultOffenceSerializer(serializers.ModelSerializer):
         fields = ("offence_data", "offence_code", "offence_seq_number")
 
 
+RESULT_UPDATE_FIELDS = ("account_number", "division", "instalment_amount",
+                        "lump_sum_amount", "pay_by_date", "payment_type")
+
+
+def build_result_offences(items):
+    """
+    Unsaved offences, each with its unsaved offence data, from the
+    validated result_offences of a result
+    """
+
+    offences = []
+
+    for item in items:
+        data = item.pop("offence_data", [])
+        offences.append((ResultOffence(**item), [ResultOffenceData(**offence_data) for offence_data in data]))
+
+    return offences
+
+
+def create_result_offences(results):
+    """
+    Create the offences and offence data of saved results, given as
+    (result, offences) pairs, with one insert for each table
+    """
+
+    offences = [(result, offence, data) for result, items in results for offence, data in items]
+
+    for result, offence, data in offences:
+        offence.result = result
+
+    ResultOffence.objects.bulk_create([offence for result, offence, data in offences])
+
+    for result, offence, data in offences:
+        for offence_data in data:
+            offence_data.result_offence = offence
+
+    ResultOffenceData.objects.bulk_create([
+        offence_data
+        for result, offence, data in offences
+        for offence_data in data])
+
+
+class ResultListSerializer(serializers.ListSerializer):
+    max_batch_size = 1000
+
+    def to_internal_value(self, data):
+        # Check the size before any of the results are validated
+        if isinstance(data, list) and len(data) > self.max_batch_size:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    "Send at most {} results at once".format(self.max_batch_size)]})
+
+        # Standardise the batch's URNs together, for the results to look up
+        if isinstance(data, list):
+            urns = [item["urn"] for item in data
+                    if isinstance(item, dict) and isinstance(item.get("urn"), str)]
+            self.child.standardised_urns = dict(zip(urns, standardise_urns(urns)))
+
+        return super(ResultListSerializer, self).to_internal_value(data)
+
+    def validate(self, data):
+        # Has any of these URNs been used already?
+        keys = set((item["urn"], item["case_number"]) for item in data)
+
+        sent_results = Result.objects.filter(
+            case_number__in=set(case_number for urn, case_number in keys),
+            sent=True).values_list("urn", "case_number")
+
+        used = sorted(set(sent_results) & keys)
+
+        if used:
+            AuditEvent().populate(
+                event_type="result_api",
+                event_subtype="result_invalid_duplicate_urn_used",
+                event_trace="URN: {0}".format(", ".join(urn for urn, case_number in used)),
+            )
+            raise serializers.ValidationError(
+                "URN / Result number already exists and has been used: {}".format(
+                    ", ".join("{} / {}".format(*key) for key in used)))
+
+        return data
+
+    def create(self, validated_data):
+        # A result sent twice in a batch replaces the earlier one, as it
+        # would if they had been sent separately
+        batch = OrderedDict()
+        for data in validated_data:
+            batch[(data["urn"], data["case_number"])] = data
+
+        case_numbers = [case_number for urn, case_number in batch]
+
+        cases = Result.objects.get_associated_cases(case_numbers)
+
+        open_results = {}
+        for result in Result.objects.filter(case_number__in=case_numbers, sent=False).order_by("id"):
+            open_results.setdefault((result.urn, result.case_number), result)
+
+        results, new_results, updated_results = [], [], []
+
+        for key, data in batch.items():
+            offences = build_result_offences(data.pop("result_offences", []))
+
+            result = open_results.get(key)
+
+            if result:
+                for field in RESULT_UPDATE_FIELDS:
+                    if field in data:
+                        setattr(result, field, data[field])
+                # It may have been skipped as it was, so process it again
+                result.processed = False
+                updated_results.append(result)
+            else:
+                result = Result(**data)
+                new_results.append(result)
+
+            if not result.case_id:
+                result.case = cases.get(result.case_number)
+
+            result.classify([data for offence, data in offences])
+
+            results.append((result, offences))
+
+        with transaction.atomic():
+            ResultOffence.objects.filter(result__in=updated_results).delete()
+
+            for result in updated_results:
+                result.save()
+
+            Result.objects.bulk_create(new_results)
+
+            create_result_offences(results)
+
+            queue_results([result for result, offences in results])
+
+        return [result for result, offences in results]
+
+
 class ResultSerializer(serializers.ModelSerializer):
     case_number = serializers.CharField(required=True)
     urn = serializers.CharField(required=True, validators=[is_valid_urn_format, ])
@@ -198,12 +341,17 @@ class ResultSerializer(serializers.ModelSerializer):
                   "date_of_hearing", "account_number", "division",
                   "instalment_amount", "lump_sum_amount", "pay_by_date",
                   "payment_type")
+        list_serializer_class = ResultListSerializer
 
     def validate(self, data):
         urn = data.pop("urn")
-        std_urn = standardise_urn(urn)
+        std_urn = getattr(self, "standardised_urns", {}).get(urn) or standardise_urn(urn)
         data["urn"] = std_urn
 
+        # A batch checks all its results at once, see ResultListSerializer
+        if isinstance(self.parent, ResultListSerializer):
+            return data
+
         # Has this URN been used already?
         sent_results = Result.objects.filter(
             urn=urn,
@@ -234,30 +382,25 @@ class ResultSerializer(serializers.ModelSerializer):
         if open_results:
             result = open_results[0]
             result.result_offences.all().delete()
-            if "account_number" in validated_data:
-                result.account_number = validated_data["account_number"]
-            if "division" in validated_data:
-                result.division = validated_data["division"]
-            if "instalment_amount" in validated_data:
-                result.instalment_amount = validated_data["instalment_amount"]
-            if "lump_sum_amount" in validated_data:
-                result.lump_sum_amount = validated_data["lump_sum_amount"]
-            if "pay_by_date" in validated_data:
-                result.pay_by_date = validated_data["pay_by_date"]
-            if "payment_type" in validated_data:
-                result.payment_type = validated_data["payment_type"]
-            result.save()
+            for field in RESULT_UPDATE_FIELDS:
+                if field in validated_data:
+                    setattr(result, field, validated_data[field])
+            # It may have been skipped as it was, so process it again
+            result.processed = False
         else:
-            result = Result.objects.create(**validated_data)
+            result = Result(**validated_data)
+
+        if not result.case_id:
+            result.case = Result.objects.get_associated_cases([result.case_number]).get(result.case_number)
+
+        offences = build_result_offences(offences)
+
+        result.classify([data for offence, data in offences])
+        result.save()
 
-        for item in offences:
-            data = item.pop("offence_data")
-            offence = ResultOffence(**item)
-            offence.result = result
-            offence.save()
+        create_result_offences([(result, offences)])
 
-            for offence_data in data:
-                offence.offence_data.create(**offence_data)
+        queue_results([result])
 
         return result
 
@@ -4,15 +4,21 @@ views
 
 """
 import datetime as dt
+import json
+from functools import wraps
 
 from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
 
 from rest_framework.decorators import detail_route, list_route
 from rest_framework import viewsets, mixins, status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from .serializers import AuditEventSerializer, CaseSerializer, UsageStatsSerializer, ResultSerializer
+from apps.plea import stats_cache
 from apps.plea.models import AuditEvent, Case, CourtEmailCount, UsageStats
 from apps.result.models import Result
 
@@ -41,6 +47,63 @@ class ResultViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     queryset = Result.objects.all()
     serializer_class = ResultSerializer
 
+    @list_route(methods=["post"])
+    def bulk(self, request):
+        """
+        Create or update a list of results
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+
+        return Response({"results": [result.id for result in results]},
+                        status=status.HTTP_201_CREATED)
+
+
+class UncacheableResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def cached_stats(view_method):
+    """
+    Serve the stats from stats_cache, keyed by the endpoint and its query
+    parameters, with an ETag and Last-Modified so that clients polling the
+    API get a 304 while the stats are unchanged.
+
+    Only successful responses are cached.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = "{}?{}".format(view_method.__name__, urlencode(sorted(request.GET.items())))
+
+        def compute():
+            response = view_method(self, request, *args, **kwargs)
+
+            if response.status_code != status.HTTP_200_OK:
+                raise UncacheableResponse(response)
+
+            return json.loads(json.dumps(response.data, cls=JSONEncoder))
+
+        try:
+            entry = stats_cache.get_stats(key, compute)
+        except UncacheableResponse as e:
+            return e.response
+
+        response = get_conditional_response(request._request,
+                                            etag=entry["etag"],
+                                            last_modified=entry["modified"])
+        if response is None:
+            response = Response(entry["data"])
+
+        response["ETag"] = entry["etag"]
+        response["Last-Modified"] = http_date(entry["modified"])
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+
+        return response
+
+    return wrapper
+
 
 class PublicStatsViewSet(viewsets.ViewSet):
     permission_classes = (AllowAny,)
@@ -52,6 +115,7 @@ class PublicStatsViewSet(viewsets.ViewSet):
 
         return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
+    @cached_stats
     def list(self, request):
         start_date = request.GET.get("start", None)
         end_date = request.GET.get("end", None)
@@ -64,12 +128,14 @@ class PublicStatsViewSet(viewsets.ViewSet):
         return Response(stats)
 
     @list_route()
+    @cached_stats
     def days_from_hearing(self, request):
         stats = CourtEmailCount.objects.get_stats_days_from_hearing()
 
         return Response(stats)
 
     @list_route()
+    @cached_stats
     def by_hearing(self, request):
 
         now = dt.date.today()
@@ -81,6 +147,7 @@ class PublicStatsViewSet(viewsets.ViewSet):
         return Response(stats)
 
     @list_route()
+    @cached_stats
     def all_by_hearing(self, request):
 
         stats = CourtEmailCount.objects.get_stats_by_hearing_date()
@@ -88,6 +155,7 @@ class PublicStatsViewSet(viewsets.ViewSet):
         return Response(stats)
 
     @list_route()
+    @cached_stats
     def by_week(self, request):
 
         stats = UsageStats.objects.last_six_months()
@@ -97,6 +165,7 @@ class PublicStatsViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
     @list_route()
+    @cached_stats
     def by_court(self, request):
         start_date = request.GET.get("start", None)
         end_date = request.GET.get("end", None)
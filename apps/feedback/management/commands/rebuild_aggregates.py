@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from ...models import UserRatingAggregate, UserRating
+from ...models import UserRatingAggregate
 
 
 
@@ -8,22 +8,10 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
 
-        # Empty existing aggregates
-        self.stdout.write("Deleting existing weekly aggregates... ", ending="")
-
-        count = str(len(UserRatingAggregate.objects.all()))
-        UserRatingAggregate.objects.all().delete()
-        self.stdout.write(count + " weekly aggregate(s) deleted.")
-
-        # Rebuild aggregates
         self.stdout.write("Rebuilding weekly aggregates... ", ending="")
 
-        ratings = UserRating.objects.all()
-
-        for rating in ratings:
-            UserRatingAggregate.objects.update_weekly_aggregate(rating)
+        count = UserRatingAggregate.objects.rebuild_weekly_aggregates()
 
-        count = str(len(UserRatingAggregate.objects.all()))
-        self.stdout.write(count + " weekly aggregates created.")
+        self.stdout.write(str(count) + " weekly aggregates created.")
 
         self.stdout.write("Done!")
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_weeks(apps, schema_editor):
+    """
+    Concurrent submissions could each create a row for the same week, merge
+    them into the first so the unique constraint can be added
+    """
+
+    UserRatingAggregate = apps.get_model("feedback", "UserRatingAggregate")
+
+    duplicates = UserRatingAggregate.objects\
+        .values("start_date", "question_tag")\
+        .order_by()\
+        .annotate(rows=Count("id"))\
+        .filter(rows__gt=1)
+
+    counters = ["rating_1", "rating_2", "rating_3", "rating_4", "rating_5", "total"]
+
+    for week in duplicates:
+        rows = list(UserRatingAggregate.objects
+                    .filter(start_date=week["start_date"], question_tag=week["question_tag"])
+                    .order_by("id"))
+
+        merged = rows[0]
+        for counter in counters:
+            setattr(merged, counter, sum(getattr(row, counter) for row in rows))
+        merged.save()
+
+        UserRatingAggregate.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback', '0005_userrating_comments'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='userratingaggregate',
+            options={'ordering': ('start_date', 'id')},
+        ),
+        migrations.RunPython(merge_duplicate_weeks, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='userratingaggregate',
+            unique_together=set([('start_date', 'question_tag')]),
+        ),
+    ]
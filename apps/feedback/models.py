@@ -1,11 +1,28 @@
 import datetime as dt
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Trunc
 from django.utils import translation
 
 from .forms import SATISFACTION_CHOICES, RATING_QUESTIONS
 
 
+def is_week_aligned(date):
+    """
+    Can a range boundary be served from the weekly aggregates?
+    """
+
+    return date is None or date.weekday() == 0
+
+
+def build_histogram(totals):
+    return {
+        "total": totals["total"] or 0,
+        "ratings": [totals["rating_{}".format(rating)] or 0 for rating in range(1, 6)]
+    }
+
+
 class UserRatingManager(models.Manager):
 
     def record(self, service_rating, call_centre_rating, comments=None):
@@ -26,6 +43,35 @@ class UserRatingManager(models.Manager):
         if call_centre_rating:
             UserRatingAggregate.objects.update_weekly_aggregate(obj, question_tag="call-centre")
 
+    def get_rating_histogram(self, start_date=None, end_date=None):
+        """
+        Count the overall service ratings between start_date and end_date.
+
+        Returns a dict with the total and a list of the number of
+        responses for each rating from 1 to 5, all counted by a single
+        conditional aggregate. Date ranges that fall on Monday boundaries
+        are answered from the weekly aggregates instead.
+        """
+
+        if is_week_aligned(start_date) and is_week_aligned(end_date):
+            return UserRatingAggregate.objects.get_rating_histogram(start_date, end_date)
+
+        qs = self.all()
+
+        if start_date:
+            qs = qs.filter(timestamp__gte=start_date)
+
+        if end_date:
+            qs = qs.filter(timestamp__lte=end_date)
+
+        annotations = {"total": Count("id")}
+
+        for rating in range(1, 6):
+            annotations["rating_{}".format(rating)] = Count(
+                models.Case(models.When(service_rating=rating, then=1)))
+
+        return build_histogram(qs.aggregate(**annotations))
+
 
 class UserRating(models.Model):
 
@@ -42,16 +88,26 @@ class UserRating(models.Model):
 
 class UserRatingAggregateManager(models.Manager):
 
+    @staticmethod
+    def get_week_start(timestamp):
+        """
+        Return the start of the week, e.g. the last Monday 00:00
+        """
+
+        return dt.datetime.combine(
+            timestamp - dt.timedelta(timestamp.weekday()),
+            dt.time.min)
+
     @translation.override("en")
     def update_weekly_aggregate(self, rating_obj, question_tag="overall"):
         """
         Amend a rating to the aggregate count.
+
+        The counters are incremented in the database with F() expressions so
+        concurrent submissions for the same week can't lose increments.
         """
 
-        # calculate start of week, e.g. the last Monday 00:00
-        start_date = dt.datetime.combine(
-            rating_obj.timestamp - dt.timedelta(rating_obj.timestamp.weekday()),
-            dt.time.min)
+        start_date = self.get_week_start(rating_obj.timestamp)
 
         # Get the rating we're processing here, overall or call centre
         if question_tag == "call-centre":
@@ -59,29 +115,105 @@ class UserRatingAggregateManager(models.Manager):
         else:
             rating = rating_obj.service_rating
 
+        rating_key = "rating_" + str(rating)
+
+        increments = {rating_key: F(rating_key) + 1,
+                      "total": F("total") + 1}
+
+        qs = self.filter(start_date=start_date, question_tag=question_tag)
+
+        if qs.update(**increments):
+            return
+
         try:
-            aggregate_obj = self.get(start_date=start_date, question_tag=question_tag)
-        except UserRatingAggregate.DoesNotExist:
-            aggregate_obj = UserRatingAggregate(
-                start_date=start_date,
-                question_tag=question_tag,
-                question_text=RATING_QUESTIONS[question_tag],
-                rating_1=0,
-                rating_2=0,
-                rating_3=0,
-                rating_4=0,
-                rating_5=0,
-                total=0)
+            with transaction.atomic():
+                self.create(start_date=start_date,
+                            question_tag=question_tag,
+                            question_text=RATING_QUESTIONS[question_tag],
+                            total=1,
+                            **{rating_key: 1})
+        except IntegrityError:
+            # Another submission created the week's row first
+            qs.update(**increments)
+
+    def get_rating_histogram(self, start_date=None, end_date=None):
+        """
+        Sum the overall weekly aggregates for the weeks between two
+        Mondays, in the same format as UserRating.objects.get_rating_histogram
+        """
 
-        rating_key = "rating_" + str(rating)
+        qs = self.filter(question_tag="overall")
+
+        if start_date:
+            qs = qs.filter(start_date__gte=start_date)
+
+        if end_date:
+            qs = qs.filter(start_date__lt=end_date)
 
-        current_rating = getattr(aggregate_obj, rating_key, 0)
-        current_rating += 1
+        return build_histogram(qs.aggregate(total=Sum("total"),
+                                            rating_1=Sum("rating_1"),
+                                            rating_2=Sum("rating_2"),
+                                            rating_3=Sum("rating_3"),
+                                            rating_4=Sum("rating_4"),
+                                            rating_5=Sum("rating_5")))
 
-        setattr(aggregate_obj, rating_key, current_rating)
-        aggregate_obj.total += 1
+    @translation.override("en")
+    def rebuild_weekly_aggregates(self):
+        """
+        Recalculate every weekly aggregate from the UserRating table.
+
+        All weeks and both questions are counted by a single grouped
+        query and written back with one bulk insert.
+        """
 
-        aggregate_obj.save()
+        annotations = {"total": Count("id")}
+
+        for rating in range(1, 6):
+            annotations["rating_{}".format(rating)] = Count(
+                models.Case(models.When(service_rating=rating, then=1)))
+            annotations["call_centre_rating_{}".format(rating)] = Count(
+                models.Case(models.When(call_centre_rating=rating, then=1)))
+
+        weeks = UserRating.objects\
+            .annotate(week=Trunc("timestamp", "week", output_field=models.DateTimeField()))\
+            .values("week")\
+            .order_by("week")\
+            .annotate(**annotations)
+
+        aggregates = []
+
+        for week in weeks:
+            aggregates.append(UserRatingAggregate(
+                start_date=week["week"],
+                question_tag="overall",
+                question_text=RATING_QUESTIONS["overall"],
+                rating_1=week["rating_1"],
+                rating_2=week["rating_2"],
+                rating_3=week["rating_3"],
+                rating_4=week["rating_4"],
+                rating_5=week["rating_5"],
+                total=week["total"]))
+
+            call_centre_total = sum(week["call_centre_rating_{}".format(rating)]
+                                    for rating in range(1, 6))
+
+            if call_centre_total:
+                aggregates.append(UserRatingAggregate(
+                    start_date=week["week"],
+                    question_tag="call-centre",
+                    question_text=RATING_QUESTIONS["call-centre"],
+                    rating_1=week["call_centre_rating_1"],
+                    rating_2=week["call_centre_rating_2"],
+                    rating_3=week["call_centre_rating_3"],
+                    rating_4=week["call_centre_rating_4"],
+                    rating_5=week["call_centre_rating_5"],
+                    total=call_centre_total))
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(aggregates)
+
+        return len(aggregates)
 
 
 class UserRatingAggregate(models.Model):
@@ -107,5 +239,6 @@ class UserRatingAggregate(models.Model):
     objects = UserRatingAggregateManager()
 
     class Meta:
-        ordering = ("start_date",)
+        ordering = ("start_date", "id")
+        unique_together = ("start_date", "question_tag")
 
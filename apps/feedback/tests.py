@@ -292,3 +292,66 @@ class UserRatingTestCase(TestCase):
         self.assertEquals(week2.rating_4, 0)
         self.assertEquals(week2.rating_5, 0)
         self.assertEquals(week2.total, 1)
+
+    def test_rebuild_weekly_aggregates(self):
+
+        UserRating.objects.record(5, "")
+        UserRating.objects.record(1, 3)
+
+        rating_obj = UserRating.objects.create(service_rating=3)
+        rating_obj.timestamp = dt.datetime.now() + dt.timedelta(7)
+        rating_obj.save()
+
+        UserRatingAggregate.objects.all().delete()
+
+        count = UserRatingAggregate.objects.rebuild_weekly_aggregates()
+
+        self.assertEquals(count, 3)
+
+        week1 = UserRatingAggregate.objects.get(
+            start_date=UserRatingAggregate.objects.get_week_start(dt.datetime.now()),
+            question_tag="overall")
+
+        self.assertEquals(week1.rating_1, 1)
+        self.assertEquals(week1.rating_5, 1)
+        self.assertEquals(week1.total, 2)
+
+        call_centre = UserRatingAggregate.objects.get(question_tag="call-centre")
+
+        self.assertEquals(call_centre.rating_3, 1)
+        self.assertEquals(call_centre.total, 1)
+
+        week2 = UserRatingAggregate.objects.get(
+            start_date=UserRatingAggregate.objects.get_week_start(rating_obj.timestamp),
+            question_tag="overall")
+
+        self.assertEquals(week2.rating_3, 1)
+        self.assertEquals(week2.total, 1)
+
+    def test_rating_histogram(self):
+
+        UserRating.objects.record(5, "")
+        UserRating.objects.record(5, "")
+        UserRating.objects.record(2, 3)
+
+        today = dt.date.today()
+        start_of_week = today - dt.timedelta(today.weekday())
+
+        expected = {"total": 3, "ratings": [0, 1, 0, 0, 2]}
+
+        # Not on week boundaries, counted from the ratings
+        self.assertEquals(
+            UserRating.objects.get_rating_histogram(
+                start_of_week - dt.timedelta(1), today + dt.timedelta(1)),
+            expected)
+
+        # On week boundaries, summed from the weekly aggregates
+        self.assertEquals(
+            UserRating.objects.get_rating_histogram(
+                start_of_week, start_of_week + dt.timedelta(7)),
+            expected)
+
+        self.assertEquals(
+            UserRating.objects.get_rating_histogram(
+                start_of_week + dt.timedelta(7), None),
+            {"total": 0, "ratings": [0, 0, 0, 0, 0]})
@@ -0,0 +1,295 @@
+"""
+Performance metrics for the stages of a MultiStageForm.
+
+Each load, save and render of a stage produces one sample with its wall time,
+the number and total time of its DB queries, the size of the session data and,
+for renders, the time spent rendering the template. Samples are passed to the
+sinks configured in settings.FORM_STAGE_METRICS_SINKS, e.g.:
+
+    FORM_STAGE_METRICS_SINKS = [
+        {"BACKEND": "apps.forms.metrics.MemorySink", "OPTIONS": {"size": 1000}},
+        {"BACKEND": "apps.forms.metrics.StatsdSink", "OPTIONS": {"host": "localhost"}},
+    ]
+
+Nothing is measured when the list is empty.
+
+Queries are counted by wrapping the cursors the connection hands out while a
+phase runs, which keeps no SQL and so is on unless
+settings.FORM_STAGE_METRICS_QUERIES is set to False. The session size is only
+measured on save, the phase that changes it.
+"""
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("wall_time", "query_count", "query_time", "session_size", "template_time")
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class LogSink(object):
+    """
+    Writes each sample to the log as json.
+    """
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def record(self, sample):
+        logger.log(self.level, "Form stage metrics: %s", json.dumps(sample, sort_keys=True))
+
+
+class StatsdSink(object):
+    """
+    Sends each sample to a statsd server over UDP, as timers for the times
+    and gauges for the counts and sizes.
+    """
+
+    def __init__(self, host="localhost", port=8125, prefix="makeaplea.stages"):
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, sample):
+        name = "{}.{}.{}".format(self.prefix, sample["stage"], sample["phase"])
+
+        lines = []
+        for metric in METRICS:
+            value = sample.get(metric)
+            if value is not None:
+                lines.append("{}.{}:{}|{}".format(name, metric, value, "ms" if metric.endswith("_time") else "g"))
+
+        try:
+            self.socket.sendto("\n".join(lines).encode("utf-8"), self.address)
+        except socket.error:
+            logger.warning("Couldn't send form stage metrics to statsd", exc_info=True)
+
+
+class MemorySink(object):
+    """
+    Keeps the latest samples for each stage and phase in this process, for
+    the stage metrics view.
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.size))
+
+    def record(self, sample):
+        with self.lock:
+            self.samples[(sample["stage"], sample["phase"])].append(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        """
+        Percentiles of each metric, by stage and phase.
+        """
+        with self.lock:
+            samples = {key: list(values) for key, values in self.samples.items()}
+
+        summary = defaultdict(dict)
+
+        for (stage, phase), values in samples.items():
+            metrics = {}
+            for metric in METRICS:
+                points = sorted(sample[metric] for sample in values if sample.get(metric) is not None)
+                if points:
+                    metrics[metric] = get_percentiles(points)
+            metrics["count"] = len(values)
+            summary[stage][phase] = metrics
+
+        return dict(summary)
+
+
+def get_percentiles(points):
+    """
+    Nearest-rank percentiles of a sorted list.
+    """
+    percentiles = {"p{}".format(percentile): points[max(0, -(-len(points) * percentile // 100) - 1)]
+                   for percentile in PERCENTILES}
+    percentiles["max"] = points[-1]
+
+    return percentiles
+
+
+_sinks = None
+
+
+def get_sinks():
+    global _sinks
+
+    if _sinks is None:
+        _sinks = [import_string(sink["BACKEND"])(**sink.get("OPTIONS", {}))
+                  for sink in getattr(settings, "FORM_STAGE_METRICS_SINKS", [])]
+
+    return _sinks
+
+
+@receiver(setting_changed)
+def reset_sinks(setting, **kwargs):
+    global _sinks
+
+    if setting == "FORM_STAGE_METRICS_SINKS":
+        _sinks = None
+
+
+def get_memory_sinks():
+    return [sink for sink in get_sinks() if isinstance(sink, MemorySink)]
+
+
+def get_session_size(data):
+    return len(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def should_count_queries():
+    return getattr(settings, "FORM_STAGE_METRICS_QUERIES", True)
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def run(self, method, *args):
+        start = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.time += time.time() - start
+            self.count += 1
+
+
+class CountingCursorWrapper(object):
+    """
+    Passes everything through to the cursor, counting and timing the calls
+    that run queries.
+    """
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def callproc(self, procname, params=None):
+        return self.counter.run(self.cursor.callproc, procname, params)
+
+    def execute(self, sql, params=None):
+        return self.counter.run(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self.counter.run(self.cursor.executemany, sql, param_list)
+
+
+@contextmanager
+def count_queries(using=DEFAULT_DB_ALIAS):
+    """
+    Count and time the queries run on a connection, without logging them.
+
+    Wraps the cursors the connection makes, debug or not, much as
+    connection.execute_wrapper does from Django 2.0.
+    """
+    db = connections[using]
+    counter = QueryCounter()
+    replaced = {}
+
+    for name in ("make_cursor", "make_debug_cursor"):
+        if name in db.__dict__:
+            replaced[name] = db.__dict__[name]
+
+        def make_cursor(cursor, make_cursor=getattr(db, name)):
+            return CountingCursorWrapper(make_cursor(cursor), counter)
+
+        setattr(db, name, make_cursor)
+
+    try:
+        yield counter
+    finally:
+        for name in ("make_cursor", "make_debug_cursor"):
+            if name in replaced:
+                setattr(db, name, replaced[name])
+            else:
+                delattr(db, name)
+
+
+def get_sample(form, phase, wall_time, query_count=None, query_time=None):
+    template_time = getattr(form.current_stage, "template_time", None) if phase == "render" else None
+
+    return {
+        "stage": form.current_stage_class.__name__,
+        "phase": phase,
+        "wall_time": round(wall_time * 1000, 3),
+        "query_count": query_count,
+        "query_time": round(query_time * 1000, 3) if query_time is not None else None,
+        "session_size": get_session_size(form.storage_dict) if phase == "save" else None,
+        "template_time": round(template_time * 1000, 3) if template_time is not None else None,
+    }
+
+
+@contextmanager
+def measure(form, phase):
+    """
+    Time a phase of the form's current stage and pass the sample to the sinks.
+
+    A phase measured inside another measurement of the same form, such as a
+    subclass's save calling the base class's, is only counted once.
+    """
+    sinks = get_sinks()
+
+    if not sinks or getattr(form, "_measuring", False):
+        yield
+        return
+
+    form._measuring = True
+
+    with ExitStack() as stack:
+        counter = stack.enter_context(count_queries()) if should_count_queries() else None
+
+        start = time.time()
+
+        try:
+            yield
+        finally:
+            wall_time = time.time() - start
+            form._measuring = False
+
+    try:
+        sample = get_sample(form, phase, wall_time,
+                            counter.count if counter else None,
+                            counter.time if counter else None)
+    except Exception:
+        logger.exception("Couldn't measure form stage %s", phase)
+        return
+
+    for sink in sinks:
+        try:
+            sink.record(sample)
+        except Exception:
+            logger.exception("Form stage metrics sink %s failed", sink.__class__.__name__)
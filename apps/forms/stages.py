@@ -1,12 +1,15 @@
 
 from apps.plea.models import CaseTracker, Case
 
+import time
 from collections import OrderedDict, namedtuple
 
 from django.core.urlresolvers import reverse
 from django.contrib import messages
 from django.http import Http404, HttpResponseRedirect, QueryDict
 from django.shortcuts import render
+
+from .metrics import measure
 import logging
 logger = logging.getLogger(__name__)
 
@@ -22,6 +25,7 @@ class FormStage(object):
         self.context = {}
         self.messages = []
         self.stage_completion = None
+        self.template_time = None
 
         if not hasattr(self, "storage_key"):
             self.storage_key = self.name
@@ -129,7 +133,10 @@ class FormStage(object):
             context = self.context
             context.update({k: v for (k, v) in self.all_data.items()})
             context["form"] = self.form
-            return render(request, self.template, context)
+            start = time.time()
+            response = render(request, self.template, context)
+            self.template_time = time.time() - start
+            return response
 
 
 class IndexedStage(FormStage):
@@ -196,6 +203,10 @@ class MultiStageForm(object):
         self.storage_dict.update({key: val for (key, val) in self.all_data.items()})
 
     def load(self, request_context):
+        with measure(self, "load"):
+            return self._load(request_context)
+
+    def _load(self, request_context):
         self.request_context = request_context
 
         if issubclass(self.current_stage_class, IndexedStage):
@@ -221,6 +232,10 @@ class MultiStageForm(object):
         return self.current_stage.load(request_context)
 
     def save(self, form_data, request_context, next_step=None):
+        with measure(self, "save"):
+            return self._save(form_data, request_context, next_step)
+
+    def _save(self, form_data, request_context, next_step=None):
         self.request_context = request_context
         next_url = None
         if next_step:
@@ -249,4 +264,5 @@ class MultiStageForm(object):
     def render(self, request, request_context=None):
         if request_context is None:
             request_context = self.request_context
-        return self.current_stage.render(request, request_context)
+        with measure(self, "render"):
+            return self.current_stage.render(request, request_context)
@@ -2,12 +2,15 @@ from mock import Mock, patch
 
 from django import forms
 from django.contrib import messages
+from django.db import connection
 from django.forms.formsets import formset_factory
 from django.http import Http404
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.test.client import RequestFactory
 from django.utils import translation
 from .forms import to_bool, BaseStageForm
+from .metrics import count_queries, get_memory_sinks, get_percentiles
 from .stages import MultiStageForm, FormStage
 
 
@@ -545,3 +548,71 @@ class TestMultiStageForm(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Enter a whole number")
         self.assertContains(response, "This field is required")
+
+
+@override_settings(FORM_STAGE_METRICS_SINKS=[{"BACKEND": "apps.forms.metrics.MemorySink"}])
+class TestStageMetrics(TestCase):
+    def setUp(self):
+        self.request_context = Mock()
+        self.request_context.request = RequestFactory().get('/dummy')
+
+        get_memory_sinks()[0].clear()
+
+    @patch("apps.forms.stages.reverse", reverse)
+    def test_each_phase_is_recorded(self):
+        msf = MultiStageFormTest({}, "stage_2")
+        msf.load(self.request_context)
+        msf.save({"field1": "", "field2": 10}, self.request_context)
+        msf.render(msf.get_request_mock())
+
+        summary = get_memory_sinks()[0].summary()
+
+        self.assertEqual(set(summary["Stage2"].keys()), {"load", "save", "render"})
+        self.assertEqual(summary["Stage2"]["save"]["count"], 1)
+        self.assertIn("template_time", summary["Stage2"]["render"])
+        self.assertNotIn("template_time", summary["Stage2"]["load"])
+        self.assertGreater(summary["Stage2"]["save"]["session_size"]["max"], 2)
+
+    @patch("apps.forms.stages.reverse", reverse)
+    def test_queries_counted_without_logging(self):
+        queries_before = len(connection.queries_log)
+
+        msf = MultiStageFormTest({}, "stage_2")
+        msf.load(self.request_context)
+
+        self.assertEqual(len(connection.queries_log), queries_before)
+        self.assertIn("query_count", get_memory_sinks()[0].summary()["Stage2"]["load"])
+
+    @patch("apps.forms.stages.reverse", reverse)
+    @override_settings(FORM_STAGE_METRICS_QUERIES=False)
+    def test_queries_not_counted_when_disabled(self):
+        msf = MultiStageFormTest({}, "stage_2")
+        msf.load(self.request_context)
+
+        self.assertNotIn("query_count", get_memory_sinks()[0].summary()["Stage2"]["load"])
+
+    def test_count_queries(self):
+        with count_queries() as counter:
+            connection.cursor().execute("SELECT 1")
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 2")
+
+            # The debug cursor assertNumQueries uses is counted too
+            with self.assertNumQueries(1):
+                connection.cursor().execute("SELECT 3")
+
+        self.assertEqual(counter.count, 3)
+        self.assertGreater(counter.time, 0)
+        self.assertFalse(connection.queries_logged)
+
+        connection.cursor().execute("SELECT 4")
+
+        self.assertEqual(counter.count, 3)
+
+    def test_percentiles(self):
+        percentiles = get_percentiles(list(range(1, 101)))
+
+        self.assertEqual(percentiles["p50"], 50)
+        self.assertEqual(percentiles["p99"], 99)
+        self.assertEqual(percentiles["max"], 100)
+        self.assertEqual(get_percentiles([7])["p90"], 7)
@@ -1,5 +1,6 @@
 import datetime as dt
 
+from django.contrib.auth.models import User
 from django.test import TestCase
 
 from apps.plea.models import Court, Case, OUCode
@@ -125,4 +126,17 @@ class TestStatsLogic(TestCase):
         self.assertEquals(stats["submissions"]["value"], 1)
 
 
+class TestStageMetricsView(TestCase):
 
+    def test_staff_only(self):
+        User.objects.create_user("staff", "staff@example.org", "secret", is_staff=True)
+
+        response = self.client.get("/stage-metrics/")
+
+        self.assertEqual(response.status_code, 404)
+
+        self.client.login(username="staff", password="secret")
+        response = self.client.get("/stage-metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("stages", response.json())
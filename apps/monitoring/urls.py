@@ -1,8 +1,9 @@
 from django.conf.urls import url
 
-from .views import CourtDataView
+from .views import CourtDataView, stage_metrics
 
 
 urlpatterns = (
     url(r"service-status/", CourtDataView.as_view()),
+    url(r"^stage-metrics/$", stage_metrics, name="stage_metrics"),
 )
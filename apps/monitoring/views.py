@@ -1,14 +1,19 @@
 from collections import OrderedDict
 import datetime as dt
+import json
 import operator
+import os
 from functools import reduce
 from django.views.generic.base import TemplateView
 from django.db.models import Q
+from django.http import HttpResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 
+from apps.forms.metrics import get_memory_sinks
 from apps.plea.models import Case, Court
+from make_a_plea.helpers import staff_or_404
 
 
 FIELD_NAMES = OrderedDict([
@@ -156,6 +161,18 @@ class CourtDataView(TemplateView):
         #    - total results emails sent
 
 
+@staff_or_404
+def stage_metrics(request):
+    """
+    Percentiles of the form stage metrics recorded by this process, by stage
+    and phase. Times are in milliseconds and sizes in bytes.
+    """
 
+    stages = {}
+    for sink in get_memory_sinks():
+        stages.update(sink.summary())
 
-
+    return HttpResponse(
+        json.dumps({"process": os.getpid(), "stages": stages}, indent=4, sort_keys=True),
+        content_type="application/json",
+    )
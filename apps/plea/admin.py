@@ -1,20 +1,21 @@
 from __future__ import division
 
-from datetime import date, timedelta
+from datetime import date
 from functools import update_wrapper
 
 from django.core import urlresolvers
+from django.core.cache import cache
 from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
 from django.shortcuts import render
 from django.template import RequestContext
-from django.db.models import Count, When, IntegerField, Q
-from django.db.models import Case as case2
+from django.db.models import Count
 from apps.plea.models import (
     AuditEvent,
     Court,
     Case,
     CaseAction,
+    CaseLanguageStats,
     CaseOffenceFilter,
     CourtEmailCount,
     DataValidation,
@@ -38,7 +39,7 @@ class RegionalFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(urn_entered__startswith=self.value())
+            return queryset.filter(urn_region=self.value())
         else:
             return queryset
 
@@ -177,22 +178,7 @@ class CaseAdmin(admin.ModelAdmin):
 
     def initial_report_view(self, request):
         cutoff_date = date(2017,7,31)
-        case_month_data = Case.objects.filter(completed_on__isnull=False).filter(completed_on__lte=cutoff_date)\
-            .extra(select={'month': "EXTRACT(month FROM completed_on)",'year': "EXTRACT(year FROM completed_on)", })\
-            .values('month', 'year')\
-            .annotate(total_welsh_cases=Count(case2(When(language='cy', then=1,))), total_cases=Count('completed_on'),
-                      total_welsh_with_english_postcodes=Count(case2(When(Q(language='cy')
-                                                                           & Q(extra_data__has_key='PostCode')
-                                                                           & ~Q(extra_data__PostCode__istartswith='cf')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ch')
-                                                                           & ~Q(extra_data__PostCode__istartswith='hr')
-                                                                           & ~Q(extra_data__PostCode__istartswith='np')
-                                                                           & ~Q(extra_data__PostCode__istartswith='gl')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ld')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ll')
-                                                                           & ~Q(extra_data__PostCode__istartswith='sa')
-                                                                           & ~Q(extra_data__PostCode__istartswith='sy')
-                                                                          , then=1))))
+        case_month_data = CaseLanguageStats.objects.get_months(completed_to=cutoff_date)
         return render(request, self.initial_report_template, {
             'title': 'Case Initial Report',
             'opts': self.model._meta,
@@ -202,22 +188,7 @@ class CaseAdmin(admin.ModelAdmin):
 
     def ongoing_report_view(self, request):
         cutoff_date = date(2017,7,31)
-        case_month_data = Case.objects.filter(completed_on__isnull=False).filter(completed_on__gte=cutoff_date)\
-            .extra(select={'month': "EXTRACT(month FROM completed_on)",'year': "EXTRACT(year FROM completed_on)",})\
-            .values('month', 'year')\
-            .annotate(total_welsh_cases=Count(case2(When(language='cy', then=1,))), total_cases=Count('completed_on'),
-                      total_welsh_with_english_postcodes=Count(case2(When(Q(language='cy')
-                                                                           & Q(extra_data__has_key='PostCode')
-                                                                           & ~Q(extra_data__PostCode__istartswith='cf')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ch')
-                                                                           & ~Q(extra_data__PostCode__istartswith='hr')
-                                                                           & ~Q(extra_data__PostCode__istartswith='np')
-                                                                           & ~Q(extra_data__PostCode__istartswith='gl')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ld')
-                                                                           & ~Q(extra_data__PostCode__istartswith='ll')
-                                                                           & ~Q(extra_data__PostCode__istartswith='sa')
-                                                                           & ~Q(extra_data__PostCode__istartswith='sy')
-                                                                          , then=1))))
+        case_month_data = CaseLanguageStats.objects.get_months(completed_from=cutoff_date)
         return render(request, self.ongoing_report_template, {
             'title': 'Case Ongoing Report',
             'opts': self.model._meta,
@@ -244,6 +215,7 @@ class DataValidationAdmin(admin.ModelAdmin):
 
     statistics_template = "admin/statistics.html"
     change_list_template = "admin/datavalidation_change_list.html"
+    statistics_cache_seconds = 600
 
     def get_urls(self):
         from django.conf.urls import url
@@ -267,34 +239,23 @@ class DataValidationAdmin(admin.ModelAdmin):
 
         return urls + super_urls
 
-    def statistics_view(self, request):
-        default_recent = 30
-        try:
-            recent_days = int(request.GET.get("days", default_recent))
-            if recent_days < 1:
-                recent_days = default_recent
-        except ValueError:
-            recent_days = default_recent
+    @staticmethod
+    def get_region_statistics(recent_days):
+        region_counts = DataValidation.objects.get_region_statistics(recent_days)
 
         regions = []
-        court_codes = []
-        for court in Court.objects.all():
-            court_codes.append(court.region_code)
-            dv = DataValidation.objects.filter(
-                urn_entered__startswith=court.region_code,
-                date_entered__lte=date.today() - timedelta(days=recent_days))
-            all_total = dv.count()
-            all_matched = dv.filter(case_match_count__gt=0).count()
-
-            if all_total > 0:
-                all_percentage = round(all_matched / all_total * 100, 2)
-            else:
-                all_percentage = 0
+        for court in Court.objects.only("court_name", "region_code"):
+            counts = region_counts.get(court.region_code)
 
-            dv_recent = DataValidation.objects.filter(urn_entered__startswith=court.region_code,
-                                                      date_entered__gt=date.today() - timedelta(days=recent_days))
-            recent_total = dv_recent.count()
-            recent_matched = dv_recent.filter(case_match_count__gt=0).count()
+            if not counts or counts["all_total"] == 0:
+                continue
+
+            all_total = counts["all_total"]
+            all_matched = counts["all_matched"]
+            all_percentage = round(all_matched / all_total * 100, 2)
+
+            recent_total = counts["recent_total"]
+            recent_matched = counts["recent_matched"]
             if recent_total > 0:
                 recent_percentage = round(recent_matched / recent_total * 100, 2)
             else:
@@ -306,16 +267,33 @@ class DataValidationAdmin(admin.ModelAdmin):
             else:
                 change_percentage = "{}".format(change_percentage)
 
-            if all_total > 0:
-                reg = {"name": court.court_name,
-                       "all_total": all_total,
-                       "all_matched": all_matched,
-                       "all_percentage": all_percentage,
-                       "recent_total": recent_total,
-                       "recent_matched": recent_matched,
-                       "recent_percentage": recent_percentage,
-                       "change_percentage": change_percentage}
-                regions.append(reg)
+            regions.append({"name": court.court_name,
+                            "all_total": all_total,
+                            "all_matched": all_matched,
+                            "all_percentage": all_percentage,
+                            "recent_total": recent_total,
+                            "recent_matched": recent_matched,
+                            "recent_percentage": recent_percentage,
+                            "change_percentage": change_percentage})
+
+        return regions
+
+    def statistics_view(self, request):
+        default_recent = 30
+        try:
+            recent_days = int(request.GET.get("days", default_recent))
+            if recent_days < 1:
+                recent_days = default_recent
+        except ValueError:
+            recent_days = default_recent
+
+        cache_key = "datavalidation_statistics_{}_{}".format(date.today().isoformat(), recent_days)
+
+        regions = cache.get(cache_key)
+
+        if regions is None:
+            regions = self.get_region_statistics(recent_days)
+            cache.set(cache_key, regions, self.statistics_cache_seconds)
 
         return render(request, self.statistics_template, {
             'title': 'Data Validation Statistics',
@@ -4,6 +4,23 @@ from django.core.mail.message import EmailMessage
 from django.template.loader import render_to_string
 
 
+def get_route_connection(route):
+    """
+    An unopened SMTP connection for one of settings.SMTP_ROUTES.
+    """
+    route_host = settings.SMTP_ROUTES[route]["HOST"]
+    route_port = settings.SMTP_ROUTES[route]["PORT"]
+    route_user = settings.SMTP_ROUTES[route].get("USERNAME", '')
+    route_password = settings.SMTP_ROUTES[route].get("PASSWORD", '')
+    route_use_tls = settings.SMTP_ROUTES[route].get("USE_TLS", True)
+
+    return get_connection(host=route_host,
+                          port=route_port,
+                          username=route_user,
+                          password=route_password,
+                          use_tls=route_use_tls)
+
+
 class TemplateAttachmentEmail(object):
     """
     Email with a templated attachment.
@@ -18,20 +35,9 @@ class TemplateAttachmentEmail(object):
         self.attachment_data = attachment_data
         self.attachment_mime = attachment_mime
 
-    def send(self, to_address, subject, body, route=None):
-        connection = None
-        if route:
-            route_host = settings.SMTP_ROUTES[route]["HOST"]
-            route_port = settings.SMTP_ROUTES[route]["PORT"]
-            route_user = settings.SMTP_ROUTES[route].get("USERNAME", '')
-            route_password = settings.SMTP_ROUTES[route].get("PASSWORD", '')
-            route_use_tls = settings.SMTP_ROUTES[route].get("USE_TLS", True)
-
-            connection = get_connection(host=route_host,
-                                        port=route_port,
-                                        username=route_user,
-                                        password=route_password,
-                                        use_tls=route_use_tls)
+    def send(self, to_address, subject, body, route=None, connection=None):
+        if connection is None and route:
+            connection = get_route_connection(route)
 
         self.attachment_content = render_to_string(self.attachment_template,
                                                    self.attachment_data)
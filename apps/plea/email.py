@@ -9,8 +9,8 @@ from django.utils.text import wrap
 from django.utils import translation
 from django.utils.translation import ugettext as _
 
-from .models import Case, CourtEmailCount, Court
-from .encrypt import encrypt_and_store_user_data
+from .models import Case, CaseLanguageStats, CourtEmailCount, Court
+from .encrypt import encrypt_and_store_user_data, store_submission_payload
 from .tasks import email_send_court, email_send_prosecutor, email_send_user
 from .standardisers import format_for_region, standardise_name
 
@@ -93,6 +93,7 @@ def send_plea_email(context_data):
 
     case.language = translation.get_language().split("-")[0]
     case.name = standardise_name(first_name, last_name)
+    first_completion = case.completed_on is None
     case.completed_on = dt.datetime.now()
 
     if context_data["case"]["plea_made_by"] == "Company representative":
@@ -107,9 +108,16 @@ def send_plea_email(context_data):
 
     case.save()
 
+    if first_completion:
+        CaseLanguageStats.objects.record_completed_case(case)
+
     if getattr(settings, "STORE_USER_DATA", True):
         encrypt_and_store_user_data(case.urn, case.id, context_data)
 
+    # The email tasks read the form data back from here rather than carrying
+    # it in every message and retry
+    store_submission_payload(case.id, context_data)
+
     if not court_obj.test_mode:
         # don't add test court entries to the anon stat data
         email_count = CourtEmailCount()
@@ -121,12 +129,12 @@ def send_plea_email(context_data):
     else:
         # use a fake email count ID as we're using a test record
         email_count_id = "XX"
-    email_send_court.delay(case.id, email_count_id, context_data)
+    email_send_court.delay(case.id, email_count_id)
 
     # No longer attempting to send prosecutor email as it is no longer required
     # Contact Paul Ridings for further info
     #if court_obj.plp_email:
-    #email_send_prosecutor.delay(case.id, context_data)
+    #email_send_prosecutor.delay(case.id)
 
     if email_address:
         data = {
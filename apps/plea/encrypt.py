@@ -5,8 +5,11 @@ import time
 import logging
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.core.serializers.json import DjangoJSONEncoder
 
+from .models import SubmissionPayload
+
 
 gpg = gnupg.GPG(gnupghome=settings.GPG_HOME_DIRECTORY)
 gpg.encoding = 'utf-8'
@@ -74,3 +77,76 @@ def encrypt_and_store_user_data(urn, case_id, data, user_data_directory=None):
     finally:
         if 'fd' in locals():
             os.close(fd)
+
+
+def decrypt_user_data(file_path, passphrase=None):
+    """
+    Decrypt a file written by encrypt_and_store_user_data, returning the
+    json it contains. Needs the private key for settings.GPG_RECIPIENT in
+    settings.GPG_HOME_DIRECTORY.
+    """
+
+    with open(file_path, "rb") as fd:
+        decrypted_data = gpg.decrypt_file(fd, passphrase=passphrase)
+
+    if not decrypted_data.ok:
+        raise PersistenceError(
+            "GPG decryption failed: {}".format(decrypted_data.status))
+
+    return decrypted_data.data.decode(gpg.encoding)
+
+
+def get_submission_payload_passphrase():
+    passphrase = getattr(settings, "SUBMISSION_PAYLOAD_PASSPHRASE", "")
+
+    if not passphrase:
+        raise ImproperlyConfigured("SUBMISSION_PAYLOAD_PASSPHRASE must be set")
+
+    return passphrase
+
+
+def store_submission_payload(case_id, data):
+    """
+    Encrypt the form data of a submission and store it against the case, so
+    the email tasks can be queued with just the case id.
+
+    Unlike encrypt_and_store_user_data, which encrypts to the offline
+    settings.GPG_RECIPIENT key, the payload is encrypted symmetrically with
+    settings.SUBMISSION_PAYLOAD_PASSPHRASE so the workers can read it back.
+
+    It is the message the court email task sends rather than a copy of the
+    user's data, so it is stored whatever settings.STORE_USER_DATA says, and
+    deleted by delete_submission_payload once the court email is done with.
+    """
+
+    data = json.dumps(data, cls=DjangoJSONEncoder)
+
+    encrypted_data = gpg.encrypt(data, None, symmetric="AES256", armor=True,
+                                 passphrase=get_submission_payload_passphrase())
+
+    if not encrypted_data.ok:
+        raise PersistenceError(
+            "GPG encryption failed: {}".format(encrypted_data.status))
+
+    SubmissionPayload.objects.update_or_create(case_id=case_id,
+                                               defaults={"payload": str(encrypted_data)})
+
+
+def delete_submission_payload(case_id):
+    SubmissionPayload.objects.filter(case_id=case_id).delete()
+
+
+def load_submission_payload(case_id):
+    """
+    Fetch and decrypt the form data stored by store_submission_payload.
+    """
+
+    payload = SubmissionPayload.objects.get(case_id=case_id).payload
+
+    decrypted_data = gpg.decrypt(payload, passphrase=get_submission_payload_passphrase())
+
+    if not decrypted_data.ok:
+        raise PersistenceError(
+            "GPG decryption failed: {}".format(decrypted_data.status))
+
+    return json.loads(decrypted_data.data.decode(gpg.encoding))
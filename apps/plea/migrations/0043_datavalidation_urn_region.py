@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0042_usagestats_court'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datavalidation',
+            name='urn_region',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='The first two characters of the entered URN', max_length=2),
+        ),
+        migrations.RunSQL(
+            "UPDATE plea_datavalidation SET urn_region = left(urn_entered, 2)",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterIndexTogether(
+            name='datavalidation',
+            index_together=set([('urn_region', 'date_entered')]),
+        ),
+    ]
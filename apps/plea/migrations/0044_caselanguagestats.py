@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0043_datavalidation_urn_region'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='welsh_postcode_area',
+            field=models.NullBooleanField(help_text='Is the postcode in a Welsh postcode area? Empty if there is no postcode.'),
+        ),
+        migrations.CreateModel(
+            name='CaseLanguageStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(unique=True)),
+                ('total_cases', models.PositiveIntegerField(default=0)),
+                ('total_welsh_cases', models.PositiveIntegerField(default=0)),
+                ('total_welsh_with_english_postcodes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('start_date',),
+                'verbose_name_plural': 'Case language stats',
+            },
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE plea_case
+            SET welsh_postcode_area = lower(coalesce(extra_data -> 'PostCode', '')) ~ '^(cf|ch|hr|np|gl|ld|ll|sa|sy)'
+            WHERE extra_data ? 'PostCode'
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO plea_caselanguagestats
+                (start_date, total_cases, total_welsh_cases, total_welsh_with_english_postcodes)
+            SELECT date_trunc('month', completed_on)::date,
+                   count(*),
+                   count(CASE WHEN language = 'cy' THEN 1 END),
+                   count(CASE WHEN language = 'cy' AND welsh_postcode_area = false THEN 1 END)
+            FROM plea_case
+            WHERE completed_on IS NOT NULL
+            GROUP BY 1
+            """,
+            "DELETE FROM plea_caselanguagestats",
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0044_caselanguagestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionPayload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField(help_text='Symmetrically encrypted, ASCII armoured JSON')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('case', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='submission_payload', to='plea.Case')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0045_submissionpayload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailSendLedger',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('court', 'Court'), ('prosecutor', 'Prosecutor'), ('user', 'User')], max_length=20)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('sending', 'Sending'), ('sent', 'Sent')], max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(default=datetime.datetime.now)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_sends', to='plea.Case')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='emailsendledger',
+            unique_together=set([('case', 'kind', 'fingerprint')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0046_emailsendledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmtpRouteStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('route', models.CharField(max_length=10, unique=True)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('retry_at', models.DateTimeField(blank=True, help_text='Set while the circuit is open, when the route may next be tried', null=True)),
+                ('parked', models.PositiveIntegerField(default=0, help_text='Tasks parked since the circuit opened')),
+                ('last_failure', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'SMTP route statuses',
+            },
+        ),
+    ]
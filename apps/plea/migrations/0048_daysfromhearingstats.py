@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0047_smtproutestatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DaysFromHearingStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('days_from_hearing', models.PositiveIntegerField()),
+                ('submissions', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('date', 'days_from_hearing'),
+                'verbose_name_plural': 'Days from hearing stats',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='daysfromhearingstats',
+            unique_together=set([('date', 'days_from_hearing')]),
+        ),
+    ]
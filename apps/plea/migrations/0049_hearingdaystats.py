@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0048_daysfromhearingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HearingDayStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hearing_day', models.DateField(unique=True)),
+                ('submissions', models.IntegerField(default=0)),
+                ('pleas', models.IntegerField(default=0)),
+                ('guilty', models.IntegerField(default=0)),
+                ('not_guilty', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('hearing_day',),
+                'verbose_name_plural': 'Hearing day stats',
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO plea_hearingdaystats
+                (hearing_day, submissions, pleas, guilty, not_guilty)
+            SELECT email_count.hearing_date::date,
+                   count(*),
+                   sum(email_count.total_pleas),
+                   sum(email_count.total_guilty),
+                   sum(email_count.total_not_guilty)
+            FROM plea_courtemailcount email_count
+            JOIN plea_court court ON court.id = email_count.court_id
+            WHERE email_count.sent AND NOT court.test_mode
+            GROUP BY 1
+            """,
+            "DELETE FROM plea_hearingdaystats",
+        ),
+    ]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from dateutil.parser import parse as date_parse
+from django.db import models, migrations
+from django.db.models import Count
+from apps.plea.standardisers import standardise_postcode
+
+
+def populate_auth_fields(apps, schema_editor):
+    Case = apps.get_model("plea", "Case")
+
+    cases = Case.objects.annotate(num_offences=Count("offences")).iterator()
+
+    for case in cases:
+        extra_data = case.extra_data or {}
+
+        try:
+            case.dob = date_parse(extra_data["DOB"]).date() if extra_data.get("DOB") else None
+        except (ValueError, OverflowError):
+            case.dob = None
+
+        case.postcode = standardise_postcode(extra_data.get("PostCode") or "") or None
+
+        case.forename = extra_data.get("Forename1") or None
+        case.surname = extra_data.get("Surname") or None
+        case.organisation_name = extra_data.get("OrganisationName") or None
+        case.offence_count = case.num_offences
+
+        case.save(update_fields=["dob", "postcode", "forename", "surname",
+                                 "organisation_name", "offence_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plea', '0049_hearingdaystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='dob',
+            field=models.DateField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='postcode',
+            field=models.TextField(help_text='Standardised', null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='forename',
+            field=models.TextField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='surname',
+            field=models.TextField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='organisation_name',
+            field=models.TextField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='offence_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_auth_fields, migrations.RunPython.noop),
+        # urn__iexact compares UPPER(urn), which the index on urn can't serve
+        migrations.RunSQL(
+            """
+            CREATE INDEX plea_case_urn_upper_sent ON plea_case (UPPER(urn::text), sent);
+            CREATE INDEX plea_case_urn_upper_auth ON plea_case (UPPER(urn::text))
+                WHERE surname IS NOT NULL AND forename IS NOT NULL AND dob IS NOT NULL;
+            """,
+            """
+            DROP INDEX plea_case_urn_upper_sent;
+            DROP INDEX plea_case_urn_upper_auth;
+            """),
+    ]
@@ -1,13 +1,21 @@
+import hashlib
+import random
 from collections import Counter
 from dateutil.parser import parse as date_parse
+from dateutil.relativedelta import relativedelta
 import datetime as dt
 
-from django.db import models
-from django.db.models import Sum, Count, F
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Sum, Count, F, Max, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.functions import Trunc, TruncDate
 from django.utils.translation import get_language
 from django.contrib.postgres.fields import HStoreField
 from django.core.exceptions import ValidationError
+from django.dispatch import receiver
 
+from . import stats_cache
 from .exceptions import *
 from .standardisers import (
     standardise_name, StandardiserNoOutputException, standardise_urn,
@@ -36,6 +44,13 @@ NOTICE_TYPES_CHOICES = (("both", "Both"),
                         ("sjp", "SJP"),
                         ("non-sjp", "Non-SJP"))
 
+# Postcode areas that are wholly or partly in Wales, used by the Welsh
+# language reports
+WELSH_POSTCODE_AREAS = ("cf", "ch", "hr", "np", "gl", "ld", "ll", "sa", "sy")
+
+# The date the guilty plea types (attend court / no court) were introduced
+PLEA_TYPE_CHANGE_DATE = dt.date(2018, 5, 21)
+
 def get_totals(qs):
     totals = qs.aggregate(Sum('total_pleas'),
                           Sum('total_guilty'),
@@ -52,6 +67,18 @@ def get_totals(qs):
     }
 
 
+class DaysBetween(models.Func):
+    """
+    The whole number of days from the start datetime to the end datetime, as
+    timedelta.days gives for positive intervals.
+    """
+    template = "CAST(DATE_PART('day', %(expressions)s) AS integer)"
+    arg_joiner = " - "
+
+    def __init__(self, end, start, **extra):
+        super(DaysBetween, self).__init__(end, start, output_field=models.IntegerField(), **extra)
+
+
 class CourtEmailCountManager(models.Manager):
     def calculate_aggregates(self, start_date,court, days=7):
         """
@@ -95,17 +122,10 @@ class CourtEmailCountManager(models.Manager):
         if not start_date:
             start_date = dt.date(2012, 1, 1)
 
-        results = CourtEmailCount.objects\
-            .filter(sent=True,
-                    hearing_date__gte=start_date,
-                    court__test_mode=False)\
-            .extra({'hearing_day': "date(hearing_date)"})\
-            .values('hearing_day')\
-            .order_by('hearing_day')\
-            .annotate(pleas=Sum('total_pleas'),
-                      guilty=Sum('total_guilty'),
-                      not_guilty=Sum('total_not_guilty'),
-                      submissions=Count('hearing_date'))
+        results = HearingDayStats.objects\
+            .filter(hearing_day__gte=start_date,
+                    submissions__gt=0)\
+            .values('hearing_day', 'pleas', 'guilty', 'not_guilty', 'submissions')
 
         if days:
             results = results[:days]
@@ -140,15 +160,38 @@ class CourtEmailCountManager(models.Manager):
 
         return stats
 
+    def with_days_from_hearing(self):
+        """
+        Non-test submissions annotated with the whole number of days from
+        sending to the hearing, where that is positive.
+        """
+        return self.filter(court__test_mode=False)\
+            .annotate(days_from_hearing=DaysBetween("hearing_date", "date_sent"))\
+            .filter(days_from_hearing__gt=0)
+
     def get_stats_days_from_hearing(self, limit=60):
-        courts = Court.objects.filter(test_mode=False)
+        """
+        Submission counts for each number of days from sending to the
+        hearing, from 0 to limit - 1. Days already rolled up by
+        DaysFromHearingStats.objects.calculate_daily_stats are read from there
+        and only later submissions are counted live.
+        """
+        day_counts = Counter({day_number: 0 for day_number in range(limit)})
 
-        counts = CourtEmailCount.objects.filter(court__in=courts).annotate(num_days=F('hearing_date') - F('date_sent')).values('num_days').order_by("-num_days")
-        day_counts = Counter([x["num_days"].days for x in counts if x["num_days"].days < limit and x["num_days"].days > 0])
+        counts = self.with_days_from_hearing()\
+            .filter(days_from_hearing__lt=limit)
 
-        for day_number in range(limit):
-            if day_number not in day_counts.keys():
-                day_counts[day_number] = 0
+        last_day = DaysFromHearingStats.objects.aggregate(Max("date"))["date__max"]
+
+        if last_day:
+            day_counts.update(DaysFromHearingStats.objects.get_counts(limit))
+            counts = counts.filter(date_sent__gte=last_day + dt.timedelta(1))
+
+        counts = counts.values("days_from_hearing")\
+            .annotate(submissions=Count("id"))\
+            .order_by()
+
+        day_counts.update({row["days_from_hearing"]: row["submissions"] for row in counts})
 
         return day_counts
 
@@ -177,6 +220,53 @@ class CourtEmailCount(models.Model):
 
     objects = CourtEmailCountManager()
 
+    def get_hearing_day_contribution(self):
+        """
+        What this count adds to HearingDayStats, as (court id, hearing day,
+        pleas, guilty, not guilty), or None if it hasn't been sent.
+        """
+
+        if not self.sent or self.hearing_date is None:
+            return None
+
+        if isinstance(self.hearing_date, dt.datetime):
+            hearing_day = self.hearing_date.date()
+        else:
+            hearing_day = self.hearing_date
+
+        return (self.court_id,
+                hearing_day,
+                self.total_pleas or 0,
+                self.total_guilty or 0,
+                self.total_not_guilty or 0)
+
+    def get_stored_hearing_day_contribution(self):
+        """
+        The contribution of the row as it is stored, locking it until the
+        transaction ends so saves from other processes wait their turn.
+        """
+
+        if self.pk is None:
+            return None
+
+        stored = CourtEmailCount.objects.select_for_update().filter(pk=self.pk).first()
+
+        return stored.get_hearing_day_contribution() if stored else None
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self.get_stored_hearing_day_contribution()
+
+            super(CourtEmailCount, self).save(*args, **kwargs)
+
+            if kwargs.get("update_fields") is not None or self.get_deferred_fields():
+                # Only some of the fields were written
+                new = CourtEmailCount.objects.get(pk=self.pk).get_hearing_day_contribution()
+            else:
+                new = self.get_hearing_day_contribution()
+
+            HearingDayStats.objects.record_change(old, new)
+
     def get_status_from_case(self, case_obj):
         self.sent = case_obj.sent
         self.processed = case_obj.processed
@@ -253,16 +343,15 @@ class CaseManager(models.Manager):
         ordering = ["offence_seq_number"]
 
     def can_use_urn(self, urn, first_name, last_name):
+        """
+        The URN can't be used again by someone who has already made a plea
+        with it, or at all once a company has.
+        """
         name = standardise_name(first_name, last_name)
 
-        cases = self.filter(urn__iexact=urn, sent=True)
-
-        for case in cases:
-            if case.extra_data and case.extra_data.get("OrganisationName"):
-                return False
-            elif case.name == name:
-                return False
-        return True
+        return not self.filter(urn__iexact=urn, sent=True)\
+            .filter(Q(organisation_name__isnull=False) | Q(name=name))\
+            .exists()
 
     def get_case_for_urn(self, urn):
         """
@@ -319,6 +408,20 @@ class Case(models.Model):
         blank=True, null=True,
         help_text="The date/time a user completes a submission.")
 
+    welsh_postcode_area = models.NullBooleanField(
+        help_text="Is the postcode in a Welsh postcode area? Empty if there is no postcode.")
+
+    # Copied from extra_data when the case is saved, see set_auth_fields. The
+    # URN lookups are iexact, so migration 0050 indexes UPPER(urn) with sent,
+    # and with these set for the multi-defendant lookup in get_case
+    dob = models.DateField(null=True, blank=True)
+    postcode = models.TextField(null=True, blank=True, help_text="Standardised")
+    forename = models.TextField(null=True, blank=True)
+    surname = models.TextField(null=True, blank=True)
+    organisation_name = models.TextField(null=True, blank=True)
+
+    offence_count = models.PositiveIntegerField(default=0)
+
     def add_action(self, status, status_info):
         self.actions.create(status=status, status_info=status_info)
 
@@ -336,18 +439,35 @@ class Case(models.Model):
         if self.name:
             return self.name
 
-        if self.extra_data and "Forename1" in self.extra_data:
-            return "{} {}".format(self.extra_data["Forename1"],
-                                  self.extra_data["Surname"])
+        if self.forename:
+            return "{} {}".format(self.forename, self.surname)
 
         return ""
 
+    def set_auth_fields(self):
+        """
+        Copy the details used to authenticate the user out of extra_data
+        """
+
+        extra_data = self.extra_data or {}
+
+        try:
+            self.dob = date_parse(extra_data["DOB"]).date() if extra_data.get("DOB") else None
+        except (ValueError, OverflowError):
+            self.dob = None
+
+        self.postcode = standardise_postcode(extra_data.get("PostCode") or "") or None
+
+        self.forename = extra_data.get("Forename1") or None
+        self.surname = extra_data.get("Surname") or None
+        self.organisation_name = extra_data.get("OrganisationName") or None
+
     def can_auth(self):
         """
         Do we have the relevant data to authenticate the user?
         """
 
-        return self.extra_data and ("PostCode" in self.extra_data or "DOB" in self.extra_data)
+        return bool(self.postcode or self.dob)
 
     def has_valid_doh(self):
         today = dt.date.today()
@@ -365,27 +485,23 @@ class Case(models.Model):
         if not self.can_auth():
             return False
 
-        if postcode and "PostCode" in self.extra_data:
-            inputted_postcode = standardise_postcode(postcode)
-            stored_postcode = standardise_postcode(
-                self.extra_data.get("PostCode"))
+        if postcode and self.postcode:
+            postcode_match = standardise_postcode(postcode) == self.postcode
 
-            postcode_match = inputted_postcode == stored_postcode
+        if dob and self.dob:
+            dob_match = dob == self.dob
 
-        if dob and "DOB" in self.extra_data:
-            dob_match = dob == date_parse(self.extra_data["DOB"]).date()
-        return self.offences.count() == num_charges and (postcode_match or dob_match)
+        return self.offence_count == num_charges and (postcode_match or dob_match)
 
     def auth_field(self):
         """
         Determine which field to use for auth
         """
 
-        if self.extra_data:
-            if "DOB" in self.extra_data:
-                return "DOB"
-            elif "PostCode" in self.extra_data:
-                return "PostCode"
+        if self.dob:
+            return "DOB"
+        elif self.postcode:
+            return "PostCode"
 
         return None
 
@@ -403,7 +519,15 @@ class Case(models.Model):
             except AttributeError:
                 pass
 
+    def get_welsh_postcode_area(self):
+        if not self.extra_data or "PostCode" not in self.extra_data:
+            return None
+
+        return (self.extra_data["PostCode"] or "").lower().startswith(WELSH_POSTCODE_AREAS)
+
     def save(self, *args, **kwargs):
+        self.welsh_postcode_area = self.get_welsh_postcode_area()
+        self.set_auth_fields()
         super(Case, self).save(*args, **kwargs)
         AuditEvent().populate(
             case=self,
@@ -413,6 +537,130 @@ class Case(models.Model):
             **kwargs)
 
 
+def get_language_stats_counts():
+    return {"total_cases": Count("id"),
+            "total_welsh_cases": Count(models.Case(models.When(language="cy", then=1))),
+            "total_welsh_with_english_postcodes": Count(models.Case(models.When(
+                language="cy", welsh_postcode_area=False, then=1)))}
+
+
+class CaseLanguageStatsManager(models.Manager):
+
+    def record_completed_case(self, case):
+        """
+        Add a completed case to its month's language stats
+        """
+
+        start_date = case.completed_on.date().replace(day=1)
+
+        welsh = case.language == "cy"
+        welsh_with_english_postcode = welsh and case.welsh_postcode_area is False
+
+        counts = {"total_cases": 1,
+                  "total_welsh_cases": int(welsh),
+                  "total_welsh_with_english_postcodes": int(welsh_with_english_postcode)}
+
+        increments = {k: F(k) + v for k, v in counts.items()}
+
+        qs = self.filter(start_date=start_date)
+
+        if qs.update(**increments):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(start_date=start_date, **counts)
+        except IntegrityError:
+            # Another case for the month created the row first
+            qs.update(**increments)
+
+    def rebuild(self):
+        """
+        Recalculate every month from the completed cases
+        """
+
+        months = Case.objects\
+            .filter(completed_on__isnull=False)\
+            .annotate(month=Trunc("completed_on", "month", output_field=models.DateField()))\
+            .values("month")\
+            .order_by("month")\
+            .annotate(**get_language_stats_counts())
+
+        stats = [CaseLanguageStats(start_date=month.pop("month"), **month) for month in months]
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(stats)
+
+        return len(stats)
+
+    def get_months(self, completed_from=None, completed_to=None):
+        """
+        The stats for each month of the cases completed between
+        completed_from and completed_to, both inclusive.
+
+        Months wholly inside the range are read from the monthly rows, the
+        months the range starts or ends in are counted from the cases.
+        """
+
+        boundaries = [date for date in (completed_from, completed_to) if date is not None]
+        partial_months = sorted(set(date.replace(day=1) for date in boundaries))
+
+        stats = self.exclude(start_date__in=partial_months)
+
+        if completed_from is not None:
+            stats = stats.filter(start_date__gte=completed_from.replace(day=1))
+
+        if completed_to is not None:
+            stats = stats.filter(start_date__lte=completed_to.replace(day=1))
+
+        months = list(stats)
+
+        for start_date in partial_months:
+            cases = Case.objects.filter(completed_on__gte=start_date,
+                                        completed_on__lt=start_date + relativedelta(months=1))
+
+            if completed_from is not None:
+                cases = cases.filter(completed_on__gte=completed_from)
+
+            if completed_to is not None:
+                cases = cases.filter(completed_on__lte=completed_to)
+
+            counts = cases.aggregate(**get_language_stats_counts())
+
+            if counts["total_cases"]:
+                months.append(CaseLanguageStats(start_date=start_date, **counts))
+
+        return sorted(months, key=lambda month: month.start_date)
+
+
+class CaseLanguageStats(models.Model):
+    """
+    Monthly totals of completed cases, Welsh language cases and Welsh
+    language cases with a postcode outside the Welsh postcode areas.
+    """
+
+    start_date = models.DateField(unique=True)
+
+    total_cases = models.PositiveIntegerField(default=0)
+    total_welsh_cases = models.PositiveIntegerField(default=0)
+    total_welsh_with_english_postcodes = models.PositiveIntegerField(default=0)
+
+    objects = CaseLanguageStatsManager()
+
+    class Meta:
+        ordering = ("start_date",)
+        verbose_name_plural = "Case language stats"
+
+    @property
+    def month(self):
+        return self.start_date.month
+
+    @property
+    def year(self):
+        return self.start_date.year
+
+
 class CaseAction(models.Model):
     case = models.ForeignKey(Case, related_name="actions", null=False, blank=False)
     date = models.DateTimeField(auto_now_add=True)
@@ -423,6 +671,218 @@ class CaseAction(models.Model):
         get_latest_by = 'date'
 
 
+class SubmissionPayload(models.Model):
+    """
+    The encrypted form data of a submission, written once when the plea is
+    submitted so the email tasks only need to be passed the case id.
+
+    See apps.plea.encrypt.store_submission_payload
+    """
+
+    case = models.OneToOneField(Case, related_name="submission_payload")
+    payload = models.TextField(help_text="Symmetrically encrypted, ASCII armoured JSON")
+    created = models.DateTimeField(auto_now_add=True)
+
+
+EMAIL_KIND_CHOICES = (("court", "Court"),
+                      ("prosecutor", "Prosecutor"),
+                      ("user", "User"))
+
+EMAIL_SEND_STATUS_CHOICES = (("sending", "Sending"),
+                             ("sent", "Sent"))
+
+
+class EmailSendLedgerManager(models.Manager):
+    # How long a claim is held by a send that never finished, e.g. because the
+    # worker died, before another attempt may take it over
+    claim_timeout = dt.timedelta(minutes=30)
+
+    @staticmethod
+    def get_fingerprint(recipients, subject, *extra):
+        """
+        Identify an email by what would be sent rather than by the task
+        that sends it, so a retry or redelivery matches the original.
+        """
+
+        parts = [",".join(sorted(recipients)), subject] + [str(part) for part in extra]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def claim(self, case, kind, fingerprint):
+        """
+        Atomically claim the right to send an email. Returns False if it has
+        already been sent, or another attempt is currently sending it.
+        """
+
+        try:
+            with transaction.atomic():
+                self.create(case=case, kind=kind, fingerprint=fingerprint, status="sending")
+            return True
+        except IntegrityError:
+            pass
+
+        return self.filter(case=case, kind=kind, fingerprint=fingerprint, status="sending",
+                           updated__lt=dt.datetime.now() - self.claim_timeout)\
+                   .update(updated=dt.datetime.now()) == 1
+
+    def release(self, case, kind, fingerprint):
+        """
+        Give up a claim after a failed send, so the retry can take it.
+        """
+
+        self.filter(case=case, kind=kind, fingerprint=fingerprint, status="sending").delete()
+
+    def mark_sent(self, case, kind, fingerprint):
+        self.filter(case=case, kind=kind, fingerprint=fingerprint)\
+            .update(status="sent", updated=dt.datetime.now())
+
+    def is_sent(self, case, kind, fingerprint):
+        return self.filter(case=case, kind=kind, fingerprint=fingerprint, status="sent").exists()
+
+    def get_claim_countdown(self, case, kind, fingerprint):
+        """
+        Seconds until the current claim on an email expires and can be
+        taken over, 0 if nothing is sending it.
+        """
+
+        updated = self.filter(case=case, kind=kind, fingerprint=fingerprint, status="sending")\
+            .values_list("updated", flat=True).first()
+
+        if updated is None:
+            return 0
+
+        return max(0, int((updated + self.claim_timeout - dt.datetime.now()).total_seconds()) + 1)
+
+
+class EmailSendLedger(models.Model):
+    """
+    One row per email a case has sent, or is sending, so that retried and
+    redelivered tasks don't send the same email twice.
+    """
+
+    case = models.ForeignKey(Case, related_name="email_sends")
+    kind = models.CharField(max_length=20, choices=EMAIL_KIND_CHOICES)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=EMAIL_SEND_STATUS_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(default=dt.datetime.now)
+
+    objects = EmailSendLedgerManager()
+
+    class Meta:
+        unique_together = ("case", "kind", "fingerprint")
+
+
+def get_backoff(attempt, base, maximum):
+    """
+    Exponential backoff in seconds with jitter, so that tasks which failed
+    together don't all retry together.
+    """
+
+    delay = min(maximum, base * 2 ** attempt)
+    return random.uniform(delay / 2.0, delay)
+
+
+class SmtpRouteStatusManager(models.Manager):
+    """
+    A circuit breaker per SMTP route, shared by all the workers.
+
+    Once a route has failed settings.SMTP_ROUTE_BREAKER["FAILURE_THRESHOLD"]
+    times in a row it is opened, and tasks for it are parked until retry_at
+    rather than each waiting on a socket timeout. After retry_at a single
+    task is let through to probe the route: success closes the circuit and
+    the parked tasks come back in waves, failure opens it for longer.
+    """
+
+    @staticmethod
+    def get_config(key):
+        return settings.SMTP_ROUTE_BREAKER[key]
+
+    def get_status(self, route):
+        status, created = self.get_or_create(route=route)
+        return status
+
+    def allow_attempt(self, route):
+        status = self.get_status(route)
+
+        if status.retry_at is None:
+            return True
+
+        now = dt.datetime.now()
+        probe_until = now + dt.timedelta(seconds=self.get_config("PROBE_TIMEOUT"))
+
+        return self.filter(route=route, retry_at__lte=now).update(retry_at=probe_until) == 1
+
+    def park(self, route):
+        """
+        Returns the countdown for a task that can't use the route yet,
+        spreading the parked tasks into waves after retry_at.
+        """
+
+        self.filter(route=route).update(parked=F("parked") + 1)
+        status = self.get_status(route)
+
+        wait = 0
+        if status.retry_at is not None:
+            wait = max(0, (status.retry_at - dt.datetime.now()).total_seconds())
+
+        wave = (status.parked - 1) // self.get_config("WAVE_SIZE")
+        interval = self.get_config("WAVE_INTERVAL")
+
+        return int(wait + wave * interval + random.uniform(0, interval))
+
+    def get_retry_countdown(self, route, retries):
+        """
+        Returns the countdown for a task whose send just failed.
+        """
+
+        if self.get_status(route).retry_at is not None:
+            return self.park(route)
+
+        return int(get_backoff(retries, self.get_config("BACKOFF_BASE"), self.get_config("BACKOFF_MAX")))
+
+    def record_success(self, route):
+        self.filter(route=route)\
+            .exclude(consecutive_failures=0, retry_at=None)\
+            .update(consecutive_failures=0, retry_at=None, parked=0)
+
+    def record_failure(self, route):
+        now = dt.datetime.now()
+
+        self.get_status(route)
+        self.filter(route=route).update(consecutive_failures=F("consecutive_failures") + 1,
+                                        last_failure=now)
+
+        status = self.get_status(route)
+        threshold = self.get_config("FAILURE_THRESHOLD")
+
+        if status.consecutive_failures >= threshold:
+            backoff = get_backoff(status.consecutive_failures - threshold,
+                                  self.get_config("BACKOFF_BASE"),
+                                  self.get_config("BACKOFF_MAX"))
+
+            self.filter(route=route).update(retry_at=now + dt.timedelta(seconds=backoff),
+                                            parked=0)
+
+
+class SmtpRouteStatus(models.Model):
+    route = models.CharField(max_length=10, unique=True)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True,
+                                    help_text="Set while the circuit is open, when the route may next be tried")
+    parked = models.PositiveIntegerField(default=0,
+                                         help_text="Tasks parked since the circuit opened")
+    last_failure = models.DateTimeField(null=True, blank=True)
+
+    objects = SmtpRouteStatusManager()
+
+    class Meta:
+        verbose_name_plural = "SMTP route statuses"
+
+    @property
+    def is_open(self):
+        return self.retry_at is not None
+
+
 class Offence(models.Model):
     case = models.ForeignKey(Case, related_name="offences")
 
@@ -510,6 +970,233 @@ class UsageStatsManager(models.Manager):
 
         return stats_per_week
 
+    def _plea_report_aggregates(self):
+        """
+        Conditional sums for the pre, post and overall plea report figures
+        """
+
+        def sum_when(field, **condition):
+            return Sum(models.Case(models.When(then=F(field), **condition),
+                                   default=0,
+                                   output_field=models.IntegerField()))
+
+        aggregates = {}
+
+        for field in ("online_submissions", "online_guilty_pleas", "online_not_guilty_pleas"):
+            aggregates["all_" + field] = Sum(field)
+            aggregates["pre_" + field] = sum_when(field, start_date__lte=PLEA_TYPE_CHANGE_DATE)
+
+        for field in ("online_submissions", "online_guilty_pleas", "online_not_guilty_pleas",
+                      "online_guilty_attend_court_pleas", "online_guilty_no_court_pleas"):
+            aggregates["post_" + field] = sum_when(field, start_date__gte=PLEA_TYPE_CHANGE_DATE)
+
+        return aggregates
+
+    @staticmethod
+    def _plea_report_totals(row):
+        totals = {k: row.get(k) or 0 for k in row if k != "court"}
+
+        for period in ("all", "pre", "post"):
+            totals[period + "_online_pleas"] = totals[period + "_online_guilty_pleas"] + \
+                totals[period + "_online_not_guilty_pleas"]
+
+        return totals
+
+    def _plea_report_queryset(self, start_date=None, end_date=None):
+        qs = self.all()
+
+        if start_date:
+            qs = qs.filter(start_date__gte=start_date)
+
+        if end_date:
+            qs = qs.filter(start_date__lte=end_date)
+
+        return qs
+
+    def get_plea_report_totals(self, start_date=None, end_date=None, court_id=None):
+        """
+        Get the plea report figures before and after the plea type change
+        date, and overall, optionally limited to a single court.
+        """
+
+        qs = self._plea_report_queryset(start_date, end_date)
+
+        if court_id:
+            qs = qs.filter(court_id=court_id)
+
+        return self._plea_report_totals(qs.aggregate(**self._plea_report_aggregates()))
+
+    def get_plea_report_totals_by_court(self, start_date=None, end_date=None):
+        """
+        Get the plea report figures for every court, keyed by court id
+        """
+
+        rows = self._plea_report_queryset(start_date, end_date)\
+            .filter(court__isnull=False)\
+            .values("court")\
+            .order_by("court")\
+            .annotate(**self._plea_report_aggregates())
+
+        return {row["court"]: self._plea_report_totals(row) for row in rows}
+
+
+class DaysFromHearingStatsManager(models.Manager):
+
+    def calculate_daily_stats(self, to_date=None):
+        """
+        Roll up the days from hearing counts of each day from the last one
+        rolled up until the day before to_date.
+
+        The calculate_stats management command runs this function.
+        """
+
+        if not to_date:
+            to_date = dt.date.today()
+
+        last_day = self.aggregate(Max("date"))["date__max"]
+
+        counts = CourtEmailCount.objects.with_days_from_hearing()\
+            .filter(date_sent__lt=to_date)
+
+        if last_day:
+            counts = counts.filter(date_sent__gte=last_day + dt.timedelta(1))
+
+        counts = counts.annotate(day=TruncDate("date_sent"))\
+            .values("day", "days_from_hearing")\
+            .annotate(submissions=Count("id"))\
+            .order_by()
+
+        self.bulk_create([
+            DaysFromHearingStats(date=row["day"],
+                                 days_from_hearing=row["days_from_hearing"],
+                                 submissions=row["submissions"])
+            for row in counts])
+
+    def get_counts(self, limit):
+        counts = self.filter(days_from_hearing__lt=limit)\
+            .values("days_from_hearing")\
+            .annotate(total=Sum("submissions"))\
+            .order_by()
+
+        return {row["days_from_hearing"]: row["total"] for row in counts}
+
+
+class DaysFromHearingStats(models.Model):
+    """
+    A daily aggregate of the submissions sent on each day by the number of
+    days until their hearing, so the days from hearing stats don't need to
+    scan every CourtEmailCount.
+
+    Submissions to courts in test mode are left out when the day is rolled
+    up, so delete the rows to recalculate them after changing test_mode.
+    """
+    date = models.DateField(db_index=True)
+    days_from_hearing = models.PositiveIntegerField()
+    submissions = models.PositiveIntegerField(default=0)
+
+    objects = DaysFromHearingStatsManager()
+
+    class Meta:
+        ordering = ("date", "days_from_hearing")
+        unique_together = ("date", "days_from_hearing")
+        verbose_name_plural = "Days from hearing stats"
+
+
+class HearingDayStatsManager(models.Manager):
+
+    def add(self, hearing_day, **counts):
+        """
+        Add the counts to the hearing day's totals
+        """
+
+        increments = {k: F(k) + v for k, v in counts.items()}
+
+        qs = self.filter(hearing_day=hearing_day)
+
+        if qs.update(**increments) or counts["submissions"] < 0:
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(hearing_day=hearing_day, **counts)
+        except IntegrityError:
+            # Another count for the day created the row first
+            qs.update(**increments)
+
+    def record_change(self, old, new):
+        """
+        Move a CourtEmailCount's totals from its old contribution to its new
+        one, as returned by CourtEmailCount.get_hearing_day_contribution
+        before and after it was saved.
+        """
+
+        if old == new:
+            return
+
+        court_ids = [contribution[0] for contribution in (old, new) if contribution]
+
+        test_courts = set(Court.objects
+                          .filter(pk__in=court_ids, test_mode=True)
+                          .values_list("pk", flat=True))
+
+        for contribution, sign in ((old, -1), (new, 1)):
+            if contribution and contribution[0] not in test_courts:
+                court_id, hearing_day, pleas, guilty, not_guilty = contribution
+
+                self.add(hearing_day,
+                         submissions=sign,
+                         pleas=sign * pleas,
+                         guilty=sign * guilty,
+                         not_guilty=sign * not_guilty)
+
+    def rebuild(self):
+        """
+        Recalculate every hearing day from the sent court email counts
+        """
+
+        days = CourtEmailCount.objects\
+            .filter(sent=True,
+                    court__test_mode=False)\
+            .annotate(day=TruncDate("hearing_date"))\
+            .values("day")\
+            .order_by("day")\
+            .annotate(pleas=Sum("total_pleas"),
+                      guilty=Sum("total_guilty"),
+                      not_guilty=Sum("total_not_guilty"),
+                      submissions=Count("id"))
+
+        stats = [HearingDayStats(hearing_day=day.pop("day"), **day) for day in days]
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(stats)
+
+        return len(stats)
+
+
+class HearingDayStats(models.Model):
+    """
+    Totals of the sent court email counts for each hearing day, kept up to
+    date as counts are saved and deleted.
+
+    Counts for courts in test mode are left out, so run the
+    rebuild_hearing_day_stats command after changing test_mode.
+    """
+
+    hearing_day = models.DateField(unique=True)
+
+    submissions = models.IntegerField(default=0)
+    pleas = models.IntegerField(default=0)
+    guilty = models.IntegerField(default=0)
+    not_guilty = models.IntegerField(default=0)
+
+    objects = HearingDayStatsManager()
+
+    class Meta:
+        ordering = ("hearing_day",)
+        verbose_name_plural = "Hearing day stats"
+
+
 class UsageStats(models.Model):
     """
     An aggregate table used to store submission data over a 7 day
@@ -721,16 +1408,51 @@ class OUCode(models.Model):
                                help_text="The first five digits of an OU code")
 
 
+class DataValidationManager(models.Manager):
+
+    def get_region_statistics(self, recent_days):
+        """
+        Count all and matched URN entries per region, split into those
+        entered before and within the last recent_days, in a single
+        grouped query.
+        """
+
+        cutoff = dt.date.today() - dt.timedelta(days=recent_days)
+
+        def count_when(**condition):
+            return Count(models.Case(models.When(then=1, **condition)))
+
+        rows = self.values("urn_region")\
+            .order_by("urn_region")\
+            .annotate(all_total=count_when(date_entered__lte=cutoff),
+                      all_matched=count_when(date_entered__lte=cutoff,
+                                             case_match_count__gt=0),
+                      recent_total=count_when(date_entered__gt=cutoff),
+                      recent_matched=count_when(date_entered__gt=cutoff,
+                                                case_match_count__gt=0))
+
+        return {row.pop("urn_region"): row for row in rows}
+
+
 class DataValidation(models.Model):
     date_entered = models.DateTimeField(auto_now_add=True)
     urn_entered = models.CharField(max_length=50, null=False, blank=False)
+    urn_region = models.CharField(max_length=2, blank=True, default="", db_index=True,
+                                  help_text="The first two characters of the entered URN")
     urn_standardised = models.CharField(max_length=50, null=False, blank=False)
     urn_formatted = models.CharField(max_length=50, null=False, blank=False)
     case_match = models.ForeignKey("plea.Case", null=True, blank=True)
     case_match_count = models.PositiveIntegerField(default=0)
 
+    objects = DataValidationManager()
+
     class Meta:
         ordering = ["-date_entered"]
+        index_together = ("urn_region", "date_entered")
+
+    def save(self, *args, **kwargs):
+        self.urn_region = self.urn_entered[:2]
+        super(DataValidation, self).save(*args, **kwargs)
 
 
 class AuditEvent(models.Model):
@@ -1109,3 +1831,34 @@ class CaseTracker(models.Model):
 
     def get_stage(self, stage_name):
         return getattr(self, self.get_field_name(stage_name)) if self.get_field_name(stage_name) else None
+
+
+@receiver([post_save, post_delete], sender=Court)
+@receiver([post_save, post_delete], sender=CourtEmailCount)
+@receiver([post_save, post_delete], sender=UsageStats)
+def invalidate_stats_cache(sender, **kwargs):
+    stats_cache.invalidate()
+
+
+@receiver(post_save, sender=Offence)
+@receiver(post_delete, sender=Offence)
+def update_offence_count(sender, instance, created=True, **kwargs):
+    if not created:
+        return
+
+    count = Offence.objects.filter(case_id=instance.case_id).count()
+
+    Case.objects.filter(pk=instance.case_id).update(offence_count=count)
+
+    # Keep the case the offence was created through up to date, so saving
+    # it doesn't write back the old count
+    case = getattr(instance, Offence.case.cache_name, None)
+    if case is not None:
+        case.offence_count = count
+
+
+@receiver(pre_delete, sender=CourtEmailCount)
+def remove_from_hearing_day_stats(sender, instance, **kwargs):
+    # Deletes run in a transaction, so the row stays locked until it's gone
+    HearingDayStats.objects.record_change(
+        instance.get_stored_hearing_day_contribution(), None)
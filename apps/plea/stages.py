@@ -36,7 +36,7 @@ from .forms import (URNEntryForm,
 
 from .fields import ERROR_MESSAGES
 from .models import Court, Case, Offence, DataValidation
-from .standardisers import standardise_urn, format_for_region
+from .standardisers import standardise_name, standardise_urn, format_for_region
 import re
 
 def get_case(urn):
@@ -53,20 +53,97 @@ def get_case(urn):
 
         cases = Case.objects.filter(
             urn__iexact=urn,
-            extra_data__isnull=False,
-            extra_data__Surname__isnull=False,
-            extra_data__Forename1__isnull=False,
-            extra_data__DOB__isnull=False,
-        ).exclude(
-            extra_data__Surname="",
-            extra_data__Forename1="",
-            extra_data__DOB="",
-            sent=False,
+            surname__isnull=False,
+            forename__isnull=False,
+            dob__isnull=False,
         )
-        return cases[0] if cases else None
+        return cases.first()
 
 
-def get_offences(case_data):
+def can_use_urn(all_data, urn, first_name, last_name, recheck=False):
+    """
+    Case.objects.can_use_urn, remembering a yes in the journey data so the
+    query isn't repeated on later stages while the URN and name stay the same.
+
+    Set recheck before sending the plea, as the URN may have been used since.
+    """
+    checked = [urn, standardise_name(first_name, last_name)]
+
+    if not recheck and all_data.get("urn_usable") == checked:
+        return True
+
+    if not Case.objects.can_use_urn(urn, first_name, last_name):
+        return False
+
+    all_data["urn_usable"] = checked
+    return True
+
+
+# Kept in the session to save queries between stages, but not part of the
+# plea itself, so left out of the data that is emailed and stored
+JOURNEY_ONLY_KEYS = ("case_snapshot", "urn_usable")
+
+
+# Bump whenever the layout of the case snapshot changes, so snapshots held
+# in existing sessions are ignored rather than misread
+CASE_SNAPSHOT_VERSION = 1
+
+OFFENCE_SNAPSHOT_FIELDS = ("offence_code",
+                           "offence_short_title",
+                           "offence_short_title_welsh",
+                           "offence_wording",
+                           "offence_wording_welsh",
+                           "offence_seq_number")
+
+
+def get_ordered_offences(case):
+    # offence_seq_number is a char field so best to cast and order by
+    # rather than just grabbing case.offences.all() and hoping it's
+    # in the right order
+    return Offence.objects.filter(case=case).extra(
+        select={"seq_number": "cast(coalesce(nullif(offence_seq_number,''),'0') as float)"}
+    ).order_by("seq_number", "id")
+
+
+def build_case_snapshot(urn, case, court):
+    """
+    Capture the case data the rest of the journey needs, once the user has
+    authenticated, so later stages don't have to look it up again.
+    """
+
+    offences = get_ordered_offences(case) if court.display_case_data else []
+
+    return {"version": CASE_SNAPSHOT_VERSION,
+            "urn": urn,
+            "case_id": case.id,
+            "court_id": court.id,
+            "display_case_data": court.display_case_data,
+            "initiation_type": case.initiation_type,
+            "offences": [[getattr(offence, field) for field in OFFENCE_SNAPSHOT_FIELDS]
+                         for offence in offences]}
+
+
+def get_case_snapshot(all_data):
+    """
+    Return the journey's case snapshot if it is current and matches the URN
+    """
+
+    snapshot = all_data.get("case_snapshot")
+
+    if not snapshot or snapshot.get("version") != CASE_SNAPSHOT_VERSION:
+        return None
+
+    if snapshot.get("urn") != all_data.get("case", {}).get("urn"):
+        return None
+
+    return snapshot
+
+
+def get_offences(case_data, snapshot=None):
+    if snapshot is not None:
+        return [Offence(case_id=snapshot["case_id"], **dict(zip(OFFENCE_SNAPSHOT_FIELDS, offence)))
+                for offence in snapshot["offences"]]
+
     urn = case_data.get("urn")
     # TODO: change this to grabbing by case OU or a FK at some point
 
@@ -77,13 +154,8 @@ def get_offences(case_data):
         ou_code = case.ou_code if case else None
         court = Court.objects.get_court(urn, ou_code=ou_code)
 
-        # offence_seq_number is a char field so best to cast and order by
-        # rather than just grabbing case.offences.all() and hoping it's
-        # in the right order
         if court.display_case_data:
-            offences = Offence.objects.filter(case=case).extra(
-                select={"seq_number": "cast(coalesce(nullif(offence_seq_number,''),'0') as float)"}
-            ).order_by("seq_number", "id")
+            offences = get_ordered_offences(case)
 
     return offences
 
@@ -187,6 +259,9 @@ class URNEntryStage(SJPChoiceBase):
 
             self._create_data_validation(clean_data["urn"], std_urn)
 
+            # Storage is only ever updated, so clear rather than remove it
+            self.all_data["case_snapshot"] = None
+
             clean_data["urn"] = std_urn
 
             if court.validate_urn:
@@ -244,6 +319,10 @@ class AuthenticationStage(SJPChoiceBase):
 
                 self.all_data.update({"dx": True})
 
+                self.all_data["case_snapshot"] = build_case_snapshot(
+                    self.all_data["case"]["urn"], case,
+                    Court.objects.get_court(self.all_data["case"]["urn"], ou_code=case.ou_code))
+
                 self.all_data["notice_type"]["sjp"] = (case.initiation_type == "J")
                 self.all_data["notice_type"]["complete"] = True
                 self.all_data["notice_type"]["auto_set"] = True
@@ -255,7 +334,7 @@ class AuthenticationStage(SJPChoiceBase):
                     self.all_data["case"]["date_of_hearing"] = case.date_of_hearing
                 self.all_data["case"]["contact_deadline"] = case.date_of_hearing
 
-                if case.extra_data.get("OrganisationName", None):
+                if case.organisation_name:
                     plea_made_by = "Company representative"
                     self.set_next_step("company_details", skip=["your_details",
                                                                 "your_status",
@@ -277,6 +356,8 @@ class AuthenticationStage(SJPChoiceBase):
                 self.all_data["case"]["plea_made_by"] = plea_made_by
                 self.all_data["case"]["complete"] = True
             else:
+                self.all_data["case_snapshot"] = None
+
                 if court.validate_urn:
                     self.next_step = None
                     self.add_message(
@@ -427,7 +508,7 @@ class YourDetailsStage(DetailsStage):
             clean_data.get("first_name"),
             clean_data.get("last_name"))
 
-        if not Case.objects.can_use_urn(urn, first_name, last_name):
+        if not can_use_urn(self.all_data, urn, first_name, last_name):
             self.form.errors[NON_FIELD_ERRORS] = [ERROR_MESSAGES["URN_ALREADY_USED"]]
             self.next_step = ""
             return {}
@@ -483,7 +564,7 @@ class PleaStage(IndexedStage):
 
         # Only show offence data for DX cases
         if self.all_data.get("dx", False):
-            offences = get_offences(self.all_data["case"])
+            offences = get_offences(self.all_data["case"], get_case_snapshot(self.all_data))
         else:
             offences = False
         welsh_questions = self.all_data.get("welsh_court", False)
@@ -529,7 +610,7 @@ class PleaStage(IndexedStage):
         plea_count = self.all_data["case"]["number_of_charges"]
         stage_data = self.all_data[self.name]
         stage_data["none_guilty"] = True
-        offences = get_offences(self.all_data["case"])
+        offences = get_offences(self.all_data["case"], get_case_snapshot(self.all_data))
 
         if "data" not in stage_data:
             stage_data["data"] = []
@@ -995,7 +1076,7 @@ class ReviewStage(FormStage):
             return clean_data
 
         if clean_data.get("complete", False):
-            email_data = {k: v for k, v in self.all_data.items()}
+            email_data = {k: v for k, v in self.all_data.items() if k not in JOURNEY_ONLY_KEYS}
             email_data.update({"review": clean_data})
 
             email_result = send_plea_email(email_data)
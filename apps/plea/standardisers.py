@@ -1,17 +1,31 @@
 import re
+from functools import lru_cache
+
+
+# How many distinct URNs standardise_urn and format_for_region remember
+URN_CACHE_SIZE = 10000
+
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+# As NON_ALPHANUMERIC, but leaving the newlines that separate the URNs
+# given to standardise_urns
+NON_ALPHANUMERIC_LINES = re.compile(r"(?:[^\w\n]|_)+")
+
+GMP_DOUBLE_ZERO = re.compile("06([a-zA-Z]{2})00(.*)")
 
 
 class StandardiserNoOutputException(Exception):
     pass
 
 
+@lru_cache(maxsize=URN_CACHE_SIZE)
 def format_for_region(urn):
     format = URN_FORMATTERS.get(urn[:2], URN_FORMATTERS["*"])
     return format(standardise_urn(urn))
 
 
 def standardise_postcode(postcode):
-    return re.sub(r"[\W_]+", "", postcode).upper()
+    return NON_ALPHANUMERIC.sub("", postcode).upper()
 
 
 def standardise_name(first_name, last_name):
@@ -23,6 +37,16 @@ def standardise_name(first_name, last_name):
                            last_name)
 
 
+def apply_regional_standardiser(output):
+    regional_standardiser = URN_STANDARDISERS.get(output[:2], None)
+
+    if regional_standardiser:
+        output = regional_standardiser(output)
+
+    return output
+
+
+@lru_cache(maxsize=URN_CACHE_SIZE)
 def standardise_urn(urn):
     """
     Strips non-alphanumeric characters from given URN, and
@@ -30,12 +54,7 @@ def standardise_urn(urn):
     available URN_STANDARDISERS it also applies them.
 
     """
-    output = re.sub(r"[\W_]+", "", urn).upper()
-
-    regional_standardiser = URN_STANDARDISERS.get(output[:2], None)
-
-    if regional_standardiser:
-        output = regional_standardiser(output)
+    output = apply_regional_standardiser(NON_ALPHANUMERIC.sub("", urn).upper())
 
     if len(output) == 0:
         raise StandardiserNoOutputException("Standardised URN is blank")
@@ -43,10 +62,38 @@ def standardise_urn(urn):
     return output
 
 
+def standardise_urns(urns):
+    """
+    Standardise a list of URNs, e.g. from a bulk import, in one pass.
+
+    Each distinct URN is only standardised once, and the characters are
+    stripped and capitalised across all of them together. URNs that
+    standardise to nothing give None rather than raising.
+    """
+    unique = list(set(urns))
+
+    lines = "\n".join(urn.replace("\n", "") for urn in unique)
+
+    outputs = NON_ALPHANUMERIC_LINES.sub("", lines).upper().split("\n")
+
+    standardised = {urn: apply_regional_standardiser(output) or None
+                    for urn, output in zip(unique, outputs)}
+
+    return [standardised[urn] for urn in urns]
+
+
+def format_urns(urns):
+    """
+    Format a list of standardised URNs for their regions, passing None
+    through
+    """
+    return [format_for_region(urn) if urn else None for urn in urns]
+
+
 def standardise_gmp_urn(urn):
-    double_zero = re.compile("06([a-zA-Z]{2})00(.*)")
-    if double_zero.match(urn) and len(double_zero.match(urn).groups()[1]) > 5:
-        return re.sub(double_zero, "06\g<1>\g<2>", urn)
+    match = GMP_DOUBLE_ZERO.match(urn)
+    if match and len(match.groups()[1]) > 5:
+        return GMP_DOUBLE_ZERO.sub("06\g<1>\g<2>", urn)
     else:
         return urn
 
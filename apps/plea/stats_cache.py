@@ -0,0 +1,110 @@
+"""
+Cache for the public stats.
+
+Each result is stored with the version of the stats it was computed from.
+The version is bumped whenever a CourtEmailCount, UsageStats or Court is
+saved or deleted, so stale results are recomputed on their next request.
+The timeout in settings.STATS_CACHE bounds how stale a result can get when
+the cache isn't shared with the process that made the change, and how long a
+result that depends on today's date outlives the day.
+
+Only one caller recomputes a stale result at a time: the others serve the
+stale copy if there is one, or wait for the fresh one.
+"""
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+VERSION_KEY = "stats:version"
+
+
+def get_option(name, default):
+    return getattr(settings, "STATS_CACHE", {}).get(name, default)
+
+
+def get_cache():
+    return caches[get_option("ALIAS", "default")]
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_version():
+    cache = get_cache()
+
+    version = cache.get(VERSION_KEY)
+
+    if version is None:
+        version = new_version()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY) or version
+
+    return version
+
+
+def invalidate():
+    get_cache().set(VERSION_KEY, new_version(), None)
+
+
+def get_entry(version, data):
+    content = json.dumps(data, sort_keys=True).encode("utf-8")
+
+    return {"version": version,
+            "modified": int(time.time()),
+            "etag": '"{}"'.format(hashlib.md5(content).hexdigest()),
+            "data": data}
+
+
+def get_stats(key, compute):
+    """
+    The cached entry for key, calling compute to get json-serialisable data
+    when there isn't a fresh one.
+
+    Returns a dict with the data, its etag and the time it was computed.
+    """
+    cache = get_cache()
+    version = get_version()
+    timeout = get_option("TIMEOUT", 300)
+    lock_timeout = get_option("LOCK_TIMEOUT", 30)
+
+    cache_key = "stats:{}".format(hashlib.md5(key.encode("utf-8")).hexdigest())
+    lock_key = "{}:lock".format(cache_key)
+
+    entry = cache.get(cache_key)
+
+    if entry and entry["version"] == version:
+        return entry
+
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            entry = get_entry(version, compute())
+            cache.set(cache_key, entry, timeout)
+        finally:
+            cache.delete(lock_key)
+
+        return entry
+
+    if entry:
+        return entry
+
+    deadline = time.time() + lock_timeout
+
+    while time.time() < deadline:
+        time.sleep(0.05)
+
+        locked = cache.get(lock_key) is not None
+
+        entry = cache.get(cache_key)
+        if entry and entry["version"] == version:
+            return entry
+
+        if not locked:
+            break
+
+    return get_entry(version, compute())
@@ -12,15 +12,50 @@ from django.conf import settings
 from django.utils import translation
 
 from apps.plea.attachment import TemplateAttachmentEmail
+from apps.plea.encrypt import delete_submission_payload, load_submission_payload
 
-from celery import shared_task
+from celery import shared_task, Task
+from celery.exceptions import Retry
 
-from apps.plea.models import Case, CourtEmailCount, Court
+from apps.plea.models import Case, CourtEmailCount, Court, EmailSendLedger, SmtpRouteStatus, SubmissionPayload
 from apps.plea.standardisers import format_for_region
 
 logger = logging.getLogger(__name__)
 
 
+class CaseEmailTask(Task):
+    """
+    Records the final failure of an email task against its case, which
+    together with the actions the tasks add as they go stands in for the
+    ignored task result.
+    """
+
+    abstract = True
+    action_name = "Email"
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        case = Case.objects.filter(pk=args[0]).first() if args else None
+
+        if case is not None:
+            case.add_action("{} failed".format(self.action_name),
+                            u"{}: {}".format(type(exc).__name__, exc))
+
+
+class CourtEmailTask(CaseEmailTask):
+    """
+    Nothing reads the submission payload once the court email task has given
+    up, so it is deleted along with recording the failure.
+    """
+
+    abstract = True
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        super(CourtEmailTask, self).on_failure(exc, task_id, args, kwargs, einfo)
+
+        if args:
+            delete_submission_payload(args[0])
+
+
 def get_email_subject(email_data):
     if email_data["notice_type"]["sjp"] is True:
         subject = "ONLINE PLEA: {case[formatted_urn]} <SJP> {email_name}"
@@ -55,8 +90,58 @@ def get_smtp_gateway(email_address):
     return "PUB"
 
 
-@shared_task(bind=True, max_retries=10, default_retry_delay=900)
-def email_send_court(self, case_id, count_id, email_data):
+def park_if_route_unavailable(task, route, retry_args):
+    """
+    Reschedule the task without trying to send if the route's circuit is
+    open. Eager tasks run inline, so they always try.
+
+    The task is resent with its current retry count rather than through
+    task.retry, so time spent parked doesn't use up the retries meant for
+    failed sends.
+    """
+
+    if not task.request.is_eager and not SmtpRouteStatus.objects.allow_attempt(route):
+        logger.info("SMTP route {} is unavailable, parking task".format(route))
+        countdown = SmtpRouteStatus.objects.park(route)
+        task.signature_from_request(task.request, retry_args, countdown=countdown,
+                                    retries=task.request.retries).apply_async()
+        raise Retry(when=countdown)
+
+
+def retry_while_claimed(task, case, kind, fingerprint, retry_args):
+    """
+    Another attempt has claimed the email but not sent it yet. Try again
+    once the claim expires rather than acking the task, in case the worker
+    holding the claim died before sending.
+    """
+
+    logger.info("{} email for case {} is being sent, retrying".format(kind.capitalize(), case.id))
+    raise task.retry(args=retry_args,
+                     countdown=EmailSendLedger.objects.get_claim_countdown(case, kind, fingerprint))
+
+
+def mark_court_email_sent(case, email_count):
+    case.sent = True
+    case.save()
+
+    email_count.get_status_from_case(case)
+    email_count.save()
+
+
+@shared_task(bind=True, base=CourtEmailTask, action_name="Court email",
+             max_retries=10, default_retry_delay=900)
+def email_send_court(self, case_id, count_id, email_data=None):
+    # Tasks are queued with just the case id, email_data is only passed by
+    # tasks queued before the submission payload store existed
+    retry_args = [case_id, count_id] if email_data is None else [case_id, count_id, email_data]
+    if email_data is None:
+        try:
+            email_data = load_submission_payload(case_id)
+        except SubmissionPayload.DoesNotExist:
+            # Deleted once the email was sent or the task gave up
+            logger.info("Court email for case {} already done with".format(case_id))
+            return True
+
     email_data["urn"] = format_for_region(email_data["case"]["urn"])
 
     # No error trapping, let these fail hard if the objects can't be found
@@ -71,11 +156,26 @@ def email_send_court(self, case_id, count_id, email_data):
     if not court_obj.test_mode:
         email_count = CourtEmailCount.objects.get(pk=count_id)
 
-    case.add_action("Court email started", "")
-
     email_subject = get_email_subject(email_data)
     email_body = "<<<makeaplea-ref: {}/{}>>>".format(case.id, count_id)
 
+    park_if_route_unavailable(self, smtp_route, retry_args)
+
+    fingerprint = EmailSendLedger.objects.get_fingerprint(plea_email_to, email_subject)
+
+    if not EmailSendLedger.objects.claim(case, "court", fingerprint):
+        if not EmailSendLedger.objects.is_sent(case, "court", fingerprint):
+            retry_while_claimed(self, case, "court", fingerprint, retry_args)
+
+        logger.info("Court email for case {} already sent".format(case.id))
+        # The task may have died between sending and updating the case
+        if not court_obj.test_mode:
+            mark_court_email_sent(case, email_count)
+        delete_submission_payload(case.id)
+        return True
+
+    case.add_action("Court email started", "")
+
     plea_email = TemplateAttachmentEmail(settings.PLEA_EMAIL_FROM,
                                          settings.PLEA_EMAIL_ATTACHMENT_NAME,
                                          "emails/attachments/plea_email.html",
@@ -89,6 +189,8 @@ def email_send_court(self, case_id, count_id, email_data):
                             email_body,
                             route=smtp_route)
     except (smtplib.SMTPException, socket.error, socket.gaierror) as exc:
+        EmailSendLedger.objects.release(case, "court", fingerprint)
+        SmtpRouteStatus.objects.record_failure(smtp_route)
         logger.warning("Error sending email to court: {0}".format(exc))
         case.add_action("Court email network error", u"{}: {}".format(type(exc), exc))
         if email_count is not None:
@@ -97,24 +199,34 @@ def email_send_court(self, case_id, count_id, email_data):
         case.sent = False
         case.save()
 
-        raise self.retry(args=[case_id, count_id, email_data], exc=exc)
+        raise self.retry(args=retry_args, exc=exc,
+                         countdown=SmtpRouteStatus.objects.get_retry_countdown(smtp_route, self.request.retries))
+    except Exception:
+        EmailSendLedger.objects.release(case, "court", fingerprint)
+        raise
+
+    SmtpRouteStatus.objects.record_success(smtp_route)
+    EmailSendLedger.objects.mark_sent(case, "court", fingerprint)
 
     case.add_action("Court email sent", "Sent mail to {0} via {1}".format(plea_email_to, smtp_route))
 
     if not court_obj.test_mode:
-        case.sent = True
-        case.save()
+        mark_court_email_sent(case, email_count)
 
-        email_count.get_status_from_case(case)
-        email_count.save()
+    delete_submission_payload(case.id)
 
     return True
 
 
-@shared_task(bind=True, max_retries=10, default_retry_delay=1800)
-def email_send_prosecutor(self, case_id, email_data):
+@shared_task(bind=True, base=CaseEmailTask, action_name="Prosecutor email",
+             max_retries=10, default_retry_delay=1800)
+def email_send_prosecutor(self, case_id, email_data=None):
     smtp_route = "PNN"
 
+    retry_args = [case_id] if email_data is None else [case_id, email_data]
+    if email_data is None:
+        email_data = load_submission_payload(case_id)
+
     email_data["urn"] = format_for_region(email_data["case"]["urn"])
 
     # No error trapping, let these fail hard if the objects can't be found
@@ -122,11 +234,23 @@ def email_send_prosecutor(self, case_id, email_data):
 
     court_obj = get_court(email_data["case"]["urn"], case.ou_code)
 
-    case.add_action("Prosecutor email started", "")
-
     email_subject = "POLICE " + get_email_subject(email_data)
     email_body = ""
 
+    fingerprint = EmailSendLedger.objects.get_fingerprint([court_obj.plp_email or ""], email_subject)
+
+    if court_obj.plp_email:
+        park_if_route_unavailable(self, smtp_route, retry_args)
+
+    if court_obj.plp_email and not EmailSendLedger.objects.claim(case, "prosecutor", fingerprint):
+        if not EmailSendLedger.objects.is_sent(case, "prosecutor", fingerprint):
+            retry_while_claimed(self, case, "prosecutor", fingerprint, retry_args)
+
+        logger.info("Prosecutor email for case {} already sent".format(case.id))
+        return True
+
+    case.add_action("Prosecutor email started", "")
+
     email_data["your_details"]["18_or_under"] = is_18_or_under(
         email_data["your_details"].get("date_of_birth"))
 
@@ -144,9 +268,19 @@ def email_send_prosecutor(self, case_id, email_data):
                                email_body,
                                route=smtp_route)
         except (smtplib.SMTPException, socket.error, socket.gaierror) as exc:
+            EmailSendLedger.objects.release(case, "prosecutor", fingerprint)
+            SmtpRouteStatus.objects.record_failure(smtp_route)
             logger.warning("Error sending email to prosecutor: {0}".format(exc))
             case.add_action("Prosecutor email network error", u"{}: {}".format(type(exc), exc))
-            raise self.retry(args=[case_id, email_data], exc=exc)
+            raise self.retry(args=retry_args, exc=exc,
+                             countdown=SmtpRouteStatus.objects.get_retry_countdown(smtp_route, self.request.retries))
+        except Exception:
+            EmailSendLedger.objects.release(case, "prosecutor", fingerprint)
+            raise
+
+        SmtpRouteStatus.objects.record_success(smtp_route)
+
+        EmailSendLedger.objects.mark_sent(case, "prosecutor", fingerprint)
 
         case.add_action("Prosecutor email sent", "Sent mail to {0} via {1}".format(court_obj.plp_email, smtp_route))
 
@@ -156,7 +290,8 @@ def email_send_prosecutor(self, case_id, email_data):
     return True
 
 
-@shared_task(bind=True, max_retries=10, default_retry_delay=1800)
+@shared_task(bind=True, base=CaseEmailTask, action_name="User email",
+             max_retries=10, default_retry_delay=1800)
 def email_send_user(self, case_id, email_address, subject, html_body, txt_body):
     """
     Dispatch an email to the user to confirm that their plea submission
@@ -165,6 +300,22 @@ def email_send_user(self, case_id, email_address, subject, html_body, txt_body):
 
     # No error trapping, let these fail hard if the objects can't be found
     case = Case.objects.get(id=case_id)
+
+    # User emails go via settings.EMAIL_HOST, the public route
+    smtp_route = "PUB"
+    retry_args = [case_id, email_address, subject, html_body, txt_body]
+
+    park_if_route_unavailable(self, smtp_route, retry_args)
+
+    fingerprint = EmailSendLedger.objects.get_fingerprint([email_address], subject, txt_body)
+
+    if not EmailSendLedger.objects.claim(case, "user", fingerprint):
+        if not EmailSendLedger.objects.is_sent(case, "user", fingerprint):
+            retry_while_claimed(self, case, "user", fingerprint, retry_args)
+
+        logger.info("User email for case {} already sent".format(case.id))
+        return True
+
     case.add_action("User email started", "")
 
     connection = get_connection(host=settings.EMAIL_HOST,
@@ -181,9 +332,19 @@ def email_send_user(self, case_id, email_address, subject, html_body, txt_body):
     try:
         email.send(fail_silently=False)
     except (smtplib.SMTPException, socket.error, socket.gaierror) as exc:
+        EmailSendLedger.objects.release(case, "user", fingerprint)
+        SmtpRouteStatus.objects.record_failure(smtp_route)
         logger.warning("Error sending user confirmation email: {0}".format(exc))
         case.add_action("User email network error", u"{}: {}".format(type(exc), exc))
-        raise self.retry(args=[case_id, email_address, subject, html_body, txt_body], exc=exc)
+        raise self.retry(args=retry_args, exc=exc,
+                         countdown=SmtpRouteStatus.objects.get_retry_countdown(smtp_route, self.request.retries))
+    except Exception:
+        EmailSendLedger.objects.release(case, "user", fingerprint)
+        raise
+
+    SmtpRouteStatus.objects.record_success(smtp_route)
+
+    EmailSendLedger.objects.mark_sent(case, "user", fingerprint)
 
     case.add_action("User email sent", "")
 
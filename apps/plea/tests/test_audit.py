@@ -7,13 +7,15 @@ from mock import patch
 import socket
 
 from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from django.test.utils import override_settings
 
 from ..email import send_plea_email
-from ..models import Case, CourtEmailCount, Court
-from ..encrypt import clear_user_data, gpg
-from ..tasks import email_send_user
+from ..models import Case, CourtEmailCount, Court, EmailSendLedger, SubmissionPayload
+from ..encrypt import clear_user_data, gpg, load_submission_payload, store_submission_payload
+from ..tasks import email_send_court, email_send_user
 
 
 class CaseCreationTests(TestCase):
@@ -218,3 +220,108 @@ class CaseCreationTests(TestCase):
         self.assertIsNotNone(case.completed_on)
         self.assertIsInstance(case.completed_on, datetime.datetime)
 
+    @patch("apps.plea.email.email_send_court.delay")
+    def test_submission_payload_is_stored(self, court_delay):
+        send_plea_email(self.context_data)
+
+        case = Case.objects.all()[0]
+        count_obj = CourtEmailCount.objects.all()[0]
+
+        court_delay.assert_called_once_with(case.id, count_obj.id)
+
+        payload = SubmissionPayload.objects.get(case=case).payload
+        self.assertNotIn("cobain", payload)
+
+        data = load_submission_payload(case.id)
+        self.assertEqual(data["case"]["urn"], self.context_data["case"]["urn"])
+        self.assertEqual(data["your_details"]["last_name"], "cobain")
+
+    @override_settings(SUBMISSION_PAYLOAD_PASSPHRASE="")
+    def test_submission_payload_needs_a_passphrase(self):
+        case = Case.objects.create(urn="06AA0000000")
+
+        with self.assertRaises(ImproperlyConfigured):
+            store_submission_payload(case.id, self.context_data)
+
+    def test_submission_payload_is_deleted_once_court_email_is_sent(self):
+        send_plea_email(self.context_data)
+
+        case = Case.objects.all()[0]
+
+        self.assertEqual(len(case.get_actions("Court email sent")), 1)
+        self.assertFalse(SubmissionPayload.objects.filter(case=case).exists())
+
+    @patch("apps.plea.email.email_send_court.delay")
+    def test_submission_payload_is_deleted_when_court_email_fails(self, court_delay):
+        send_plea_email(self.context_data)
+
+        case = Case.objects.all()[0]
+
+        email_send_court.on_failure(socket.error("Connection refused"), "task-id", [case.id, 1], {}, None)
+
+        self.assertFalse(SubmissionPayload.objects.filter(case=case).exists())
+
+    def test_court_email_redelivery_is_not_resent(self):
+        mail.outbox = []
+
+        send_plea_email(self.context_data)
+
+        case = Case.objects.all()[0]
+        count_obj = CourtEmailCount.objects.all()[0]
+        sent_count = len(mail.outbox)
+
+        email_send_court(case.id, count_obj.id)
+
+        self.assertEqual(len(mail.outbox), sent_count)
+        self.assertEqual(len(case.get_actions("Court email sent")), 1)
+        self.assertEqual(EmailSendLedger.objects.get(case=case, kind="court").status, "sent")
+
+    def test_court_email_redelivery_retries_while_claimed(self):
+        send_plea_email(self.context_data)
+
+        case = Case.objects.all()[0]
+        count_obj = CourtEmailCount.objects.all()[0]
+
+        # A worker claimed the email and died before sending it, leaving
+        # the payload in place
+        EmailSendLedger.objects.filter(case=case, kind="court").update(status="sending")
+        store_submission_payload(case.id, self.context_data)
+        mail.outbox = []
+
+        with patch.object(email_send_court, "retry", return_value=Retry()) as retry:
+            with self.assertRaises(Retry):
+                email_send_court(case.id, count_obj.id)
+
+        self.assertEqual(len(mail.outbox), 0)
+        countdown = retry.call_args[1]["countdown"]
+        self.assertTrue(0 < countdown <= EmailSendLedger.objects.claim_timeout.total_seconds() + 1)
+
+    def test_email_send_ledger_claims(self):
+        case = Case.objects.create(urn="06AA0000000")
+        fingerprint = EmailSendLedger.objects.get_fingerprint(["court@example.org"], "Subject")
+
+        self.assertTrue(EmailSendLedger.objects.claim(case, "court", fingerprint))
+        self.assertFalse(EmailSendLedger.objects.claim(case, "court", fingerprint))
+
+        EmailSendLedger.objects.release(case, "court", fingerprint)
+        self.assertTrue(EmailSendLedger.objects.claim(case, "court", fingerprint))
+
+        # A claim left behind by a worker that died is taken over once it expires
+        EmailSendLedger.objects.filter(case=case).update(
+            updated=datetime.datetime.now() - EmailSendLedger.objects.claim_timeout)
+        self.assertTrue(EmailSendLedger.objects.claim(case, "court", fingerprint))
+
+        EmailSendLedger.objects.mark_sent(case, "court", fingerprint)
+        EmailSendLedger.objects.filter(case=case).update(
+            updated=datetime.datetime.now() - EmailSendLedger.objects.claim_timeout)
+        self.assertFalse(EmailSendLedger.objects.claim(case, "court", fingerprint))
+        self.assertTrue(EmailSendLedger.objects.claim(case, "user", fingerprint))
+
+    def test_final_task_failure_is_recorded_as_case_action(self):
+        case = Case.objects.create(urn="06AA0000000")
+
+        email_send_court.on_failure(socket.error("Connection refused"), "task-id", [case.id, 1], {}, None)
+
+        action = case.get_actions("Court email failed")[0]
+        self.assertEqual(action.status_info, "OSError: Connection refused")
+
@@ -93,16 +93,26 @@ class PleaModelTestCase(BaseTestCase):
 
     def test_can_auth_no_dob(self):
         case = Case(extra_data=dict(PostCode="WA5 555"))
+        case.set_auth_fields()
 
         self.assertTrue(case.can_auth())
 
     def test_can_auth_no_postcode(self):
         case = Case(extra_data=dict(DOB="2015-11-11"))
+        case.set_auth_fields()
 
         self.assertTrue(case.can_auth())
 
+    def test_can_auth_long_postcode(self):
+        case = Case(extra_data=dict(PostCode="BFPO 1234 5678"))
+        case.set_auth_fields()
+
+        self.assertEquals(case.postcode, "BFPO12345678")
+        self.assertTrue(case.can_auth())
+
     def test_can_auth_no_dob_and_no_password(self):
         case = Case(extra_data={})
+        case.set_auth_fields()
 
         self.assertFalse(case.can_auth())
 
@@ -114,10 +124,12 @@ class PleaModelTestCase(BaseTestCase):
 
     def test_authenticate_invalid_dob(self):
         self.case.extra_data["DOB"] = "1979-03-11"
+        self.case.save()
         self.assertFalse(self.case.authenticate(1, None, dt.date(1979, 10, 5)))
 
     def test_authenticate_valid_dob(self):
         self.case.extra_data["DOB"] = "1979-03-11"
+        self.case.save()
         self.assertTrue(self.case.authenticate(2, None, dt.date(1979, 3, 11)))
 
     def test_authenticate_valid_postcode(self):
@@ -128,9 +140,43 @@ class PleaModelTestCase(BaseTestCase):
 
     def test_auth_field_postcode(self):
         self.case.extra_data["DOB"] = "1979-03-11"
+        self.case.save()
 
         self.assertEquals(self.case.auth_field(), "DOB")
 
+    def test_auth_fields_set_on_save(self):
+        self.case.extra_data["DOB"] = "1979-03-11"
+        self.case.save()
+
+        case = Case.objects.get(pk=self.case.pk)
+
+        self.assertEquals(case.dob, dt.date(1979, 3, 11))
+        self.assertEquals(case.postcode, "M601PR")
+        self.assertEquals(case.forename, "Frank")
+        self.assertEquals(case.surname, "Marsh")
+        self.assertIsNone(case.organisation_name)
+
+    def test_invalid_dob_not_used(self):
+        self.case.extra_data["DOB"] = "not a date"
+        self.case.save()
+
+        self.assertIsNone(self.case.dob)
+        self.assertEquals(self.case.auth_field(), "PostCode")
+
+    def test_offence_count(self):
+        self.assertEquals(self.case.offence_count, 2)
+        self.assertEquals(Case.objects.get(pk=self.case.pk).offence_count, 2)
+
+        self.case.offences.first().delete()
+
+        self.assertEquals(Case.objects.get(pk=self.case.pk).offence_count, 1)
+
+    def test_authenticate_without_queries(self):
+        case = Case.objects.get(pk=self.case.pk)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(case.authenticate(2, "m601pr", None))
+
 
 class URNStageWithURNValidation(BaseTestCase):
 
@@ -87,3 +87,27 @@ class TestDataValidation(TestCase):
         self.assertEqual(dv[0].urn_formatted, "51/AA/00000/00")
         self.assertEqual(dv[0].case_match_count, 2)
 
+
+    def test_urn_region_is_stored(self):
+        dv = DataValidation.objects.create(urn_entered="51/AA/00000/00",
+                                           urn_standardised="51AA0000000",
+                                           urn_formatted="51/AA/00000/00")
+
+        self.assertEqual(dv.urn_region, "51")
+
+    def test_region_statistics(self):
+        case = Case.objects.create(urn="51AA0000000", imported=True)
+
+        DataValidation.objects.create(urn_entered="51AA0000000", urn_standardised="51AA0000000",
+                                      urn_formatted="51/AA/00000/00", case_match=case, case_match_count=1)
+        DataValidation.objects.create(urn_entered="51AA0000001", urn_standardised="51AA0000001",
+                                      urn_formatted="51/AA/00000/01")
+        DataValidation.objects.create(urn_entered="52AA0000000", urn_standardised="52AA0000000",
+                                      urn_formatted="52/AA/00000/00")
+
+        stats = DataValidation.objects.get_region_statistics(30)
+
+        self.assertEqual(stats["51"]["recent_total"], 2)
+        self.assertEqual(stats["51"]["recent_matched"], 1)
+        self.assertEqual(stats["51"]["all_total"], 0)
+        self.assertEqual(stats["52"]["recent_total"], 1)
@@ -1,5 +1,10 @@
+import datetime as dt
+
+from celery.exceptions import Retry
 from django.test import TestCase
-from ..tasks import get_smtp_gateway
+from mock import Mock
+from ..models import SmtpRouteStatus
+from ..tasks import get_smtp_gateway, park_if_route_unavailable
 
 
 class EmailTests(TestCase):
@@ -7,3 +12,66 @@ class EmailTests(TestCase):
         self.assertEquals(get_smtp_gateway('test@hmcts.gsi.gov.uk'), 'GSI')
         self.assertEquals(get_smtp_gateway('test@justice.gov.uk'), 'PUB')
         self.assertEquals(get_smtp_gateway('test@hmcts.net'), 'PUB')
+
+
+class SmtpRouteStatusTests(TestCase):
+    def fail_route(self, times):
+        for _ in range(times):
+            SmtpRouteStatus.objects.record_failure("GSI")
+
+    def test_circuit_opens_after_threshold(self):
+        with self.settings(SMTP_ROUTE_BREAKER=dict(FAILURE_THRESHOLD=3, BACKOFF_BASE=60, BACKOFF_MAX=3600,
+                                                   PROBE_TIMEOUT=300, WAVE_SIZE=2, WAVE_INTERVAL=60)):
+            self.fail_route(2)
+            self.assertTrue(SmtpRouteStatus.objects.allow_attempt("GSI"))
+
+            self.fail_route(1)
+            self.assertTrue(SmtpRouteStatus.objects.get_status("GSI").is_open)
+            self.assertFalse(SmtpRouteStatus.objects.allow_attempt("GSI"))
+
+            # Other routes are unaffected
+            self.assertTrue(SmtpRouteStatus.objects.allow_attempt("PUB"))
+
+    def test_parked_tasks_are_released_in_waves(self):
+        with self.settings(SMTP_ROUTE_BREAKER=dict(FAILURE_THRESHOLD=1, BACKOFF_BASE=60, BACKOFF_MAX=3600,
+                                                   PROBE_TIMEOUT=300, WAVE_SIZE=2, WAVE_INTERVAL=60)):
+            self.fail_route(1)
+
+            countdowns = [SmtpRouteStatus.objects.park("GSI") for _ in range(4)]
+
+            # The first wave comes back after the backoff, the second a wave interval later
+            self.assertTrue(all(29 <= countdown <= 120 for countdown in countdowns[:2]))
+            self.assertTrue(all(89 <= countdown <= 180 for countdown in countdowns[2:]))
+
+    def test_single_probe_after_backoff(self):
+        with self.settings(SMTP_ROUTE_BREAKER=dict(FAILURE_THRESHOLD=1, BACKOFF_BASE=60, BACKOFF_MAX=3600,
+                                                   PROBE_TIMEOUT=300, WAVE_SIZE=2, WAVE_INTERVAL=60)):
+            self.fail_route(1)
+            SmtpRouteStatus.objects.filter(route="GSI").update(
+                retry_at=dt.datetime.now() - dt.timedelta(seconds=1))
+
+            self.assertTrue(SmtpRouteStatus.objects.allow_attempt("GSI"))
+            self.assertFalse(SmtpRouteStatus.objects.allow_attempt("GSI"))
+
+            SmtpRouteStatus.objects.record_success("GSI")
+
+            status = SmtpRouteStatus.objects.get_status("GSI")
+            self.assertFalse(status.is_open)
+            self.assertEqual(status.consecutive_failures, 0)
+            self.assertTrue(SmtpRouteStatus.objects.allow_attempt("GSI"))
+
+    def test_parking_keeps_the_retry_count(self):
+        with self.settings(SMTP_ROUTE_BREAKER=dict(FAILURE_THRESHOLD=1, BACKOFF_BASE=60, BACKOFF_MAX=3600,
+                                                   PROBE_TIMEOUT=300, WAVE_SIZE=2, WAVE_INTERVAL=60)):
+            self.fail_route(1)
+
+            task = Mock()
+            task.request.is_eager = False
+            task.request.retries = 3
+
+            with self.assertRaises(Retry):
+                park_if_route_unavailable(task, "GSI", [1, 2])
+
+            self.assertEqual(task.signature_from_request.call_args[1]["retries"], 3)
+            self.assertFalse(task.retry.called)
+            task.signature_from_request.return_value.apply_async.assert_called_once_with()
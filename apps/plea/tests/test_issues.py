@@ -182,3 +182,61 @@ class TestDuplicateCaseIssues(TestCaseBase):
         stages.save(form, {})
 
         self.assertEqual(len(stages.current_stage.form.errors[NON_FIELD_ERRORS]), 1)
+
+    def test_usable_urn_remembered(self):
+        session = self.get_session_data("51aa0000015", "Defendant")
+        form = self.get_person_details_save_data("Frank", "Marsh")
+
+        stages = PleaOnlineForms(session, "your_details")
+        stages.save(form, {})
+
+        self.assertEqual(stages.all_data["urn_usable"], ["51aa0000015", "frank marsh"])
+
+        with patch.object(Case.objects, "can_use_urn") as can_use_urn:
+            stages = PleaOnlineForms(stages.all_data, "your_status")
+            stages.save({"you_are": "Employed"}, {})
+
+        self.assertFalse(can_use_urn.called)
+
+    def test_usable_urn_checked_again_when_name_changes(self):
+        self.create_person_case("51aa0000015", "Frank", "Marsh")
+        session = self.get_session_data("51aa0000015", "Defendant")
+        session["urn_usable"] = ["51aa0000015", "franky marshington iii"]
+        form = self.get_person_details_save_data("Frank", "Marsh")
+
+        stages = PleaOnlineForms(session, "your_details")
+        stages.save(form, {})
+
+        self.assertEqual(len(stages.current_stage.form.errors[NON_FIELD_ERRORS]), 1)
+
+    @patch("apps.plea.stages.send_plea_email")
+    def test_usable_urn_checked_again_before_sending(self, send_plea_email):
+        session = self.get_session_data("51aa0000015", "Defendant")
+        session["your_details"] = {"complete": True,
+                                   "first_name": "Frank",
+                                   "last_name": "Marsh"}
+        session["urn_usable"] = ["51aa0000015", "frank marsh"]
+
+        # Sent from another session after this one checked the URN
+        self.create_person_case("51aa0000015", "Frank", "Marsh")
+
+        stages = PleaOnlineForms(session, "review")
+        stages.save({"understand": True}, {})
+
+        self.assertIsInstance(stages.render(self.get_request_mock()), HttpResponseRedirect)
+        self.assertFalse(send_plea_email.called)
+
+    @patch("apps.plea.stages.send_plea_email")
+    def test_usable_urn_not_sent_with_plea(self, send_plea_email):
+        session = self.get_session_data("51aa0000015", "Defendant")
+        session["your_details"] = {"complete": True,
+                                   "first_name": "Frank",
+                                   "last_name": "Marsh"}
+        session["urn_usable"] = ["51aa0000015", "frank marsh"]
+
+        stages = PleaOnlineForms(session, "review")
+        stages.save({"understand": True}, {})
+
+        email_data = send_plea_email.call_args[0][0]
+        self.assertNotIn("urn_usable", email_data)
+        self.assertIn("urn_usable", stages.all_data)
@@ -0,0 +1,241 @@
+"""
+Performance benchmarks for the plea journey.
+
+Each journey is driven through PleaOnlineViews with the test client, timing
+every request and counting its queries. The imported journeys authenticate
+against a seeded case with offences, as most users of a court that validates
+URNs do. A test fails if any request makes more
+queries than the budget for its stage in journey_query_budgets.json.
+
+Set JOURNEY_BENCHMARK_REPORT to a file path to write the measurements there as
+json, e.g. to compare two branches. Set JOURNEY_BENCHMARK_UPDATE_BUDGETS=1 to
+rewrite the budgets from the queries observed in this run.
+"""
+import datetime
+import json
+import os
+import time
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Case, Court
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "journey_query_budgets.json")
+
+URN = "06AA0000015"
+
+POSTCODE = "M60 1PR"
+
+
+def get_case_data(sjp, number_of_charges, company):
+    data = {"urn": URN,
+            "number_of_charges": number_of_charges,
+            "plea_made_by": "Company representative" if company else "Defendant"}
+
+    if sjp:
+        date = datetime.date.today() - datetime.timedelta(5)
+        field = "posting_date"
+    else:
+        date = datetime.date.today() + datetime.timedelta(30)
+        field = "date_of_hearing"
+
+    data.update({"{}_0".format(field): date.day,
+                 "{}_1".format(field): date.month,
+                 "{}_2".format(field): date.year})
+
+    return data
+
+
+def get_journey(sjp=False, number_of_charges=1, company=False, imported=False):
+    """
+    The stages of a guilty plea, as (stage, index, POST data) tuples.
+    """
+    steps = [("enter_urn", None, {"urn": URN})]
+
+    if imported:
+        steps.append(("your_case_continued", None, {"number_of_charges": number_of_charges,
+                                                    "postcode": POSTCODE}))
+    else:
+        steps.extend([("notice_type", None, {"sjp": sjp}),
+                      ("case", None, get_case_data(sjp, number_of_charges, company))])
+
+    if company:
+        steps.append(("company_details", None, {"company_name": "Test Company",
+                                                "correct_address": True,
+                                                "first_name": "John",
+                                                "last_name": "Smith",
+                                                "position_in_company": "Director",
+                                                "contact_number": "07000000000",
+                                                "email": "business@example.org"}))
+    else:
+        steps.append(("your_details", None, {"first_name": "Charlie",
+                                             "last_name": "Brown",
+                                             "contact_number": "012345678",
+                                             "correct_address": True,
+                                             "date_of_birth_0": "12",
+                                             "date_of_birth_1": "03",
+                                             "date_of_birth_2": "1980",
+                                             "email": "user@example.org",
+                                             "have_ni_number": False,
+                                             "no_ni_number_reason": "Lost my NI card",
+                                             "have_driving_licence_number": False}))
+
+    for index in range(1, number_of_charges + 1):
+        steps.append(("plea", index, {"guilty": "guilty_no_court",
+                                      "guilty_extra": "Charge {}".format(index)}))
+
+    if company:
+        steps.append(("company_finances", None, {"trading_period": True,
+                                                 "number_of_employees": "10",
+                                                 "gross_turnover": "150000",
+                                                 "net_turnover": "110000"}))
+    else:
+        steps.extend([("your_status", None, {"you_are": "Employed"}),
+                      ("your_employment", None, {"pay_period": "Fortnightly",
+                                                 "pay_amount": "1000"}),
+                      ("your_income", None, {"hardship": False})])
+
+    steps.extend([("review", None, {"understand": True}),
+                  ("complete", None, None)])
+
+    return steps
+
+
+class JourneyBenchmarkTests(TestCase):
+    results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super(JourneyBenchmarkTests, cls).tearDownClass()
+
+        report_path = os.environ.get("JOURNEY_BENCHMARK_REPORT")
+        if report_path:
+            with open(report_path, "w") as fd:
+                json.dump({"journeys": cls.results}, fd, indent=4, sort_keys=True)
+
+        if os.environ.get("JOURNEY_BENCHMARK_UPDATE_BUDGETS"):
+            budgets = {}
+            for journey in cls.results.values():
+                for step in journey["steps"]:
+                    budgets[step["stage"]] = max(budgets.get(step["stage"], 0), step["queries"])
+
+            with open(BUDGETS_PATH, "w") as fd:
+                json.dump(budgets, fd, indent=4, sort_keys=True)
+                fd.write("\n")
+
+    def setUp(self):
+        self.court = Court.objects.create(
+            court_code="0000",
+            region_code="06",
+            court_name="test court",
+            court_address="test address",
+            court_telephone="0800 MAKEAPLEA",
+            court_email="court@example.org",
+            submission_email="court@example.org",
+            plp_email="plp@example.org",
+            enabled=True,
+            test_mode=False)
+
+        with open(BUDGETS_PATH) as fd:
+            self.budgets = json.load(fd)
+
+    def seed_imported_case(self, sjp=False, number_of_charges=1):
+        self.court.validate_urn = True
+        self.court.display_case_data = True
+        self.court.save()
+
+        case = Case.objects.create(
+            urn=URN,
+            case_number="12345",
+            ou_code="06",
+            initiation_type="J" if sjp else "C",
+            date_of_hearing=datetime.date.today() + datetime.timedelta(30),
+            imported=True,
+            extra_data={"PostCode": POSTCODE,
+                        "Surname": "Brown",
+                        "Forename1": "Charlie"})
+
+        for index in range(1, number_of_charges + 1):
+            case.offences.create(
+                offence_code="RT{}".format(12344 + index),
+                offence_short_title="Traffic offence {}".format(index),
+                offence_wording="On the 30th December 2015 ...",
+                offence_seq_number="{:03}".format(index))
+
+    def request(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            response = getattr(self.client, method)(url, data)
+            elapsed = time.time() - start
+
+        return response, {"method": method.upper(),
+                          "status": response.status_code,
+                          "time": round(elapsed * 1000, 3),
+                          "queries": len(queries)}
+
+    def run_journey(self, name, steps):
+        measurements = []
+
+        for stage, index, data in steps:
+            if index:
+                url = reverse("plea_form_step", kwargs={"stage": stage, "index": index})
+            else:
+                url = reverse("plea_form_step", args=(stage,))
+
+            response, measurement = self.request("get", url)
+            self.assertEqual(response.status_code, 200, "GET {} returned {}".format(url, response.status_code))
+            measurements.append(dict(measurement, stage=stage, index=index))
+
+            if data is not None:
+                response, measurement = self.request("post", url, data)
+                self.assertEqual(response.status_code, 302, "POST {} didn't move on".format(url))
+                measurements.append(dict(measurement, stage=stage, index=index))
+
+        self.results[name] = {"total_queries": sum(step["queries"] for step in measurements),
+                              "total_time": round(sum(step["time"] for step in measurements), 3),
+                              "steps": measurements}
+
+        over_budget = ["{method} {stage} made {queries} queries".format(**step)
+                       for step in measurements
+                       if step["queries"] > self.budgets.get(step["stage"], 0)]
+
+        if not os.environ.get("JOURNEY_BENCHMARK_UPDATE_BUDGETS"):
+            self.assertEqual(over_budget, [], "Over the query budget in {}".format(name))
+
+    def test_non_sjp_1_charge(self):
+        self.run_journey("non_sjp_1_charge", get_journey(sjp=False, number_of_charges=1))
+
+    def test_non_sjp_10_charges(self):
+        self.run_journey("non_sjp_10_charges", get_journey(sjp=False, number_of_charges=10))
+
+    def test_sjp_1_charge(self):
+        self.run_journey("sjp_1_charge", get_journey(sjp=True, number_of_charges=1))
+
+    def test_sjp_10_charges(self):
+        self.run_journey("sjp_10_charges", get_journey(sjp=True, number_of_charges=10))
+
+    def test_imported_1_charge(self):
+        self.seed_imported_case(number_of_charges=1)
+        self.run_journey("imported_1_charge", get_journey(number_of_charges=1, imported=True))
+
+    def test_imported_10_charges(self):
+        self.seed_imported_case(number_of_charges=10)
+        self.run_journey("imported_10_charges", get_journey(number_of_charges=10, imported=True))
+
+    def test_imported_sjp_10_charges(self):
+        self.seed_imported_case(sjp=True, number_of_charges=10)
+        self.run_journey("imported_sjp_10_charges", get_journey(sjp=True, number_of_charges=10, imported=True))
+
+    def test_company_1_charge(self):
+        self.run_journey("company_1_charge", get_journey(company=True, number_of_charges=1))
+
+    def test_welsh_1_charge(self):
+        self.court.court_language = "cy"
+        self.court.save()
+        self.client.get("/change-language/?lang=cy")
+
+        self.run_journey("welsh_1_charge", get_journey(sjp=False, number_of_charges=1))
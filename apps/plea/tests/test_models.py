@@ -1,11 +1,12 @@
 from __future__ import absolute_import, unicode_literals
 
 import datetime as dt
+from contextlib import contextmanager
 
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 
-from ..models import AuditEvent, CourtEmailCount, UsageStats, Court, Case, OUCode, CaseTracker
+from ..models import AuditEvent, CourtEmailCount, DaysFromHearingStats, HearingDayStats, UsageStats, Court, Case, CaseLanguageStats, OUCode, CaseTracker
 
 
 class TestStatsBase(TestCase):
@@ -62,6 +63,15 @@ class TestStatsBase(TestCase):
             if field.name == "date_sent":
                 field.auto_now_add = True
 
+    @contextmanager
+    def fake_date_sent(self):
+        field = CourtEmailCount._meta.get_field("date_sent")
+        field.auto_now_add = False
+        try:
+            yield
+        finally:
+            field.auto_now_add = True
+
 
 class CourtEmailCountManagerTestCase(TestStatsBase):
     def test_calculate_aggregates(self):
@@ -244,6 +254,109 @@ class CourtEmailCountModelTestCase(TestStatsBase):
 
         self.assertEqual(len(stats), 5)
 
+    def test_get_stats_days_from_hearing_with_daily_stats(self):
+        live_stats = CourtEmailCount.objects.get_stats_days_from_hearing()
+
+        DaysFromHearingStats.objects.calculate_daily_stats(to_date=dt.date(2015, 1, 13))
+
+        self.assertEqual(DaysFromHearingStats.objects.filter(date=dt.date(2015, 1, 12)).get().submissions, 3)
+        self.assertFalse(DaysFromHearingStats.objects.filter(date=dt.date(2015, 1, 14)).exists())
+
+        with self.fake_date_sent():
+            CourtEmailCount.objects.create(court=self.court_1, total_pleas=1, total_guilty=1, total_not_guilty=0, date_sent=dt.date(2015, 1, 15), hearing_date=dt.date(2015, 1, 31), sent=True) # 16 days
+
+        stats = CourtEmailCount.objects.get_stats_days_from_hearing()
+
+        self.assertEqual(len(stats), 60)
+        self.assertEqual(stats[16], 1)
+        stats[16] = 0
+        self.assertEqual(stats, live_stats)
+
+        DaysFromHearingStats.objects.calculate_daily_stats(to_date=dt.date(2015, 1, 16))
+
+        self.assertEqual(CourtEmailCount.objects.get_stats_days_from_hearing()[16], 1)
+
+
+class HearingDayStatsTestCase(TestStatsBase):
+    def test_sent_counts_are_added(self):
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 30))
+
+        self.assertEqual(stats.submissions, 4)
+        self.assertEqual(stats.pleas, 10)
+        self.assertEqual(stats.guilty, 7)
+        self.assertEqual(stats.not_guilty, 3)
+
+    def test_unsent_counts_are_added_when_sent(self):
+
+        count = CourtEmailCount.objects.create(court=self.court_1, total_pleas=2, total_guilty=2, total_not_guilty=0,
+                                               hearing_date=dt.date(2015, 2, 2), sent=False)
+
+        self.assertFalse(HearingDayStats.objects.filter(hearing_day=dt.date(2015, 2, 2)).exists())
+
+        count = CourtEmailCount.objects.get(pk=count.pk)
+        count.sent = True
+        count.save()
+        count.save()
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 2, 2))
+
+        self.assertEqual(stats.submissions, 1)
+        self.assertEqual(stats.pleas, 2)
+
+    def test_saving_a_partly_loaded_count_changes_nothing(self):
+
+        before = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 31))
+
+        count = CourtEmailCount.objects.only("id", "sent").filter(hearing_date=dt.date(2015, 1, 31)).first()
+        count.save()
+
+        count = CourtEmailCount.objects.defer("total_pleas").get(pk=count.pk)
+        count.sent = True
+        count.save()
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 31))
+
+        self.assertEqual(stats.submissions, before.submissions)
+        self.assertEqual(stats.pleas, before.pleas)
+
+    def test_saving_a_count_built_with_its_pk_changes_nothing(self):
+
+        before = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 31))
+
+        stored = CourtEmailCount.objects.filter(hearing_date=dt.date(2015, 1, 31)).first()
+
+        count = CourtEmailCount(pk=stored.pk, court=stored.court, date_sent=stored.date_sent,
+                                total_pleas=stored.total_pleas, total_guilty=stored.total_guilty,
+                                total_not_guilty=stored.total_not_guilty,
+                                hearing_date=stored.hearing_date, sent=True)
+        count.save()
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 31))
+
+        self.assertEqual(stats.submissions, before.submissions)
+        self.assertEqual(stats.pleas, before.pleas)
+
+    def test_deleted_counts_are_removed(self):
+
+        CourtEmailCount.objects.filter(hearing_date=dt.date(2015, 1, 31)).delete()
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 31))
+
+        self.assertEqual(stats.submissions, 0)
+        self.assertEqual(len(CourtEmailCount.objects.get_stats_by_hearing_date()), 2)
+
+    def test_rebuild(self):
+
+        HearingDayStats.objects.all().delete()
+
+        self.assertEqual(HearingDayStats.objects.rebuild(), 3)
+
+        stats = HearingDayStats.objects.get(hearing_day=dt.date(2015, 1, 30))
+
+        self.assertEqual(stats.submissions, 4)
+        self.assertEqual(stats.pleas, 10)
+
 
 class UsageStatsTestCase(TestStatsBase):
     def setUp(self):
@@ -267,6 +380,34 @@ class UsageStatsTestCase(TestStatsBase):
         self.assertEquals(wk2_court2.start_date, dt.date(2015, 1, 12))
         self.assertEquals(wk2_court2.online_submissions, 1)
 
+    def test_get_plea_report_totals(self):
+
+        UsageStats.objects.create(start_date=dt.date(2018, 5, 14), court=self.court_1,
+                                  online_submissions=2, online_guilty_pleas=1, online_not_guilty_pleas=1)
+        UsageStats.objects.create(start_date=dt.date(2018, 5, 28), court=self.court_1,
+                                  online_submissions=3, online_guilty_pleas=2, online_not_guilty_pleas=1,
+                                  online_guilty_attend_court_pleas=1, online_guilty_no_court_pleas=1)
+        UsageStats.objects.create(start_date=dt.date(2018, 5, 28), court=self.court_2,
+                                  online_submissions=1, online_guilty_pleas=0, online_not_guilty_pleas=1)
+
+        totals = UsageStats.objects.get_plea_report_totals()
+
+        self.assertEquals(totals["all_online_submissions"], 6)
+        self.assertEquals(totals["all_online_pleas"], 6)
+        self.assertEquals(totals["pre_online_submissions"], 2)
+        self.assertEquals(totals["post_online_submissions"], 4)
+        self.assertEquals(totals["post_online_guilty_attend_court_pleas"], 1)
+
+        court_totals = UsageStats.objects.get_plea_report_totals(court_id=self.court_2.id)
+
+        self.assertEquals(court_totals["all_online_submissions"], 1)
+        self.assertEquals(court_totals["pre_online_submissions"], 0)
+
+        by_court = UsageStats.objects.get_plea_report_totals_by_court(start_date=dt.date(2018, 5, 21))
+
+        self.assertEquals(by_court[self.court_1.id]["post_online_submissions"], 3)
+        self.assertEquals(by_court[self.court_2.id]["post_online_not_guilty_pleas"], 1)
+
 
 class TestCourtModel(TestCase):
     def setUp(self):
@@ -430,6 +571,70 @@ class TestCaseModel(TestCase):
         self.assertEqual(auditevent_1.event_type, "case_model")
         self.assertEqual(auditevent_1.event_subtype, "success")
 
+    def test_welsh_postcode_area(self):
+        case = Case.objects.create(urn="00AA123456701", extra_data={"PostCode": "CF10 1AA"})
+        self.assertTrue(case.welsh_postcode_area)
+
+        case.extra_data = {"PostCode": "M60 1PR"}
+        case.save()
+        self.assertFalse(case.welsh_postcode_area)
+
+        case.extra_data = {"DOB": "1970-01-01"}
+        case.save()
+        self.assertIsNone(case.welsh_postcode_area)
+
+
+class TestCaseLanguageStats(TestCase):
+
+    def setUp(self):
+        self.cases = [
+            Case.objects.create(urn="00AA123456700", language="cy", extra_data={"PostCode": "M60 1PR"},
+                                completed_on=dt.datetime(2017, 8, 2, 10, 0)),
+            Case.objects.create(urn="00AA123456701", language="cy", extra_data={"PostCode": "SA1 1AA"},
+                                completed_on=dt.datetime(2017, 8, 20, 10, 0)),
+            Case.objects.create(urn="00AA123456702", language="en",
+                                completed_on=dt.datetime(2017, 9, 1, 10, 0)),
+        ]
+
+    def test_record_completed_case(self):
+        for case in self.cases:
+            CaseLanguageStats.objects.record_completed_case(case)
+
+        august, september = CaseLanguageStats.objects.all()
+
+        self.assertEqual(august.start_date, dt.date(2017, 8, 1))
+        self.assertEqual(august.total_cases, 2)
+        self.assertEqual(august.total_welsh_cases, 2)
+        self.assertEqual(august.total_welsh_with_english_postcodes, 1)
+
+        self.assertEqual(september.month, 9)
+        self.assertEqual(september.total_cases, 1)
+        self.assertEqual(september.total_welsh_cases, 0)
+
+    def test_rebuild(self):
+        self.assertEqual(CaseLanguageStats.objects.rebuild(), 2)
+
+        august = CaseLanguageStats.objects.get(start_date=dt.date(2017, 8, 1))
+
+        self.assertEqual(august.total_cases, 2)
+        self.assertEqual(august.total_welsh_with_english_postcodes, 1)
+
+    def test_months_are_split_at_a_date(self):
+        CaseLanguageStats.objects.rebuild()
+
+        # The rows are only read for whole months
+        CaseLanguageStats.objects.filter(start_date=dt.date(2017, 9, 1)).update(total_cases=5)
+
+        before = CaseLanguageStats.objects.get_months(completed_to=dt.date(2017, 8, 20))
+        after = CaseLanguageStats.objects.get_months(completed_from=dt.date(2017, 8, 20))
+
+        self.assertEqual([(month.start_date, month.total_cases) for month in before],
+                         [(dt.date(2017, 8, 1), 1)])
+        self.assertEqual([(month.start_date, month.total_cases) for month in after],
+                         [(dt.date(2017, 8, 1), 1), (dt.date(2017, 9, 1), 5)])
+        self.assertEqual(before[0].total_welsh_with_english_postcodes, 1)
+        self.assertEqual(after[0].total_welsh_with_english_postcodes, 0)
+
 
 class TestStageCompletionTableModel(TestCase):
 
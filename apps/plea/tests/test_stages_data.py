@@ -8,7 +8,8 @@ from django.test import TestCase, Client
 from django.test.client import RequestFactory
 from collections import namedtuple
 
-from ..stages import URNEntryStage, AuthenticationStage, PleaStage
+from ..stages import (URNEntryStage, AuthenticationStage, PleaStage,
+                      build_case_snapshot, get_case_snapshot)
 from ..models import Court, Case, Offence
 
 
@@ -639,6 +640,46 @@ class TestPleaAuthStage(TestURNStageDataBase):
         self.assertContains(response, offence.offence_wording.encode("utf-8"))
 
 
+    def test_authentication_captures_case_snapshot(self):
+
+        stage = AuthenticationStage(self.urls, self.data2)
+        stage.save({"postcode": "m601pr", "number_of_charges": 2})
+
+        snapshot = self.data2["case_snapshot"]
+
+        self.assertEqual(snapshot["case_id"], self.case.id)
+        self.assertEqual(snapshot["court_id"], self.court.id)
+        self.assertEqual(len(snapshot["offences"]), 2)
+
+    def test_offences_read_from_case_snapshot(self):
+
+        self.data2["dx"] = True
+        self.data2["plea"] = {}
+        self.data2["case_snapshot"] = build_case_snapshot("06AA0000015", self.case, self.court)
+
+        stage = PleaStage(self.urls, self.data2, index=2)
+
+        with self.assertNumQueries(0):
+            stage.load_forms({})
+
+        self.assertIsInstance(stage.form.case_data, Offence)
+        self.assertEqual(stage.form.case_data.offence_short_title, "Some Other Traffic problem")
+
+    def test_outdated_case_snapshot_is_ignored(self):
+
+        self.data2["dx"] = True
+        self.data2["plea"] = {}
+        self.data2["case_snapshot"] = build_case_snapshot("06AA0000015", self.case, self.court)
+        self.data2["case_snapshot"]["version"] = 0
+
+        self.assertIsNone(get_case_snapshot(self.data2))
+
+        stage = PleaStage(self.urls, self.data2)
+        stage.load_forms({})
+
+        self.assertEqual(stage.form.case_data.offence_short_title, "Some Traffic problem")
+
+
 class TestURNSubmissionFailureMessage(TestCase):
     def setUp(self):
         self.court = Court.objects.create(
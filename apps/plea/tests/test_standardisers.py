@@ -48,3 +48,18 @@ class TestStandardisers(TestCase):
 
         for urn, output in urns.items():
             self.assertEquals(output, format_met_urn(urn))
+
+    def test_standardise_urns(self):
+        urns = ["00/AA/11111/99", "0-0-aa_11111-99", "", "06AA0012345699", "02TJ/AA0000/00/0015aa"]
+
+        self.assertEquals(standardise_urns(urns),
+                          ["00AA1111199", "00AA1111199", None, "06AA12345699", "02TJAA0000000015AA"])
+
+    def test_standardise_urns_matches_standardise_urn(self):
+        urns = ["00/aa/11111/99", "06aa/00/123456/99", "02TJ0000000/00aa", "51\nXX\n0000000"]
+
+        self.assertEquals(standardise_urns(urns), [standardise_urn(urn) for urn in urns])
+
+    def test_format_urns(self):
+        self.assertEquals(format_urns(["00AA1111199", None, "02TJDS0479150014AP"]),
+                          ["00/AA/11111/99", None, "02TJDS0479150014AP"])
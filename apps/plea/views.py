@@ -14,6 +14,7 @@ import logging
 logger = logging.getLogger(__name__)
 from django.contrib.admin.views.decorators import staff_member_required
 
+from apps.forms.metrics import measure
 from apps.forms.stages import MultiStageForm
 from apps.forms.views import StorageView
 from make_a_plea.helpers import (
@@ -24,7 +25,8 @@ from make_a_plea.helpers import (
 )
 from .models import Case, Court, CaseTracker
 from .forms import CourtFinderForm
-from .stages import (URNEntryStage,
+from .stages import (can_use_urn,
+                     URNEntryStage,
                      AuthenticationStage,
                      NoticeTypeStage,
                      CaseStage,
@@ -83,18 +85,20 @@ class PleaOnlineForms(MultiStageForm):
         """
         Check that the URN has not already been used.
         """
-        saved_urn = self.all_data.get("case", {}).get("urn")
-        saved_first_name = self.all_data.get("your_details", {}).get("first_name")
-        saved_last_name = self.all_data.get("your_details", {}).get("last_name")
-        if all([
-                saved_urn,
-                saved_first_name,
-                saved_last_name,
-                not Case.objects.can_use_urn(saved_urn, saved_first_name, saved_last_name)
-        ]):
-            self._urn_invalid = True
-        else:
-            return super(PleaOnlineForms, self).save(*args, **kwargs)
+        with measure(self, "save"):
+            saved_urn = self.all_data.get("case", {}).get("urn")
+            saved_first_name = self.all_data.get("your_details", {}).get("first_name")
+            saved_last_name = self.all_data.get("your_details", {}).get("last_name")
+            if all([
+                    saved_urn,
+                    saved_first_name,
+                    saved_last_name,
+                    not can_use_urn(self.all_data, saved_urn, saved_first_name, saved_last_name,
+                                    recheck=self.current_stage_class.name == "review")
+            ]):
+                self._urn_invalid = True
+            else:
+                return super(PleaOnlineForms, self).save(*args, **kwargs)
 
     def render(self, request, request_context=None):
         request_context = request_context if request_context else {}
@@ -3,19 +3,22 @@ from __future__ import unicode_literals
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
 from django.views import View
 from django.urls import reverse, reverse_lazy
 from django.core.urlresolvers import resolve
-from ..plea.models import UsageStats, Court
+from ..plea.models import UsageStats, Court, PLEA_TYPE_CHANGE_DATE
 from urllib.parse import quote, urlencode
 from ..feedback.models import UserRating
 from .charts import RequiredStagesChart, FinancialSituationChart,\
     HardshipChart, AllStagesDropoutsChart, IncomeSourcesDropoutsChart
-from django.db.models import Sum
 import datetime
 from .charts import safe_percentage
 
+# The court drop-down only changes when courts are added in the admin
+COURT_LIST_CACHE_SECONDS = 300
+
 
 def build_url(*args, **kwargs):
     get = kwargs.pop('get', {})
@@ -144,102 +147,78 @@ class BaseReportView(ReportEntryView):
 class PleaReportView(PleaMixin, BaseReportView):
 
     selected_court = "All courts"
+    selected_court_id = None
     report_partial = "partials/plea_report_contents.html"
 
-    def prepare_report_context(self, request):
+    @staticmethod
+    def get_court_list():
+        return cache.get_or_set(
+            "reports_plea_court_list",
+            lambda: list(Court.objects.order_by("court_name").values("id", "court_name")),
+            COURT_LIST_CACHE_SECONDS)
+
+    def set_selected_court(self, request, court_list):
+        selected = request.GET.get("selected_court", self.selected_court)
 
-        qs = UsageStats.objects.all()
+        for court in court_list:
+            # Older links select the court by name
+            if str(court["id"]) == selected or court["court_name"] == selected:
+                self.selected_court = court["court_name"]
+                self.selected_court_id = court["id"]
+                return
+
+        self.selected_court = "All courts"
+        self.selected_court_id = None
+
+    def prepare_report_context(self, request):
 
         # Ensure correct start and end dates for report
         self.set_start_end_dates(request)
-        change_date = datetime.date(day=21, month=5, year=2018)
+        change_date = PLEA_TYPE_CHANGE_DATE
         court_change_date = datetime.date(day=10, month=6, year=2019)
         late_end_date = True  # Set to true if end date is after 21st May
         court_specific_late_end_date = True  # Set to true if end date is after 16th September
         early_start_date = True
         if self.start_date:
-            qs = qs.filter(start_date__gte=self.start_date)
-            start_date = self.start_date
-            if start_date > change_date:
+            if self.start_date > change_date:
                 early_start_date = False
         if self.end_date:
-            qs = qs.filter(start_date__lte=self.end_date)
-            end_date = self.end_date
-            if end_date < change_date:
+            if self.end_date < change_date:
                 late_end_date = False
-            if end_date < court_change_date:
+            if self.end_date < court_change_date:
                 court_specific_late_end_date = False
 
-        if 'selected_court' in request.GET:
-                self.selected_court = request.GET['selected_court']
-
-        if self.selected_court != "All courts":
-            qs = qs.filter(court__court_name=self.selected_court)
-
-        pre_qs = qs.filter(start_date__lte=change_date)
-        post_qs = qs.filter(start_date__gte=change_date)
-        pre_totals = pre_qs.aggregate(Sum('online_submissions'),
-                                      Sum('online_guilty_pleas'),
-                                      Sum('online_not_guilty_pleas'))
-        post_totals = post_qs.aggregate(Sum('online_submissions'),
-                                        Sum('online_guilty_pleas'),
-                                        Sum('online_not_guilty_pleas'),
-                                        Sum('online_guilty_attend_court_pleas'),
-                                        Sum('online_guilty_no_court_pleas'))
-        totals = qs.aggregate(Sum('online_submissions'),
-                              Sum('online_guilty_pleas'),
-                              Sum('online_not_guilty_pleas'))
-        all_online_submissions = totals["online_submissions__sum"] or 0
-        all_online_guilty_pleas = totals["online_guilty_pleas__sum"] or 0
-        all_online_not_guilty_pleas = totals["online_not_guilty_pleas__sum"] or 0
-        all_online_pleas = all_online_guilty_pleas + all_online_not_guilty_pleas
-        pre_online_submissions = pre_totals["online_submissions__sum"] or 0
-        pre_online_guilty_pleas = pre_totals["online_guilty_pleas__sum"] or 0
-        pre_online_not_guilty_pleas = pre_totals["online_not_guilty_pleas__sum"] or 0
-        pre_online_pleas = pre_online_guilty_pleas + pre_online_not_guilty_pleas
-        post_online_submissions = post_totals["online_submissions__sum"] or 0
-        post_online_guilty_pleas = post_totals["online_guilty_pleas__sum"] or 0
-        post_online_not_guilty_pleas = post_totals["online_not_guilty_pleas__sum"] or 0
-        post_online_guilty_attend_court_pleas = post_totals["online_guilty_attend_court_pleas__sum"] or 0
-        post_online_guilty_no_court_pleas = post_totals["online_guilty_no_court_pleas__sum"] or 0
-        post_online_pleas = post_online_not_guilty_pleas + post_online_guilty_pleas
+        court_list = self.get_court_list()
+        self.set_selected_court(request, court_list)
 
-        return {
+        context = UsageStats.objects.get_plea_report_totals(
+            self.start_date, self.end_date, court_id=self.selected_court_id)
+
+        context.update({
             'start_date': self.start_date,
             'end_date': self.end_date,
             'late_end_date': late_end_date,
             'early_start_date': early_start_date,
-            'all_online_submissions' : all_online_submissions,
-            'all_online_guilty_pleas' : all_online_guilty_pleas,
-            'all_online_not_guilty_pleas': all_online_not_guilty_pleas,
-            'all_online_pleas': all_online_pleas,
-            'pre_online_submissions': pre_online_submissions,
-            'pre_online_guilty_pleas': pre_online_guilty_pleas,
-            'pre_online_not_guilty_pleas': pre_online_not_guilty_pleas,
-            'pre_online_pleas': pre_online_pleas,
-            'post_online_submissions': post_online_submissions,
-            'post_online_guilty_pleas': post_online_guilty_pleas,
-            'post_online_not_guilty_pleas': post_online_not_guilty_pleas,
-            'post_online_guilty_attend_court_pleas': post_online_guilty_attend_court_pleas,
-            'post_online_guilty_no_court_pleas': post_online_guilty_no_court_pleas,
-            'post_online_pleas': post_online_pleas,
-            'list_of_courts': Court.objects.all().order_by('court_name'),
+            'list_of_courts': court_list,
             'selected_court': self.selected_court,
+            'selected_court_id': self.selected_court_id,
             'court_specific_late_end_date': court_specific_late_end_date,
-        }
+        })
+
+        return context
 
     def update_context_with_period(self, request, context):
         if self.selected_court:
             day_start, week_start, month_start, today = self.set_dates()
             context["day_url"] = build_url("reports:" + resolve(request.path).url_name,
                                            get={'start_date': day_start, 'end_date': today,
-                                                'selected_court': self.selected_court})
+                                                'selected_court': self.selected_court_id or self.selected_court})
             context["week_url"] = build_url("reports:" + resolve(request.path).url_name,
                                             get={'start_date': week_start, 'end_date': today,
-                                                 'selected_court': self.selected_court})
+                                                 'selected_court': self.selected_court_id or self.selected_court})
             context["month_url"] = build_url("reports:" + resolve(request.path).url_name,
                                              get={'start_date': month_start, 'end_date': today,
-                                                  'selected_court': self.selected_court})
+                                                  'selected_court': self.selected_court_id or self.selected_court})
         else:
             context = super(PleaReportView, self).update_context_with_period(request, context)
         return context
@@ -321,17 +300,9 @@ class RatingReportView(UserRatingMixin, BaseReportView):
 
     def prepare_report_context(self, request):
         self.set_start_end_dates(request)
-        qs = UserRating.objects.all()
-        if self.start_date:
-            qs = qs.filter(timestamp__gte=self.start_date)
-        if self.end_date:
-            qs = qs.filter(timestamp__lte=self.end_date)
-        tot_count = qs.count()
-        vdis_count = qs.filter(service_rating=1).count()
-        dis_count = qs.filter(service_rating=2).count()
-        neither_count = qs.filter(service_rating=3).count()
-        sat_count = qs.filter(service_rating=4).count()
-        vsat_count = qs.filter(service_rating=5).count()
+        histogram = UserRating.objects.get_rating_histogram(self.start_date, self.end_date)
+        tot_count = histogram["total"]
+        vdis_count, dis_count, neither_count, sat_count, vsat_count = histogram["ratings"]
         bar_chart = [["Very dissatisfied".encode('ascii','ignore'), vdis_count],
                     ["Dissatisfied".encode('ascii','ignore'), dis_count],
                     ["Neither satisfied nor dissatisfied".encode('ascii','ignore'), neither_count],
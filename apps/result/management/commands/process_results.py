@@ -4,20 +4,21 @@ import datetime as dt
 import os
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.mail import send_mail
 from django.core.management.base import BaseCommand
-from django.utils import translation
-from django.template.loader import get_template
-from django.utils.translation import ugettext as _
 
 from apps.result.models import Result
-from apps.plea.models import Court
+from apps.result.tasks import process_result
 
 from dateutil.parser import parse
 
 
 class Command(BaseCommand):
+    """
+    Results are emailed by the send_result_email task as they are imported
+    when RESULT_EMAILS_ON_IMPORT is set, in which case this command picks up
+    any that the task missed.
+    """
     help = "Send out result emails"
 
     def __init__(self, *args, **kwargs):
@@ -31,18 +32,6 @@ class Command(BaseCommand):
         self.stdout.write(message)
         self._log_output.write(message+"\n")
 
-    def mark_done(self, result, dry_run=False, message=None, sent=False):
-
-        if message:
-            self.log(message)
-
-        if not dry_run:
-            result.processed = True
-            if sent:
-                result.sent = True
-                result.sent_on = dt.datetime.now()
-            result.save()
-
     def add_arguments(self, parser):
         parser.add_argument(
             "--dry-run",
@@ -77,52 +66,6 @@ class Command(BaseCommand):
                  "If not specified the script will default to today"
         )
 
-    @staticmethod
-    def email_user(data, recipients, lang="en"):
-
-        translation.activate(lang)
-
-        text_template = get_template("emails/user_resulting.txt")
-        html_template = get_template("emails/user_resulting.html")
-
-        t_output = text_template.render(data)
-        h_output = html_template.render(data)
-
-        connection = get_connection(host=settings.EMAIL_HOST,
-                                    port=settings.EMAIL_PORT,
-                                    username=settings.EMAIL_HOST_USER,
-                                    password=settings.EMAIL_HOST_PASSWORD,
-                                    use_tls=settings.EMAIL_USE_TLS)
-
-        subject = _("Make a plea result")
-
-        email = EmailMultiAlternatives(subject, t_output,
-                                       settings.PLEA_CONFIRMATION_EMAIL_FROM,
-                                       recipients, connection=connection)
-
-        email.attach_alternative(h_output, "text/html")
-
-        email.send(fail_silently=False)
-
-    def get_result_data(self, case, result):
-        data = dict(urn=result.urn)
-
-        data["fines"], data["endorsements"], data["total"] = result.get_offence_totals()
-
-        # If we move to using OU codes in Case data this should be replaced by a lookup using the
-        # Case OU code
-        data["court"] = Court.objects.get_court(result.urn, ou_code=case.ou_code)
-
-        if not data["court"]:
-            self.log("URN failed to standardise: {}".format(result.urn))
-
-        data["name"] = case.get_users_name()
-        data["pay_by"] = result.pay_by_date
-        data["payment_details"] = {"division": result.division,
-                                   "account_number": result.account_number}
-
-        return data
-
     def handle(self, *args, **options):
         resulted_count, not_resulted_count = 0, 0
 
@@ -142,40 +85,40 @@ class Command(BaseCommand):
         self.log("Processing results that were imported on {}".format(
             filter_date.strftime("%d/%m/%Y")))
 
-        for result in Result.objects.filter(processed=False,
-                                            sent=False,
-                                            created__range=filter_date_range):
+        results = Result.objects.filter(processed=False,
+                                        sent=False,
+                                        created__range=filter_date_range)
 
-            can_result, reason = result.can_result()
+        # Results classified as not resultable when they were imported can
+        # be marked as done without looking at their case or offences
+        not_resultable = results.filter(resultable=False)
 
-            case = result.get_associated_case()
-            if not case:
+        for urn, reason in not_resultable.values_list("urn", "not_resultable_reason"):
+            self.log("Skipping {} because {}".format(urn, reason))
+            not_resulted_count += 1
 
-                self.mark_done(result, dry_run=options["dry_run"])
+        if not options["dry_run"]:
+            not_resultable.update(processed=True)
 
-                not_resulted_count += 1
-                continue
+        for result_id in results.exclude(resultable=False).values_list("id", flat=True):
 
-            if not can_result:
+            outcome = process_result(result_id,
+                                     override_recipient=override_recipient,
+                                     dry_run=options["dry_run"])
 
-                self.mark_done(result, dry_run=options["dry_run"],
-                               message="Skipping {} because {}".format(result.urn, reason))
-
-                not_resulted_count += 1
+            if outcome is None:
+                # Already processed by the send_result_email task
                 continue
 
-            data = self.get_result_data(case, result)
-
-            if override_recipient:
-                self.email_user(data, override_recipient)
+            sent, message = outcome
 
-            elif not options["dry_run"]:
-                self.email_user(data, [case.email], case.language)
+            if message:
+                self.log(message)
 
-            self.mark_done(result, sent=True, dry_run=options["dry_run"],
-                           message="Completed case {} email sent to {}".format(case.urn, case.email))
-
-            resulted_count += 1
+            if sent:
+                resulted_count += 1
+            else:
+                not_resulted_count += 1
 
         self.log("total resulted: {}\ntotal not resulted: {}".format(resulted_count, not_resulted_count))
 
@@ -1,7 +1,9 @@
 from decimal import Decimal
 import re
 
+from django.contrib.postgres.fields import JSONField
 from django.db import models
+from django.utils.functional import cached_property
 
 from apps.plea.models import Case, CaseOffenceFilter
 
@@ -42,6 +44,35 @@ WITHDRAWN_CODES = {
 }
 
 
+def by_language(language, english, welsh):
+    """
+    The Welsh text for Welsh cases, unless it's blank
+    """
+
+    if language == "cy" and welsh and welsh.strip():
+        return welsh
+
+    return english
+
+
+class ResultManager(models.Manager):
+
+    def get_associated_cases(self, case_numbers):
+        """
+        The associated and resultable case for each case number, found with
+        one query
+        """
+
+        cases = {}
+
+        for case in Case.objects.filter(case_number__in=set(case_numbers),
+                                        email__isnull=False,
+                                        sent=True).order_by("id"):
+            cases.setdefault(case.case_number, case)
+
+        return cases
+
+
 class Result(models.Model):
     created = models.DateTimeField(auto_now_add=True, null=True, blank=True)
 
@@ -63,6 +94,18 @@ class Result(models.Model):
     sent = models.BooleanField(default=False)
     sent_on = models.DateTimeField(null=True, blank=True)
 
+    # Worked out from the offence results when the result is imported, see
+    # get_classification. resultable is None for older results.
+    resultable = models.NullBooleanField(db_index=True)
+    not_resultable_reason = models.CharField(max_length=255, blank=True, default="")
+    fines_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    fines = JSONField(null=True, blank=True)
+    endorsements = JSONField(null=True, blank=True)
+
+    objects = ResultManager()
+
+    classification_fields = ("resultable", "not_resultable_reason", "fines_total", "fines", "endorsements")
+
     def has_valid_offences(self):
         """
         Are all the offences in this case whistlisted?
@@ -76,9 +119,10 @@ class Result(models.Model):
 
         return False
 
-    def can_result(self):
+    def get_classification(self, offence_data=None):
         """
-        Can a case be resulted?
+        Can the offence results be resulted, and what are the fines and
+        endorsements?
 
         All offence results need to be fit the criteria below:
 
@@ -87,67 +131,135 @@ class Result(models.Model):
         2. Does it have final codes? Yes, then we can result
         3. An offence has been adjourned? Yes, then we can't result
         4. An offence has been adjourned but subsequently withdrawn? If yes, then we can result
-        """
 
-        has_fine_codes = False
+        offence_data is the list of ResultOffenceData of each offence, read
+        from the database if not given. The fines and endorsements are kept
+        in both languages, as the case's language is only known when the
+        result is processed.
+        """
 
-        case = self.get_associated_case()
+        if offence_data is None:
+            offence_data = self.get_offence_data()
 
-        if not self.division or not self.account_number:
-            return False, "Missing division code or account number"
+        resultable, reason = True, ""
+        total = Decimal()
+        fines = []
+        endorsements = []
 
-        for result in self.result_offences.all():
+        for data in offence_data:
             adjourned = False
             withdrawn = False
 
-            offence_has_fine_codes = False
+            for r in data:
+                result_code = r.result_code or ""
+
+                if resultable:
+                    if result_code in DO_NOT_RESULT_CODES:
+                        resultable, reason = False, "out of scope result code: {}".format(result_code)
 
-            for offence_data in result.offence_data.all():
+                    elif result_code in ADJOURNED_CODES:
+                        adjourned = True
 
-                if offence_data.result_code in DO_NOT_RESULT_CODES:
-                    return False, "out of scope result code: {}".format(offence_data.result_code)
+                    elif result_code in WITHDRAWN_CODES:
+                        withdrawn = True
 
-                elif offence_data.result_code in ADJOURNED_CODES:
-                    adjourned = True
+                if result_code.startswith("F"):
+                    values = re.findall(r'\xa3([0-9]+\.*[0-9]{0,2})', r.result_wording)
+                    total += sum(Decimal(v) for v in values)
+                    fines.append({"en": r.result_wording, "cy": r.result_wording_welsh})
+
+                elif result_code in ["LEP", "LEA"]:
+                    endorsements.append({"en": r.result_wording, "cy": r.result_wording_welsh})
+
+            if resultable and adjourned and not withdrawn:
+                resultable, reason = False, "adjournment"
+
+        return {"resultable": resultable,
+                "not_resultable_reason": reason,
+                "fines_total": total,
+                "fines": fines,
+                "endorsements": endorsements}
 
-                elif offence_data.result_code in WITHDRAWN_CODES:
-                    withdrawn = True
+    @property
+    def language(self):
+        return getattr(self.case, "language", "en")
 
-            if adjourned and not withdrawn:
-                return False, "adjournment"
+    def get_offence_data(self):
+        """
+        The ResultOffenceData of each offence, read with one query for the
+        offences and one for their data. Each row is given the result's
+        language, so its by_language accessors don't look it up again.
+        """
 
-        return True, ""
+        offences = self.result_offences.order_by("id").prefetch_related(
+            models.Prefetch("offence_data", queryset=ResultOffenceData.objects.order_by("id")))
+
+        language = self.language
+        offence_data = []
+
+        for offence in offences:
+            data = list(offence.offence_data.all())
+            for r in data:
+                r.language = language
+            offence_data.append(data)
+
+        return offence_data
+
+    def classify(self, offence_data=None):
+        """
+        Store the classification, ready for processing
+        """
+
+        for field, value in self.get_classification(offence_data).items():
+            setattr(self, field, value)
+
+    @property
+    def classification(self):
+        if self.resultable is None:
+            return self.get_classification()
+
+        return {field: getattr(self, field) for field in self.classification_fields}
+
+    def can_result(self):
+        """
+        Can a case be resulted?
+        """
+
+        if not self.division or not self.account_number:
+            return False, "Missing division code or account number"
+
+        classification = self.classification
+
+        return classification["resultable"], classification["not_resultable_reason"]
 
     def get_associated_case(self):
         """
         Return an associated and resultable case
+
+        The case is linked when the result is imported, so this only
+        searches for results imported before their case was sent.
         """
 
-        cases = Case.objects.filter(case_number=self.case_number, email__isnull=False, sent=True)
+        if self.case_id:
+            return self.case
+
+        self.case = Result.objects.get_associated_cases([self.case_number]).get(self.case_number)
 
-        return cases[0] if cases else None
+        return self.case
 
     def get_offence_totals(self):
         """
         Extract relevant offence information
         """
 
-        total = Decimal()
-        fines = []
-        endorsements = []
-
-        for offence in self.result_offences.all():
-            for r in offence.offence_data.all():
-                if r.result_code.startswith("F"):
-                    values = re.findall(r'\xa3([0-9]+\.*[0-9]{0,2})', r.result_wording)
-                    value = sum(Decimal(v) for v in values)
-                    total += value
-                    fines.append(r.result_wording_by_language)
+        classification = self.classification
 
-                elif r.result_code in ["LEP", "LEA"]:
-                    endorsements.append(r.result_wording_by_language)
+        fines = [by_language(self.language, fine["en"], fine["cy"])
+                 for fine in classification["fines"]]
+        endorsements = [by_language(self.language, endorsement["en"], endorsement["cy"])
+                        for endorsement in classification["endorsements"]]
 
-        return fines, endorsements, total
+        return fines, endorsements, classification["fines_total"]
 
 
 class ResultOffence(models.Model):
@@ -167,21 +279,24 @@ class ResultOffenceData(models.Model):
     result_wording_welsh = models.TextField(max_length=4000, null=True, blank=True)
     result_seq_number = models.CharField(max_length=10, null=True, blank=True)
 
-    @property
+    @cached_property
     def language(self):
-        return getattr(self.result_offence.result.case, 'language', 'en')
+        """
+        The case's language, unless it was given by Result.get_offence_data
+        """
+        return self.result_offence.result.language
+
+    def get_result_short_title(self, language):
+        return by_language(language, self.result_short_title, self.result_short_title_welsh)
+
+    def get_result_wording(self, language):
+        return by_language(language, self.result_wording, self.result_wording_welsh)
 
     @property
     def result_short_title_by_language(self):
-        if self.language == "cy" and self.result_short_title_welsh and self.result_short_title_welsh.strip():
-            return self.result_short_title_welsh
-        else:
-            return self.result_short_title
+        return self.get_result_short_title(self.language)
 
     @property
     def result_wording_by_language(self):
-        if self.language == "cy" and self.result_wording_welsh and self.result_wording_welsh.strip():
-            return self.result_wording_welsh
-        else:
-            return self.result_wording
+        return self.get_result_wording(self.language)
 
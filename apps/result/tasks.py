@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import datetime as dt
+import logging
+import smtplib
+import socket
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import translation
+from django.utils.translation import ugettext as _
+
+from celery import shared_task
+
+from apps.plea.models import Court
+from apps.result.models import Result
+
+logger = logging.getLogger(__name__)
+
+
+def email_user(data, recipients, lang="en"):
+
+    with translation.override(lang):
+        text_template = get_template("emails/user_resulting.txt")
+        html_template = get_template("emails/user_resulting.html")
+
+        t_output = text_template.render(data)
+        h_output = html_template.render(data)
+
+        subject = _("Make a plea result")
+
+    connection = get_connection(host=settings.EMAIL_HOST,
+                                port=settings.EMAIL_PORT,
+                                username=settings.EMAIL_HOST_USER,
+                                password=settings.EMAIL_HOST_PASSWORD,
+                                use_tls=settings.EMAIL_USE_TLS)
+
+    email = EmailMultiAlternatives(subject, t_output,
+                                   settings.PLEA_CONFIRMATION_EMAIL_FROM,
+                                   recipients, connection=connection)
+
+    email.attach_alternative(h_output, "text/html")
+
+    email.send(fail_silently=False)
+
+
+def get_result_data(case, result):
+    data = dict(urn=result.urn)
+
+    data["fines"], data["endorsements"], data["total"] = result.get_offence_totals()
+
+    # If we move to using OU codes in Case data this should be replaced by a lookup using the
+    # Case OU code
+    data["court"] = Court.objects.get_court(result.urn, ou_code=case.ou_code)
+
+    if not data["court"]:
+        logger.warning("URN failed to standardise: {}".format(result.urn))
+
+    data["name"] = case.get_users_name()
+    data["pay_by"] = result.pay_by_date
+    data["payment_details"] = {"division": result.division,
+                               "account_number": result.account_number}
+
+    return data
+
+
+def mark_done(result, dry_run=False, sent=False):
+
+    if not dry_run:
+        result.processed = True
+        if sent:
+            result.sent = True
+            result.sent_on = dt.datetime.now()
+        result.save()
+
+
+def process_result(result_id, override_recipient=None, dry_run=False):
+    """
+    Send the user the result email, if the result can be resulted, and mark
+    the result as processed.
+
+    The result is locked while it is processed, so the send_result_email
+    task and the process_results command can't both send it.
+
+    Returns (sent, message), or None if the result has already been
+    processed or is being processed elsewhere.
+    """
+
+    with transaction.atomic():
+        result = Result.objects\
+            .select_for_update(skip_locked=True)\
+            .filter(pk=result_id, processed=False, sent=False)\
+            .first()
+
+        if result is None:
+            return None
+
+        case = result.get_associated_case()
+
+        can_result, reason = result.can_result()
+
+        if not case:
+            mark_done(result, dry_run=dry_run)
+            return False, None
+
+        if not can_result:
+            mark_done(result, dry_run=dry_run)
+            return False, "Skipping {} because {}".format(result.urn, reason)
+
+        data = get_result_data(case, result)
+
+        if override_recipient:
+            email_user(data, override_recipient)
+
+        elif not dry_run:
+            email_user(data, [case.email], case.language)
+
+        mark_done(result, dry_run=dry_run, sent=True)
+
+        return True, "Completed case {} email sent to {}".format(case.urn, case.email)
+
+
+def queue_results(results):
+    """
+    Queue the results to be processed once the current transaction commits,
+    if results are emailed as they are imported
+    """
+
+    if not settings.RESULT_EMAILS_ON_IMPORT:
+        return
+
+    result_ids = [result.id for result in results]
+
+    def queue():
+        for result_id in result_ids:
+            send_result_email.delay(result_id)
+
+    transaction.on_commit(queue)
+
+
+@shared_task(bind=True, max_retries=10, default_retry_delay=1800)
+def send_result_email(self, result_id):
+    """
+    Result a newly imported result. Results that can't be resulted yet are
+    marked as processed, as the process_results command would.
+    """
+
+    try:
+        outcome = process_result(result_id)
+    except (smtplib.SMTPException, socket.error) as exc:
+        raise self.retry(exc=exc)
+
+    if outcome is None:
+        logger.info("Result {} already processed".format(result_id))
+    else:
+        logger.info("Result {} processed: {}".format(result_id, outcome[1] or "no associated case"))
+
+    return True
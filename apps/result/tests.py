@@ -13,6 +13,7 @@ from django.test import TestCase
 from apps.plea.models import Court, Case, CaseOffenceFilter
 from .models import Result, ResultOffenceData, ResultOffence
 from .management.commands.process_results import Command
+from .tasks import send_result_email
 
 
 class ResultTestCase(TestCase):
@@ -283,6 +284,94 @@ class ResultTestCase(TestCase):
         self.assertEquals(Decimal("100"), total)
 
 
+    def test_get_offence_totals_queries(self):
+
+        self.test_case1.language = "cy"
+        self.test_case1.save()
+
+        for offence in (self.offence1, self.offence2):
+            ResultOffenceData.objects.create(
+                result_offence=offence,
+                result_code="FCOST",
+                result_short_title="FINE",
+                result_wording=u"english words £75.00 more english",
+                result_wording_welsh=u"I dalu costau o £75.00 welsh")
+
+            ResultOffenceData.objects.create(
+                result_offence=offence,
+                result_code="LEP",
+                result_short_title="ENDORSEMENT",
+                result_wording="Driving record endorsed with 3 points.")
+
+        result = Result.objects.select_related("case").get(pk=self.test_result1.id)
+
+        with self.assertNumQueries(2):
+            fines, endorsements, total = result.get_offence_totals()
+
+        self.assertEquals(len(fines), 3)
+        self.assertEquals(fines[1], u"I dalu costau o £75.00 welsh")
+        self.assertEquals(len(endorsements), 2)
+
+    def test_get_offence_data_passes_language(self):
+
+        self.test_case1.language = "cy"
+        self.test_case1.save()
+
+        ResultOffenceData.objects.create(
+            result_offence=self.offence2,
+            result_code="FCOST",
+            result_short_title="FINE",
+            result_short_title_welsh="dirwy",
+            result_wording=u"english words £75.00 more english")
+
+        result = Result.objects.select_related("case").get(pk=self.test_result1.id)
+        offence_data = result.get_offence_data()
+
+        with self.assertNumQueries(0):
+            self.assertEquals(offence_data[1][0].result_short_title_by_language, "dirwy")
+
+    def test_classify(self):
+
+        ResultOffenceData.objects.create(
+            result_offence=self.offence2,
+            result_code="FVS",
+            result_short_title="FINE",
+            result_wording=u"english words £75.00 more english",
+            result_wording_welsh=u"I dalu costau o £75.00 welsh"
+        )
+
+        self.test_result1.classify()
+        self.test_result1.save()
+
+        result = Result.objects.get(pk=self.test_result1.id)
+
+        self.assertTrue(result.resultable)
+        self.assertEquals(result.fines_total, Decimal("75"))
+        self.assertEquals(len(result.fines), 2)
+
+        self.test_case1.language = "cy"
+        self.test_case1.save()
+
+        fines, _, total = result.get_offence_totals()
+
+        self.assertEquals(fines[1], u"I dalu costau o £75.00 welsh")
+        self.assertEquals(total, Decimal("75"))
+
+    def test_classify_adjourned(self):
+
+        ResultOffenceData.objects.create(
+            result_offence=self.offence2,
+            result_code="A",
+            result_short_title="ADJOURNED"
+        )
+
+        self.test_result1.classify()
+
+        self.assertFalse(self.test_result1.resultable)
+        self.assertEquals(self.test_result1.not_resultable_reason, "adjournment")
+        self.assertEquals(self.test_result1.can_result(), (False, "adjournment"))
+
+
 class ProcessResultsTestCase(TestCase):
 
     def setUp(self):
@@ -459,6 +548,42 @@ class ProcessResultsTestCase(TestCase):
         self.assertFalse(result.sent)
         self.assertFalse(result.processed)
 
+    def test_send_result_email_task(self):
+
+        send_result_email.delay(self.test_result1.id)
+
+        result = Result.objects.get(pk=self.test_result1.id)
+        self.assertTrue(result.sent)
+        self.assertTrue(result.processed)
+
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertEquals(mail.outbox[0].to, [self.test_case1.email])
+
+    def test_result_sent_by_task_not_resent_by_command(self):
+
+        send_result_email.delay(self.test_result1.id)
+        send_result_email.delay(self.test_result1.id)
+
+        self.command.handle(**self.opts)
+
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertIn("total resulted: 0", self.command._log_output.getvalue())
+
+    def test_not_resultable_result_is_skipped(self):
+
+        self.test_result1.resultable = False
+        self.test_result1.not_resultable_reason = "adjournment"
+        self.test_result1.save()
+
+        self.command.handle(**self.opts)
+
+        result = Result.objects.get(pk=self.test_result1.id)
+
+        self.assertTrue(result.processed)
+        self.assertFalse(result.sent)
+        self.assertEquals(mail.outbox, [])
+        self.assertIn("Skipping 51XX0000000 because adjournment", self.command._log_output.getvalue())
+
     def test_forward_email_section_removed_from_plain_text_email(self):
         self.command.handle(**self.opts)
 
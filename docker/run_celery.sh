@@ -4,5 +4,15 @@ export PATH=$PATH:/makeaplea/
 
 export C_FORCE_ROOT=true
 
-cd /makeaplea && source /makeaplea/docker/celery_defaults && celery worker -A make_a_plea.celery:app --loglevel INFO
+# Run a pool for specific queues by setting CELERY_WORKER_QUEUES, e.g. one
+# container with "court", one with "user" and one with "bulk,celery", sized
+# with CELERY_WORKER_CONCURRENCY. By default a worker takes every queue.
+CELERY_WORKER_QUEUES=${CELERY_WORKER_QUEUES:-court,user,bulk,celery}
+CELERY_WORKER_OPTS="-Q $CELERY_WORKER_QUEUES -n worker-${CELERY_WORKER_QUEUES//,/-}@%h"
+
+if [ -n "$CELERY_WORKER_CONCURRENCY" ]; then
+    CELERY_WORKER_OPTS="$CELERY_WORKER_OPTS --concurrency $CELERY_WORKER_CONCURRENCY"
+fi
+
+cd /makeaplea && source /makeaplea/docker/celery_defaults && celery worker -A make_a_plea.celery:app --loglevel INFO $CELERY_WORKER_OPTS
 
@@ -1,7 +1,11 @@
 from __future__ import absolute_import
 
+import logging
 import os
+import time
+
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun
 
 from django.conf import settings
 
@@ -11,3 +15,50 @@ if not "DJANGO_SETTINGS_MODULE" in os.environ:
 app = Celery('apps.plea')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+logger = logging.getLogger(__name__)
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+
+@task_prerun.connect
+def log_queue_latency(task=None, **kwargs):
+    """
+    Log how long each task waited on its queue, so the latency of each
+    queue can be tracked alongside its depth (see the queue_stats command).
+    """
+
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+
+    if enqueued_at is None:
+        return
+
+    queue = (task.request.delivery_info or {}).get("routing_key")
+    latency = time.time() - enqueued_at
+
+    logger.info("Task {} waited {:.1f}s on queue {}".format(task.name, latency, queue),
+                extra={"queue": queue, "task": task.name, "queue_latency": latency})
+
+
+def get_queue_depths(queues=None):
+    """
+    Returns (queue, message count) for each queue, or a count of None if the
+    queue doesn't exist yet.
+    """
+
+    depths = []
+
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+
+        for queue in queues or settings.CELERY_QUEUES_BY_PRIORITY:
+            try:
+                depths.append((queue, channel.queue_declare(queue=queue, passive=True).message_count))
+            except connection.channel_errors:
+                depths.append((queue, None))
+
+    return depths
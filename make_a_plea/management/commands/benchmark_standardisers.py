@@ -0,0 +1,78 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.plea.standardisers import (
+    format_for_region, format_urns, standardise_urn, standardise_urns, StandardiserNoOutputException)
+
+
+def get_urns(count, distinct):
+    """
+    count URNs in the styles users type them in, drawn from distinct
+    different URNs
+    """
+    regions = ["00", "02", "06", "51"]
+    separators = ["", "/", "-", " "]
+
+    urns = []
+    for i in range(distinct):
+        letters = "".join(random.choice(string.ascii_letters) for _ in range(2))
+        number = "".join(random.choice(string.digits) for _ in range(random.choice([5, 7, 9])))
+        separator = random.choice(separators)
+        urns.append(separator.join([random.choice(regions), letters, number, "{:02}".format(i % 100)]))
+
+    return [random.choice(urns) for _ in range(count)]
+
+
+def per_item(urns, standardise, format):
+    output = []
+    for urn in urns:
+        try:
+            output.append(format(standardise(urn)))
+        except StandardiserNoOutputException:
+            output.append(None)
+    return output
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput of standardising and formatting URNs one at a time and in a batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000,
+                            help="Number of URNs to standardise")
+        parser.add_argument("--distinct", type=int, default=5000,
+                            help="Number of different URNs among them")
+
+    def time(self, name, function, urns):
+        standardise_urn.cache_clear()
+        format_for_region.cache_clear()
+
+        start = time.time()
+        output = function(urns)
+        elapsed = time.time() - start
+
+        self.stdout.write("{:<24} {:>8.3f}s {:>12,.0f} URNs/s".format(name, elapsed, len(urns) / elapsed))
+
+        return output
+
+    def handle(self, *args, **options):
+        urns = get_urns(options["count"], options["distinct"])
+
+        self.stdout.write("{:,} URNs, {:,} distinct".format(len(urns), len(set(urns))))
+
+        uncached = self.time("per item, no memo",
+                             lambda urns: per_item(urns, standardise_urn.__wrapped__, format_for_region.__wrapped__),
+                             urns)
+
+        cached = self.time("per item, memoised",
+                           lambda urns: per_item(urns, standardise_urn, format_for_region),
+                           urns)
+
+        batch = self.time("batch",
+                          lambda urns: format_urns(standardise_urns(urns)),
+                          urns)
+
+        if not uncached == cached == batch:
+            self.stderr.write("The outputs differ")
@@ -1,12 +1,14 @@
 from django.core.management.base import BaseCommand
 
 
-from apps.plea.models import UsageStats
+from apps.plea.models import DaysFromHearingStats, UsageStats
 
 
 class Command(BaseCommand):
-    help = "Build weekly aggregate stats"
+    help = "Build weekly and daily aggregate stats"
 
     def handle(self, *args, **options):
 
         UsageStats.objects.calculate_weekly_stats()
+
+        DaysFromHearingStats.objects.calculate_daily_stats()
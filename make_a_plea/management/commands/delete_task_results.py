@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_celery_results.models import TaskResult
+
+
+class Command(BaseCommand):
+    help = "Delete stored Celery task results in chunks, to clear the backlog left by the " \
+        "database result backend without one long running delete"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=5000,
+            help="How many rows to delete per query"
+        )
+
+        parser.add_argument(
+            "--pause",
+            dest="pause",
+            type=float,
+            default=0.5,
+            help="Seconds to sleep between chunks, to give other queries a look in"
+        )
+
+    def handle(self, *args, **options):
+        deleted = 0
+
+        while True:
+            ids = list(TaskResult.objects.order_by("id").values_list("id", flat=True)[:options["chunk_size"]])
+
+            if not ids:
+                break
+
+            TaskResult.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+            self.stdout.write("{} task results deleted".format(deleted))
+
+            time.sleep(options["pause"])
+
+        self.stdout.write("Done, {} task results deleted.".format(deleted))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from make_a_plea.celery import get_queue_depths
+
+
+class Command(BaseCommand):
+    help = "Print the number of messages waiting on each Celery queue, in priority order. " \
+        "Queue latency is logged by the workers as each task starts."
+
+    def handle(self, *args, **options):
+        for queue, depth in get_queue_depths():
+            if depth is None:
+                self.stdout.write("{}: queue not found".format(queue))
+            else:
+                self.stdout.write("{}: {} waiting".format(queue, depth))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+
+from apps.plea.models import HearingDayStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hearing day stats from the court email counts"
+
+    def handle(self, *args, **options):
+
+        count = HearingDayStats.objects.rebuild()
+
+        self.stdout.write("{} hearing day stats created.".format(count))
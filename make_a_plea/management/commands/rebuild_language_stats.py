@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+
+from apps.plea.models import CaseLanguageStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly case language stats"
+
+    def handle(self, *args, **options):
+
+        count = CaseLanguageStats.objects.rebuild()
+
+        self.stdout.write("{} monthly stats created.".format(count))
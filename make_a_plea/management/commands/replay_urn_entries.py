@@ -1,18 +1,34 @@
+from collections import defaultdict
+
 from django.core.management.base import BaseCommand
 
 from apps.plea.models import DataValidation, Case
+from apps.plea.standardisers import format_urns, standardise_urns
 
 
 class Command(BaseCommand):
     help = "Re-runs the urn data validation entries to find matches in the current data set"
 
     def handle(self, *args, **options):
-        for dv in DataValidation.objects.all():
-            cases = Case.objects.filter(urn=dv.urn_standardised, case_number__isnull=False)
-            dv.case_match_count = len(cases)
-            if len(cases) > 0:
-                dv.case_match = cases[0]
-            else:
-                dv.case_match = None
+        entries = list(DataValidation.objects.all())
+
+        standardised = standardise_urns([dv.urn_entered for dv in entries])
+        formatted = format_urns(standardised)
+
+        for dv, urn, formatted_urn in zip(entries, standardised, formatted):
+            if urn:
+                dv.urn_standardised, dv.urn_formatted = urn, formatted_urn
+
+        cases = defaultdict(list)
+        for case_id, urn in Case.objects\
+                .filter(urn__in=set(dv.urn_standardised for dv in entries), case_number__isnull=False)\
+                .order_by("id")\
+                .values_list("id", "urn"):
+            cases[urn].append(case_id)
+
+        for dv in entries:
+            matches = cases.get(dv.urn_standardised, [])
+            dv.case_match_count = len(matches)
+            dv.case_match_id = matches[0] if matches else None
 
             dv.save()
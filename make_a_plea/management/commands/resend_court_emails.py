@@ -1,19 +1,26 @@
 import json
+import os
 import re
-import smtplib
-import socket
-import time
 import sys
-from django.conf import settings
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection as db_connection
 from django.utils import translation
-from apps.plea.attachment import TemplateAttachmentEmail
-from apps.plea.models import Court, Case
-from apps.plea.tasks import get_email_subject
+from apps.plea.attachment import TemplateAttachmentEmail, get_route_connection
+from apps.plea.encrypt import decrypt_user_data
+from apps.plea.models import Court, Case, EmailSendLedger
+from apps.plea.tasks import get_email_subject, get_smtp_gateway
+
+
+case_id_re = re.compile(r".*\[(\d+)\]")
 
 
-def manual_send_court_email(json_data, case_id):
+def manual_send_court_email(json_data, case_id, force=False, smtp_route=None, get_connection=None):
     """
     Used to manually send a court email from archieved user data, in case of a email sending
     failure.
@@ -22,6 +29,12 @@ def manual_send_court_email(json_data, case_id):
 
     ./manage.py resend_court_emails {jsonnfile1} {jsonfile2} etc.
 
+    The route defaults to the court's gateway, as in the email_send_court task.
+    get_connection, if given, is called with the route and returns the SMTP
+    connection to send through.
+
+    Returns False without sending if the case has already been sent, or its
+    court email has been claimed, unless force is set.
     """
 
     email_data = json.loads(json_data)
@@ -31,9 +44,11 @@ def manual_send_court_email(json_data, case_id):
     except Case.DoesNotExist:
         case = None
 
-    case_id = case.id if case else "XX"
+    # Cases sent before the ledger was added have no ledger entry to check
+    if case and case.sent and not force:
+        return False
 
-    smtp_route = "PUB"
+    case_id = case.id if case else "XX"
 
     try:
         court_obj = Court.objects.get_by_urn(email_data["case"]["urn"])
@@ -42,9 +57,18 @@ def manual_send_court_email(json_data, case_id):
 
     plea_email_to = [court_obj.submission_email]
 
+    smtp_route = smtp_route or get_smtp_gateway(court_obj.submission_email)
+
     email_subject = get_email_subject(email_data)
     email_body = "<<<makeaplea-ref: {}/{}>>>".format(case_id, "XX")
 
+    fingerprint = EmailSendLedger.objects.get_fingerprint(plea_email_to, email_subject)
+
+    claimed = case is not None and EmailSendLedger.objects.claim(case, "court", fingerprint)
+
+    if case and not claimed and not force:
+        return False
+
     plea_email = TemplateAttachmentEmail(settings.PLEA_EMAIL_FROM,
                                          settings.PLEA_EMAIL_ATTACHMENT_NAME,
                                          "emails/attachments/plea_email.html",
@@ -52,57 +76,303 @@ def manual_send_court_email(json_data, case_id):
                                          "text/html")
 
     try:
+        connection = get_connection(smtp_route) if get_connection else None
+
         with translation.override("en"):
             plea_email.send(plea_email_to,
                             email_subject,
                             email_body,
-                            route=smtp_route)
+                            route=smtp_route,
+                            connection=connection)
 
-    except (smtplib.SMTPException, socket.error, socket.gaierror) as exc:
+    except Exception:
+        if claimed:
+            EmailSendLedger.objects.release(case, "court", fingerprint)
         raise
     else:
         if case:
+            EmailSendLedger.objects.mark_sent(case, "court", fingerprint)
             case.add_action("Court email sent", "Sent mail to {0} via {1}".format(plea_email_to, smtp_route))
             case.sent = True
             case.save()
 
+    return True
 
 
-class Command(BaseCommand):
-    help = "Resend court emails from the archived json file"
+class TokenBucket(object):
+    """
+    Allows rate sends a second on average, and up to capacity at once after
+    a quiet spell.
+    """
 
-    def add_arguments(self, parser):
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
 
-        parser.add_argument('file', nargs='+', type=str)
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
 
-    def handle(self, *args, **options):
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
 
-        case_id_re = re.compile(".*\[(\d+)\]")
 
-        for file_ in options["file"]:
-            sys.stdout.write("Attempting to process: {}\n".format(file_))
+class Checkpoint(object):
+    """
+    Append-only record of the files that have been dealt with, so an
+    interrupted run can be restarted with the same arguments.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
 
-            matches = case_id_re.match(file_)
+        if path and os.path.exists(path):
+            with open(path) as fd:
+                self.done = set(line.strip() for line in fd if line.strip())
 
-            if not matches:
-                sys.stderr.write("Can't find a case id in file name, skipping\n")
-                continue
+    def __contains__(self, file_):
+        return file_ in self.done
 
-            case_id = int(matches.groups()[0])
+    def mark(self, file_):
+        if not self.path:
+            return
 
-            with open(file_) as fd:
-                data = fd.read()
+        with self.lock:
+            self.done.add(file_)
+            with open(self.path, "a") as fd:
+                fd.write(file_ + "\n")
 
-                try:
-                    manual_send_court_email(data, case_id)
-                except Exception as ex:
-                    sys.stderr.write("error: {}\n".format(ex))
 
+class ResendEngine(object):
+    """
+    Sends court emails from archived files with a bounded pool of workers.
+
+    Each route has its own token bucket, and each worker keeps one open SMTP
+    connection per route for the whole run.
+    """
+
+    def __init__(self, workers=4, rate=1.0, burst=1, checkpoint=None, force=False,
+                 smtp_route=None, passphrase=None, stdout=sys.stdout, stderr=sys.stderr):
+        self.workers = workers
+        self.force = force
+        self.smtp_route = smtp_route
+        self.passphrase = passphrase
+        self.checkpoint = Checkpoint(checkpoint)
+        self.stdout = stdout
+        self.stderr = stderr
+
+        self.buckets = defaultdict(lambda: TokenBucket(rate, burst))
+        self.connections = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+
+    def write(self, stream, message):
+        with self.lock:
+            stream.write(message + "\n")
+
+    def get_connection(self, route):
+        with self.lock:
+            bucket = self.buckets[route]
+
+        bucket.take()
+
+        connections = getattr(self.local, "connections", None)
+        if connections is None:
+            connections = self.local.connections = {}
+
+        if route not in connections:
+            connection = get_route_connection(route)
+            connection.open()
+            connections[route] = connection
+            with self.lock:
+                self.connections.append(connection)
+
+        return connections[route]
+
+    def drop_connections(self):
+        """
+        Forget this worker's connections after a failure, in case the
+        server has hung up.
+        """
+        for connection in getattr(self.local, "connections", {}).values():
+            connection.close()
+        self.local.connections = {}
+
+    def read(self, file_):
+        if file_.endswith(".gpg"):
+            return decrypt_user_data(file_, passphrase=self.passphrase)
+
+        with open(file_) as fd:
+            return fd.read()
+
+    def process(self, file_):
+        name = os.path.basename(file_)
+
+        matches = case_id_re.match(name)
+
+        if not matches:
+            self.write(self.stderr, "{}: can't find a case id in file name, skipping".format(file_))
+            return "skipped"
+
+        case_id = int(matches.groups()[0])
+
+        try:
+            sent = manual_send_court_email(self.read(file_), case_id,
+                                           force=self.force,
+                                           smtp_route=self.smtp_route,
+                                           get_connection=self.get_connection)
+        except Exception as ex:
+            self.drop_connections()
+            self.write(self.stderr, "{}: error: {}".format(file_, ex))
+            return "failed"
+        finally:
+            db_connection.close()
+
+        self.checkpoint.mark(name)
+
+        if not sent:
+            self.write(self.stdout, "{}: already sent, skipping".format(file_))
+            return "already sent"
+
+        self.write(self.stdout, "{}: success!".format(file_))
+        return "sent"
+
+    def count(self, future):
+        with self.lock:
+            self.counts[future.result()] += 1
+
+    def run(self, files):
+        """
+        Process the files, keeping at most twice as many queued as there are
+        workers so a long listing is read as it is consumed.
+        """
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def done(future):
+            slots.release()
+            self.count(future)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for file_ in files:
+                if os.path.basename(file_) in self.checkpoint:
+                    with self.lock:
+                        self.counts["checkpointed"] += 1
                     continue
 
-                sys.stdout.write("success!\n")
+                slots.acquire()
+                pool.submit(self.process, file_).add_done_callback(done)
+
+        for connection in self.connections:
+            connection.close()
+
+        return dict(self.counts)
+
+
+def iter_spool(directory):
+    """
+    The files written by encrypt_and_store_user_data, oldest first.
+    """
+    names = sorted((name for name in os.listdir(directory) if name.endswith(".data.gpg")),
+                   key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+
+    for name in names:
+        yield os.path.join(directory, name)
+
+
+class Command(BaseCommand):
+    help = "Resend court emails from archived json files or the encrypted user data spool"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('file', nargs='*', type=str)
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            dest="force",
+            default=False,
+            help="Resend even if the court email has already been sent")
+
+        parser.add_argument(
+            "--spool",
+            nargs="?",
+            const=settings.USER_DATA_DIRECTORY,
+            default=None,
+            help="Also read the encrypted .data.gpg files in this directory "
+                 "(default settings.USER_DATA_DIRECTORY)")
+
+        parser.add_argument(
+            "--passphrase",
+            default=None,
+            help="Passphrase for the private key used to decrypt .gpg files")
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of emails to send concurrently")
+
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=1.0,
+            help="Emails per second allowed on each SMTP route")
+
+        parser.add_argument(
+            "--burst",
+            type=int,
+            default=1,
+            help="Emails that can be sent at once on a route after a quiet spell")
+
+        parser.add_argument(
+            "--route",
+            default=None,
+            help="Send through this SMTP route instead of the court's gateway")
+
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="File recording the processed files, so the run can be resumed")
+
+    def handle(self, *args, **options):
+
+        files = list(options["file"])
+
+        if not files and not options["spool"]:
+            sys.stderr.write("Give some files or --spool\n")
+            return
+
+        def sources():
+            for file_ in files:
+                yield file_
+
+            if options["spool"]:
+                for file_ in iter_spool(options["spool"]):
+                    yield file_
 
-            sys.stdout.write("sleeping for 10 seconds...\n")
-            time.sleep(10)
+        engine = ResendEngine(workers=options["workers"],
+                              rate=options["rate"],
+                              burst=options["burst"],
+                              checkpoint=options["checkpoint"],
+                              force=options["force"],
+                              smtp_route=options["route"],
+                              passphrase=options["passphrase"])
 
+        counts = engine.run(sources())
 
+        sys.stdout.write("{}\n".format(", ".join(
+            "{}: {}".format(key, value) for key, value in sorted(counts.items()))))
@@ -116,6 +116,14 @@ PREMAILER_OPTIONS = {"base_url": os.environ.get("PREMAILER_BASE_URL", "https://w
                      "keep_style_tags": True,
                      "cssutils_logging_level": logging.ERROR}
 
+# Email templates that are run through Premailer once per language when loaded,
+# rather than every time they are rendered. See make_a_plea.template_loaders.
+COMPILED_EMAIL_TEMPLATES = [
+    "emails/user_plea_confirmation.html",
+    "emails/user_plea_confirmation_sjp.html",
+    "emails/user_resulting.html",
+]
+
 # Make this unique, and don't share it with anybody.
 SECRET_KEY = os.environ.get("SECRET_KEY", "")
 
@@ -126,8 +134,13 @@ TEMPLATES = [
             "templates",
             root('templates'),
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                ('make_a_plea.template_loaders.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.i18n",
@@ -280,12 +293,53 @@ LOGGING = {
 }
 
 
+# Where the MultiStageForm stage metrics go, see apps.forms.metrics. The
+# MemorySink feeds the staff-only /stage-metrics/ view. Each stage's queries
+# are counted too, unless FORM_STAGE_METRICS_QUERIES is set to False.
+FORM_STAGE_METRICS_SINKS = [{"BACKEND": "apps.forms.metrics.MemorySink",
+                             "OPTIONS": {"size": 1000}}]
+
+if os.environ.get("STATSD_HOST"):
+    FORM_STAGE_METRICS_SINKS.append({"BACKEND": "apps.forms.metrics.StatsdSink",
+                                     "OPTIONS": {"host": os.environ["STATSD_HOST"],
+                                                 "port": os.environ.get("STATSD_PORT", 8125)}})
+
+# Public stats API cache, see apps.plea.stats_cache. Point ALIAS at a shared
+# cache so that changes made by the web and worker processes invalidate it
+# straight away, otherwise results can be up to TIMEOUT seconds stale. The
+# docker settings use a database cache, created by createcachetable.
+STATS_CACHE = {"ALIAS": "default",
+               "TIMEOUT": 300,
+               "LOCK_TIMEOUT": 30}
+
 INTERNAL_IPS = ['127.0.0.1']
 
 # EMAILS
 CELERY_BROKER_URL = "SQS://"
 CELERY_BROKER_TRANSPORT_OPTIONS = {'region': 'eu-west-1'}
 CELERY_RESULT_BACKEND='django-db'
+# The email tasks are fire and forget: their outcome is recorded as CaseActions,
+# so nothing is written to the result backend unless this is turned back on
+CELERY_TASK_IGNORE_RESULT = os.environ.get("CELERY_STORE_TASK_RESULTS", "") != "True"
+
+# Each kind of email has its own queue, so a backlog of one can't hold up the
+# others. Queues are listed in priority order: run a worker pool per queue, or
+# at least give court and user emails their own (see docker/run_celery.sh).
+# The bulk workers also drain "celery", the queue used before routing.
+CELERY_QUEUES_BY_PRIORITY = ["court", "user", "bulk", "celery"]
+CELERY_TASK_DEFAULT_QUEUE = "bulk"
+CELERY_TASK_ROUTES = {
+    "apps.plea.tasks.email_send_court": {"queue": "court"},
+    "apps.plea.tasks.email_send_prosecutor": {"queue": "court"},
+    "apps.plea.tasks.email_send_user": {"queue": "user"},
+    "apps.result.tasks.send_result_email": {"queue": "bulk"},
+}
+# Email users their result as soon as it is imported through the API, rather
+# than waiting for the process_results command
+RESULT_EMAILS_ON_IMPORT = os.environ.get("RESULT_EMAILS_ON_IMPORT", "") == "True"
+
+# Only take one message at a time, so a busy worker doesn't sit on urgent ones
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
 SERVER_EMAIL = os.environ.get("SERVER_EMAIL", "")
 
@@ -297,6 +351,15 @@ SMTP_ROUTES = {"GSI": {"HOST": os.environ.get("GSI_EMAIL_HOST", "localhost"),
                        "PORT": os.environ.get("EMAIL_PORT", 25)}
                }
 
+# Circuit breaker for the SMTP routes, see apps.plea.models.SmtpRouteStatusManager.
+# Times are in seconds.
+SMTP_ROUTE_BREAKER = {"FAILURE_THRESHOLD": 5,
+                      "BACKOFF_BASE": 60,
+                      "BACKOFF_MAX": 3600,
+                      "PROBE_TIMEOUT": 300,
+                      "WAVE_SIZE": 20,
+                      "WAVE_INTERVAL": 60}
+
 # Public email
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
 EMAIL_PORT = os.environ.get("EMAIL_PORT", 25)
@@ -333,6 +396,9 @@ RECEIPT_HEADER_FRAGMENT_CHECK = os.environ.get("RECEIPT_HEADER_FRAGMENT_CHECK",
 USER_DATA_DIRECTORY = os.environ.get('USER_DATA_DIRECTORY', os.path.abspath(here('../../user_data')))
 GPG_RECIPIENT = os.environ.get('GPG_RECIPIENT', 'test@example.org')
 GPG_HOME_DIRECTORY = os.environ.get('GPG_HOME_DIRECTORY', '/home/vagrant/.gnupg/')
+# Passphrase for the submission payloads read back by the email tasks, required.
+# Keep it when rotating SECRET_KEY, queued payloads can't be read without it
+SUBMISSION_PAYLOAD_PASSPHRASE = os.environ.get('SUBMISSION_PAYLOAD_PASSPHRASE', '')
 
 ENV_BASE_URL = os.environ.get("ENV_BASE_URL", "")
 FTP_SERVER_IP = os.environ.get("FTP_SERVER_IP", "")
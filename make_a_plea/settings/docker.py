@@ -5,6 +5,14 @@ import os
 DEBUG = os.environ.get("DJANGO_DEBUG", "") == "True"
 TEMPLATE_DEBUG = DEBUG
 
+if not DEBUG:
+    # Cache parsed templates, as Django does by default when the loaders aren't set.
+    # The email loader stays outermost as it caches its output per language.
+    email_loader, template_loaders = TEMPLATES[0]["OPTIONS"]["loaders"][0]
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (email_loader, [("django.template.loaders.cached.Loader", template_loaders)]),
+    ]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
@@ -18,6 +26,20 @@ DATABASES = {
 
 GOOGLE_ANALYTICS_ID = os.environ.get("GOOGLE_ANALYTICS_ID", None)
 
+# The public stats are invalidated by the worker processes, so their cache has
+# to be shared with the web processes, see apps.plea.stats_cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "stats": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "stats_cache",
+    },
+}
+
+STATS_CACHE["ALIAS"] = "stats"
+
 SMTP_ROUTES["GSI"]["USERNAME"] = os.environ.get("GSI_EMAIL_USERNAME", "")
 SMTP_ROUTES["GSI"]["PASSWORD"] = os.environ.get("GSI_EMAIL_PASSWORD", "")
 SMTP_ROUTES["PNN"]["USERNAME"] = os.environ.get("PNN_EMAIL_USERNAME", "")
@@ -34,6 +34,7 @@ SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 
 SECRET_KEY = "***REMOVED***"
+SUBMISSION_PAYLOAD_PASSPHRASE = "testing"
 
 # the test user data directory
 USER_DATA_DIRECTORY = os.path.join(PROJECT_ROOT, 'test_user_data')
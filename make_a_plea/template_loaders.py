@@ -0,0 +1,279 @@
+"""
+Template loader that pre-inlines the CSS of the user email templates.
+
+Running premailer inside ``{% premailer %}`` means every email rendered pays for
+parsing the stylesheet and matching every selector against the document. The
+templates listed in ``settings.COMPILED_EMAIL_TEMPLATES`` are instead flattened
+(``{% extends %}`` and ``{% block %}`` resolved), have their static translations
+rendered for the active language, and are run through premailer once with the
+remaining template tags protected. The result is an ordinary Django template
+with the styles already inlined, cached per template and language.
+
+If a template can't be compiled safely the loader logs it and falls back to the
+source template, whose ``{% premailer %}`` tag still inlines at render time.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.template import Context, Template, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.base import BLOCK_TAG_START, COMMENT_TAG_START, VARIABLE_TAG_START, Origin, tag_re
+from django.template.loaders.base import Loader as BaseLoader
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from premailer import Premailer
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for a protected template tag while premailer runs. The trailing colon
+# makes it look like a URL scheme, so premailer won't join it with its base_url.
+PLACEHOLDER = "x-tpl-{0}:"
+PLACEHOLDER_RE = re.compile(r"x-tpl-(\d+):")
+
+
+class _Block(object):
+    def __init__(self, name):
+        self.name = name
+        self.nodes = []
+
+
+def _tag_bits(tag):
+    return tag[2:-2].split()
+
+
+def _strip_quotes(value):
+    if len(value) < 2 or value[0] != value[-1] or value[0] not in "\"'":
+        raise TemplateSyntaxError("Only string literals are supported in compiled email templates: {}".format(value))
+    return value[1:-1]
+
+
+def parse_template_source(source):
+    """
+    Split a template's source into its parent template name, its ``{% load %}``
+    tags and a tree of text, tags and blocks.
+    """
+    parent = None
+    loads = []
+    blocks = {}
+    root = []
+    stack = [root]
+
+    for index, bit in enumerate(tag_re.split(source)):
+        if not bit:
+            continue
+
+        if index % 2 and bit.startswith(BLOCK_TAG_START):
+            bits = _tag_bits(bit)
+
+            if bits[0] == "extends":
+                parent = _strip_quotes(bits[1])
+                continue
+            elif bits[0] == "load":
+                loads.append(bit)
+                continue
+            elif bits[0] == "block":
+                block = _Block(bits[1])
+                stack[-1].append(block)
+                blocks[block.name] = block
+                stack.append(block.nodes)
+                continue
+            elif bits[0] == "endblock":
+                stack.pop()
+                continue
+
+        if "block.super" in bit:
+            raise TemplateSyntaxError("{{ block.super }} is not supported in compiled email templates")
+
+        stack[-1].append(bit)
+
+    return parent, loads, blocks, root
+
+
+def _is_static_translation(span):
+    """
+    True for ``{% trans "..." %}`` and for ``{% blocktrans %}`` spans without
+    variables, whose output depends on nothing but the active language.
+    """
+    opening = _tag_bits(span[0])
+
+    if opening[0] == "trans":
+        literal = opening[1][:1] in ("'", '"')
+        return literal and (len(opening) == 2 or (len(opening) == 3 and opening[2] == "noop"))
+
+    return set(opening) <= {"blocktrans", "trimmed"} and len(span) == 3 and not tag_re.search(span[1])
+
+
+class EmailTemplateCompiler(object):
+    def __init__(self, engine, get_source):
+        self.engine = engine
+        self.get_source = get_source
+
+    def flatten(self, template_name):
+        """
+        Resolve the ``{% extends %}`` chain of a template into a single list of
+        template source bits, plus the ``{% load %}`` tags used along the way.
+        """
+        overrides = {}
+        all_loads = []
+        name = template_name
+
+        while True:
+            parent, loads, blocks, root = parse_template_source(self.get_source(name))
+            all_loads.extend(loads)
+            for block_name, block in blocks.items():
+                overrides.setdefault(block_name, block)
+            if parent is None:
+                break
+            name = parent
+
+        bits = []
+
+        def expand(nodes):
+            for node in nodes:
+                if isinstance(node, _Block):
+                    expand(overrides[node.name].nodes)
+                else:
+                    bits.append(node)
+
+        expand(root)
+
+        return all_loads, bits
+
+    def group_translations(self, bits):
+        """
+        Gather each ``{% blocktrans %}`` ... ``{% endblocktrans %}`` into one
+        span so it is either rendered or protected as a whole.
+        """
+        grouped = []
+        span = None
+
+        for bit in bits:
+            if bit.startswith(BLOCK_TAG_START):
+                name = _tag_bits(bit)[0]
+                if name == "blocktrans":
+                    span = [bit]
+                    continue
+                elif name == "endblocktrans":
+                    span.append(bit)
+                    grouped.append(span)
+                    span = None
+                    continue
+                elif name == "trans":
+                    grouped.append([bit])
+                    continue
+
+            if span is not None:
+                span.append(bit)
+            else:
+                grouped.append(bit)
+
+        return grouped
+
+    def compile(self, template_name):
+        loads, bits = self.flatten(template_name)
+
+        loads = [load for load in loads if _tag_bits(load)[1:] != ["premailer"]]
+        header = "".join(sorted(set(loads), key=loads.index))
+
+        protected = []
+        html = []
+
+        for item in self.group_translations(bits):
+            if isinstance(item, list):
+                if _is_static_translation(item):
+                    source = "{% load i18n %}" + "".join(item)
+                    html.append(Template(source, engine=self.engine).render(Context()))
+                    continue
+                item = "".join(item)
+                if "<" in tag_re.sub("", item):
+                    raise TemplateSyntaxError("Markup inside a translation with variables can't be pre-inlined")
+            elif not item.startswith((BLOCK_TAG_START, VARIABLE_TAG_START, COMMENT_TAG_START)):
+                html.append(item)
+                continue
+            elif item.startswith(COMMENT_TAG_START):
+                continue
+            elif item.startswith(BLOCK_TAG_START) and _tag_bits(item)[0] in ("premailer", "endpremailer"):
+                if _tag_bits(item)[1:]:
+                    raise TemplateSyntaxError("{% premailer %} arguments are not supported in compiled email templates")
+                continue
+
+            html.append(PLACEHOLDER.format(len(protected)))
+            protected.append(item)
+
+        inlined = Premailer("".join(html), **settings.PREMAILER_OPTIONS).transform()
+
+        return header + PLACEHOLDER_RE.sub(lambda match: protected[int(match.group(1))], inlined)
+
+
+class CompiledTemplate(Template):
+    """
+    Premailer serialises the rendered email with lxml, which writes the
+    ``&#39;`` of autoescaped values back as a plain apostrophe. The compiled
+    template is inlined before its values are filled in, so it does the same
+    after rendering to keep the emails as they were.
+    """
+
+    def render(self, context):
+        return mark_safe(super(CompiledTemplate, self).render(context).replace("&#39;", "'"))
+
+
+class Loader(BaseLoader):
+    """
+    Wraps the project's other loaders, serving compiled versions of the
+    templates listed in ``settings.COMPILED_EMAIL_TEMPLATES``.
+    """
+
+    def __init__(self, engine, loaders):
+        self.compiled = {}
+        self.loaders = engine.get_template_loaders(loaders)
+        super(Loader, self).__init__(engine)
+
+    def get_contents(self, origin):
+        return origin.loader.get_contents(origin)
+
+    def get_template_sources(self, template_name, template_dirs=None):
+        for loader in self.loaders:
+            for origin in loader.get_template_sources(template_name, template_dirs):
+                yield origin
+
+    def get_source(self, template_name):
+        for origin in self.get_template_sources(template_name):
+            try:
+                return self.get_contents(origin)
+            except TemplateDoesNotExist:
+                continue
+        raise TemplateDoesNotExist(template_name)
+
+    def get_compiled_template(self, template_name):
+        key = (template_name, translation.get_language())
+
+        if key not in self.compiled or self.engine.debug:
+            compiler = EmailTemplateCompiler(self.engine, self.get_source)
+            origin = Origin(name=template_name, template_name=template_name, loader=self)
+            self.compiled[key] = CompiledTemplate(compiler.compile(template_name), origin, template_name, self.engine)
+
+        return self.compiled[key]
+
+    def get_template(self, template_name, template_dirs=None, skip=None):
+        if not skip and not template_dirs and template_name in getattr(settings, "COMPILED_EMAIL_TEMPLATES", []):
+            try:
+                return self.get_compiled_template(template_name)
+            except TemplateSyntaxError:
+                logger.exception("Failed to compile %s, falling back to {%% premailer %%}", template_name)
+
+        tried = []
+        for loader in self.loaders:
+            try:
+                return loader.get_template(template_name, template_dirs=template_dirs, skip=skip)
+            except TemplateDoesNotExist as e:
+                tried.extend(e.tried)
+
+        raise TemplateDoesNotExist(template_name, tried=tried)
+
+    def reset(self):
+        self.compiled = {}
+        for loader in self.loaders:
+            try:
+                loader.reset()
+            except AttributeError:
+                pass
@@ -1,21 +1,37 @@
+import json
+import os
 import random
+import re
+import shutil
 import string
-from datetime import datetime, timedelta
+import tempfile
+from copy import deepcopy
+from datetime import date, datetime, timedelta
+
+import lxml.html
 
 from django.test import TestCase, Client
 from django.test.utils import override_settings
 from django.test.client import RequestFactory
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.template import TemplateSyntaxError, engines
+from django.template.loader import get_template
+from django.utils import translation
 
-from mock import Mock
+from django_celery_results.models import TaskResult
+from mock import Mock, patch
 
 from make_a_plea.serializers import DateAwareSerializer
 from apps.plea.models import Case, Offence
 from apps.result.models import Result, ResultOffence, ResultOffenceData
 from .views import start
+from .template_loaders import EmailTemplateCompiler
+from .celery import app as celery_app
 
 from .management.commands.delete_old_data import Command
+from .management.commands.resend_court_emails import ResendEngine, TokenBucket, manual_send_court_email
 
 
 def yield_waffle(chars=7, words=1, lines=1):
@@ -179,9 +195,196 @@ class TestAdminPanel(TestCase):
             "/admin/password_change/",
             "/admin/plea/auditevent/",
             "/admin/plea/case/",
+            "/admin/plea/case/initial_report/",
+            "/admin/plea/case/ongoing_report/",
             "/admin/result/result/",
         ]
         for page in admin_pages:
             resp = client.get(page)
             self.assertEqual(resp.status_code, 200)
             self.assertContains(resp, "<!DOCTYPE html")
+
+
+class CompiledEmailTemplateTests(TestCase):
+    plea_context = {"urn": "06AA0000015",
+                    "plea_made_by": "Defendant",
+                    "number_of_charges": 2,
+                    "contact_deadline": date(2018, 6, 1),
+                    "plea_type": "mixed",
+                    "court_name": "Court O'Neil & Sons",
+                    "court_email": "court@example.org"}
+
+    result_context = {"name": "Frank <b>Marsh</b>",
+                      "urn": "51AA000000015",
+                      "fines": ["Fine - &amp;440",
+                                "Victim surcharge - To pay victim surcharge of &amp;44"],
+                      "total": 569,
+                      "pay_by": date(2016, 2, 13),
+                      "endorsements": ["Driving record endorsed with 6 points."],
+                      "payment_details": {"division": "104",
+                                          "account_number": "15083002"},
+                      "court": {"court_language": "cy",
+                                "court_name": "Manchester and Salford Magistrates' Court",
+                                "enforcement_email": "test@test.com",
+                                "enforcement_telephone": "0800 FINES TEAM"}}
+
+    contexts = {"emails/user_plea_confirmation.html": plea_context,
+                "emails/user_plea_confirmation_sjp.html": plea_context,
+                "emails/user_resulting.html": result_context}
+
+    @staticmethod
+    def normalise(html):
+        html = lxml.html.tostring(lxml.html.fromstring(html), encoding="unicode")
+        html = re.sub(r">\s+<", "><", html)
+        return re.sub(r"\s+", " ", html).strip()
+
+    def test_compiled_templates_match_premailer(self):
+        for template_name in settings.COMPILED_EMAIL_TEMPLATES:
+            for language in ("en", "cy"):
+                with translation.override(language):
+                    compiled = get_template(template_name)
+                    with override_settings(COMPILED_EMAIL_TEMPLATES=[]):
+                        premailed = get_template(template_name)
+
+                    context = self.contexts[template_name]
+
+                    self.assertNotIn("premailer", compiled.template.source)
+                    self.assertEqual(self.normalise(compiled.render(context)),
+                                     self.normalise(premailed.render(context)))
+
+    def test_compiled_template_writes_apostrophes_like_premailer(self):
+        context = self.plea_context
+        compiled = get_template("emails/user_plea_confirmation.html").render(context)
+        with override_settings(COMPILED_EMAIL_TEMPLATES=[]):
+            premailed = get_template("emails/user_plea_confirmation.html").render(context)
+
+        self.assertIn("Court O'Neil &amp; Sons", premailed)
+        self.assertIn("Court O'Neil &amp; Sons", compiled)
+
+    def test_compiled_template_is_cached_per_language(self):
+        with translation.override("en"):
+            first = get_template("emails/user_resulting.html")
+            second = get_template("emails/user_resulting.html")
+        with translation.override("cy"):
+            welsh = get_template("emails/user_resulting.html")
+
+        self.assertIs(first.template, second.template)
+        self.assertIsNot(first.template, welsh.template)
+
+    def test_page_templates_render_through_the_loader(self):
+        request = RequestFactory().get("/")
+
+        self.assertIn("Page not found", get_template("404.html").render({}, request))
+
+        # With the cached loader wrapped inside, as in the docker settings
+        templates = deepcopy(settings.TEMPLATES)
+        email_loader, template_loaders = templates[0]["OPTIONS"]["loaders"][0]
+        templates[0]["OPTIONS"]["loaders"] = [
+            (email_loader, [("django.template.loaders.cached.Loader", template_loaders)]),
+        ]
+
+        with override_settings(TEMPLATES=templates):
+            self.assertIn("Page not found", get_template("404.html").render({}, request))
+            self.assertIn("15083002", get_template("emails/user_resulting.html").render(self.result_context))
+
+    def test_compiler_rejects_markup_in_translations_with_variables(self):
+        sources = {
+            "base.html": "{% load premailer %}{% premailer %}<html><body>"
+                         "{% block content %}{% endblock %}</body></html>{% endpremailer %}",
+            "email.html": '{% extends "base.html" %}{% load i18n %}{% block content %}'
+                          "{% blocktrans %}Hello <b>{{ name }}</b>{% endblocktrans %}{% endblock %}",
+        }
+        compiler = EmailTemplateCompiler(engines["django"].engine, sources.__getitem__)
+
+        with self.assertRaises(TemplateSyntaxError):
+            compiler.compile("email.html")
+
+    def test_compiler_inlines_styles_around_template_tags(self):
+        sources = {
+            "email.html": '{% load i18n %}{% load premailer %}{% premailer %}<html><head>'
+                          "<style>p {color: red}</style></head><body>"
+                          '<p><a href="/feedback/">{% trans "Feedback" %}</a> {{ name }}</p>'
+                          "</body></html>{% endpremailer %}",
+        }
+        compiler = EmailTemplateCompiler(engines["django"].engine, sources.__getitem__)
+
+        source = compiler.compile("email.html")
+
+        self.assertTrue(source.startswith("{% load i18n %}<"))
+        self.assertIn('<p style="color:red">', source)
+        self.assertIn('href="{}/feedback/"'.format(settings.PREMAILER_OPTIONS["base_url"]), source)
+        self.assertIn("Feedback</a> {{ name }}</p>", source)
+
+
+class CeleryRoutingTests(TestCase):
+    def test_email_tasks_have_their_own_queues(self):
+        routes = {"apps.plea.tasks.email_send_court": "court",
+                  "apps.plea.tasks.email_send_prosecutor": "court",
+                  "apps.plea.tasks.email_send_user": "user",
+                  "apps.result.tasks.unrouted": "bulk"}
+
+        for task_name, queue in routes.items():
+            self.assertEqual(celery_app.amqp.router.route({}, task_name)["queue"].name, queue)
+
+
+class DeleteTaskResultsTestCase(TestCase):
+    def test_task_results_are_deleted_in_chunks(self):
+        for i in range(5):
+            TaskResult.objects.create(task_id="task-{}".format(i), status="SUCCESS")
+
+        call_command("delete_task_results", chunk_size=2, pause=0, stdout=Mock())
+
+        self.assertEqual(TaskResult.objects.count(), 0)
+
+
+
+class ResendCourtEmailsTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, "checkpoint")
+        self.files = []
+        for case_id in range(3):
+            file_ = os.path.join(self.directory, "00AA0000000_[{}]_1.json".format(case_id))
+            with open(file_, "w") as fd:
+                fd.write("{}")
+            self.files.append(file_)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_token_bucket_limits_the_rate(self):
+        bucket = TokenBucket(rate=1000, capacity=1)
+        bucket.take()
+        bucket.take()
+
+        self.assertLess(bucket.tokens, 1)
+
+    @patch("make_a_plea.management.commands.resend_court_emails.manual_send_court_email")
+    def test_run_resumes_from_checkpoint(self, send):
+        send.side_effect = [True, Exception("Connection refused"), True]
+
+        engine = ResendEngine(workers=1, rate=1000, checkpoint=self.checkpoint,
+                              stdout=Mock(), stderr=Mock())
+        counts = engine.run(iter(self.files))
+
+        self.assertEqual(counts, {"sent": 2, "failed": 1})
+
+        send.reset_mock()
+        send.side_effect = None
+        send.return_value = True
+
+        engine = ResendEngine(workers=1, rate=1000, checkpoint=self.checkpoint,
+                              stdout=Mock(), stderr=Mock())
+        counts = engine.run(iter(self.files))
+
+        self.assertEqual(counts, {"sent": 1, "checkpointed": 2})
+        self.assertEqual(send.call_args[0][1], 1)
+
+    @patch("make_a_plea.management.commands.resend_court_emails.TemplateAttachmentEmail")
+    def test_sent_case_without_ledger_entry_is_not_resent(self, email):
+        case = Case.objects.create(urn="06AA0000015", sent=True)
+
+        sent = manual_send_court_email(json.dumps({"case": {"urn": "06AA0000015"}}), case.id)
+
+        self.assertFalse(sent)
+        self.assertFalse(email.called)
@@ -4,6 +4,7 @@ case ${DOCKER_STATE} in
 migrate)
     echo "running migrate"
     ./manage.py migrate
+    ./manage.py createcachetable
     ;;
 esac
 
@@ -4,6 +4,6 @@ service rabbitmq-server start
 service postgresql start
 
 mailmock -p 1025 -o /tmp/mailmock -n &
-celery worker -A make_a_plea -D
+celery worker -A make_a_plea -Q court,user,bulk,celery -D
 sleep 2
 python ./manage.py runserver 0.0.0.0:80